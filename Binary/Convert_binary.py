@@ -1,31 +1,87 @@
 from PIL import Image
 import numpy as np
+import os
+import sys
 
-def convert_to_binary_and_save_array(input_image_path, output_image_path, array_output_path, threshold=128):
-    # Load the image
-    img = Image.open(input_image_path)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+from image_io import StripWriter, image_size, iter_gray_strips, save_array
+from prefix_codes import byte_histogram
 
-    # Convert image to grayscale
-    grayscale_img = img.convert('L')
+def otsu_threshold(histogram):
+    """
+    Otsu's threshold for a 256-bin grayscale histogram: the level that maximises the
+    between-class variance. Pixels above the returned level are foreground (1).
+    """
+    histogram = np.asarray(histogram, dtype=np.float64)
+    levels = np.arange(len(histogram))
+    weight_below = np.cumsum(histogram)
+    weight_above = weight_below[-1] - weight_below
+    sum_below = np.cumsum(histogram * levels)
+    sum_above = sum_below[-1] - sum_below
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_below = sum_below / weight_below
+        mean_above = sum_above / weight_above
+        between_variance = weight_below * weight_above * (mean_below - mean_above) ** 2
+    return int(np.argmax(np.nan_to_num(between_variance)))
 
-    # Apply threshold to convert the image to binary
-    binary_img = grayscale_img.point(lambda x: 255 if x > threshold else 0, '1')
+def convert_to_binary_and_save_array(input_image_path, output_image_path=None, array_output_path=None, threshold=128):
+    """
+    Convert an image to binary and return the 0/1 uint8 array, so it can be passed to a codec directly.
+    The binary BMP and the array file (.bits, .npy, or .txt for the text dump) are only written when a path is given.
+    threshold may be a gray level or 'otsu' to choose it from the image histogram.
+    """
+    # Load the image and convert it to grayscale
+    grayscale_array = np.asarray(Image.open(input_image_path).convert('L'))
 
-    # Convert the binary image to an array of 0 and 1
-    # PIL's '1' mode image uses 255 for true; convert this to a boolean array, then to int
-    binary_array = np.array(binary_img).astype(bool).astype(int)
+    if threshold == 'otsu':
+        threshold = otsu_threshold(byte_histogram(grayscale_array.ravel()))
 
-    # Write the binary array to a .txt file
-    with open(array_output_path, 'w') as f:
-        for row in binary_array:
-            f.write(' '.join([str(pixel) for pixel in row]) + '\n')
+    # Pixels brighter than the threshold become 1, the rest 0
+    binary_array = (grayscale_array > threshold).view(np.uint8)
+
+    if array_output_path:
+        save_array(binary_array, array_output_path)
+        print(f"Binary array saved to {array_output_path}.")
 
     # Save the binary image
-    binary_img.save(output_image_path)
-    print(f"Conversion done and binary array saved to {array_output_path}.")
-
-# Example usage
-input_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/airplane/airplane.png'
-output_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/airplane/binary.bmp' 
-array_output_path = '/Users/ahmedalwan/Desktop/FYP/Code/Testing Images/array.txt'  
-convert_to_binary_and_save_array(input_image_path, output_image_path, array_output_path)
+    if output_image_path:
+        Image.fromarray(binary_array.view(bool)).save(output_image_path)
+    print("Conversion done.")
+
+    return binary_array
+
+def convert_to_binary_streaming(input_image_path, output_image_path=None, array_output_path=None, threshold=128,
+                                strip_rows=256):
+    """
+    Convert an image to binary strip by strip, writing each strip to the outputs as it is produced.
+    With threshold='otsu' the source is read twice: once to build the histogram, once to threshold it.
+    Memory stays flat for uncompressed BMP and .npy sources. Returns the threshold used.
+    """
+    if threshold == 'otsu':
+        histogram = np.zeros(256, dtype=np.int64)
+        for _, strip in iter_gray_strips(input_image_path, strip_rows):
+            histogram += byte_histogram(strip.ravel())
+        threshold = otsu_threshold(histogram)
+
+    height, width = image_size(input_image_path)
+    writers = [StripWriter(path, height, width, binary=True) for path in (output_image_path, array_output_path) if path]
+    try:
+        for y, strip in iter_gray_strips(input_image_path, strip_rows):
+            binary_strip = (strip > threshold).view(np.uint8)
+            for writer in writers:
+                writer.write_rows(y, binary_strip)
+    finally:
+        for writer in writers:
+            writer.close()
+
+    if array_output_path:
+        print(f"Binary array saved to {array_output_path}.")
+    print("Conversion done.")
+    return threshold
+
+if __name__ == "__main__":
+    # Example usage
+    input_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/airplane/airplane.png'
+    output_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/airplane/binary.bmp' 
+    array_output_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/airplane/binary.bits'
+    convert_to_binary_and_save_array(input_image_path, output_image_path, array_output_path)
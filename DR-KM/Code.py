@@ -1,12 +1,13 @@
+import io
 import os
-import time
-import tracemalloc
 import csv
-from PIL import Image
+import sys
 import numpy as np
-from sklearn.decomposition import randomized_svd
-from sklearn.cluster import KMeans
-import skimage.metrics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+from image_io import load_pixels
+from instrumentation import Instrumentation, NO_INSTRUMENTATION, default_sink
+from result_cache import NO_CACHE, default_cache
 
 def save_compressed_representation(compressed_rep_path, cluster_centers, X, residuals):
     """Save the compressed representation to an NPZ file."""
@@ -17,83 +18,130 @@ def save_compressed_representation(compressed_rep_path, cluster_centers, X, resi
         residuals=residuals
     )
 
-def dimensionality_reduction_k_means(image_array, k, epsilon):
-    """Perform dimensionality reduction using k-means and SVD."""
+def svd_factors(image_array, cache=NO_CACHE):
+    """Reduced SVD (U, Sigma, Vt) of the image, shared by every K and epsilon of a sweep through the cache."""
+    return cache.get_or_compute('drkm.svd', lambda: np.linalg.svd(image_array, full_matrices=False),
+                                (image_array,), kind='arrays', source=__file__)
+
+def dimensionality_reduction_k_means(image_array, k, epsilon, cache=NO_CACHE, random_state=0):
+    """
+    Perform dimensionality reduction using k-means and SVD.
+    random_state seeds the k-means initialization, so the same inputs give the same centers.
+    """
+    from sklearn.cluster import KMeans  # scikit-learn is slow to import, so only load it when DR-KM runs
     m = k + int(72 * k / epsilon**2) - 1
     shape0 = image_array.shape[0]
     shape1 = image_array.shape[1]
     n_features = min(shape0, shape1)
     m = min(m, n_features)
     
-    U, Sigma, Vt = np.linalg.svd(image_array, full_matrices=True)
+    U, Sigma, Vt = svd_factors(image_array, cache)
     A_m = np.dot(U[:, :m], np.dot(np.diag(Sigma[:m]), Vt[:m, :]))
     
-    kmeans = KMeans(n_clusters=m, n_init=10, max_iter=300)
+    kmeans = KMeans(n_clusters=m, n_init=10, max_iter=300, random_state=random_state)
     kmeans.fit(A_m)
     
     return (kmeans.cluster_centers_,)
 
-def compress_and_save(image_path, compressed_rep_path, K, epsilon):
-    tracemalloc.start()
-    compress_start_time = time.time()
-    
-    original_image = Image.open(image_path).convert("L")
-    image_array = np.array(original_image)
-    cluster_centers_tuple = dimensionality_reduction_k_means(image_array, K, epsilon)
-    cluster_centers = cluster_centers_tuple[0]
-    X = np.linalg.lstsq(cluster_centers.T, image_array.T, rcond=None)[0]
-    residuals = image_array.T - np.dot(cluster_centers.T, X)
-    
-    save_compressed_representation(compressed_rep_path, cluster_centers, X, residuals)
-    
-    compress_time = time.time() - compress_start_time
-    _, compress_peak = tracemalloc.get_traced_memory()
-    tracemalloc.stop()
-    
-    return compress_time, compress_peak / 1024**2  # Return compression time and peak memory
+def compress_representation(image_array, K, epsilon, cache=NO_CACHE, random_state=0):
+    """
+    Compute the cluster centers, coefficients and residuals for an image array.
+    With a cache, a k-means fit is computed once per image, K, epsilon and random_state and reused after that.
+    """
+    def compute():
+        cluster_centers_tuple = dimensionality_reduction_k_means(image_array, K, epsilon, cache, random_state)
+        cluster_centers = cluster_centers_tuple[0]
+        X = np.linalg.lstsq(cluster_centers.T, image_array.T, rcond=None)[0]
+        residuals = image_array.T - np.dot(cluster_centers.T, X)
+        return cluster_centers, X, residuals
+    return cache.get_or_compute('drkm.representation', compute, (image_array,),
+                                {'K': K, 'epsilon': epsilon, 'random_state': random_state}, kind='arrays',
+                                source=__file__)
 
-def decompress(compressed_rep_path):
-    tracemalloc.start()
-    decompress_start_time = time.time()
-    
-    data = np.load(compressed_rep_path)
-    cluster_centers = data["cluster_centers"]
-    X = data["X"]
-    residuals = data["residuals"]
+def reconstruct_pixels(cluster_centers, X, residuals):
+    """Rebuild the uint8 image from its compressed representation."""
     new_pixels = np.dot(cluster_centers.T, X) + residuals
-    new_pixels = new_pixels.T.clip(0, 255).astype("uint8")
-    
-    decompress_time = time.time() - decompress_start_time
-    _, decompress_peak = tracemalloc.get_traced_memory()
-    tracemalloc.stop()
-    
-    return new_pixels, decompress_time, decompress_peak / 1024**2  # Return image, decompress time and peak memory
+    return new_pixels.T.clip(0, 255).astype("uint8")
+
+def compress_array(image_array, K=10, epsilon=0.5, instrumentation=NO_INSTRUMENTATION, random_state=0):
+    """Compress an in-memory grayscale image and return the NPZ data as bytes."""
+    with instrumentation.stage('encode'):
+        representation = compress_representation(image_array, K, epsilon, random_state=random_state)
+    with instrumentation.stage('serialize'):
+        buffer = io.BytesIO()
+        save_compressed_representation(buffer, *representation)
+        return buffer.getvalue()
+
+def decompress_bytes(data, instrumentation=NO_INSTRUMENTATION):
+    """Decompress NPZ data produced by compress_array and return the image array."""
+    with instrumentation.stage('parse'):
+        data = np.load(io.BytesIO(data))
+        cluster_centers, X, residuals = data["cluster_centers"], data["X"], data["residuals"]
+    with instrumentation.stage('decode'):
+        return reconstruct_pixels(cluster_centers, X, residuals)
+
+def compress_and_save(image_path, compressed_rep_path, K, epsilon, cache=NO_CACHE):
+    with Instrumentation('drkm.compress', sink=default_sink()) as instrumentation:
+        instrumentation.annotate(K=K, epsilon=epsilon)
+        with instrumentation.stage('read'):
+            image_array = load_pixels(image_path, 'L')
+        instrumentation.count_in(os.path.getsize(image_path))
+
+        with instrumentation.stage('encode'):
+            cluster_centers, X, residuals = compress_representation(image_array, K, epsilon, cache)
+
+        with instrumentation.stage('write'):
+            save_compressed_representation(compressed_rep_path, cluster_centers, X, residuals)
+        instrumentation.count_out(os.path.getsize(compressed_rep_path))
+
+    report = instrumentation.report
+    return report['total_seconds'], report['peak_increase_mb']  # Return compression time and peak memory
+
+def decompress(compressed_rep_path):
+    with Instrumentation('drkm.decompress', sink=default_sink()) as instrumentation:
+        with instrumentation.stage('read'):
+            data = np.load(compressed_rep_path)
+            cluster_centers, X, residuals = data["cluster_centers"], data["X"], data["residuals"]
+        instrumentation.count_in(os.path.getsize(compressed_rep_path))
+
+        with instrumentation.stage('decode'):
+            new_pixels = reconstruct_pixels(cluster_centers, X, residuals)
+        instrumentation.count_out(new_pixels.nbytes)
+
+    report = instrumentation.report
+    return new_pixels, report['total_seconds'], report['peak_increase_mb']  # Return image, decompress time and peak memory
 
 def main():
     image_path = "/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/gray.bmp"
     results_file = "/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/gray_results.csv"
     ks = [2, 5, 10, 32, 64, 128]
     epsilons = [0.01, 0.1, 0.2, 0.3, 0.4, 0.5]
+    cache = default_cache()  # set FYP_CACHE to reuse the SVD, k-means fits and metrics of earlier sweeps
 
     with open(results_file, mode='w', newline='') as file:
         writer = csv.writer(file)
-        writer.writerow(["K", "Epsilon", "Compression Time", "Compression Memory Usage", "Decompression Time", "Decompression Memory Usage", "Original Size (KB)", "Compressed Size (KB)", "Compression Ratio"])
+        writer.writerow(["K", "Epsilon", "Compression Time", "Compression Memory Usage", "Decompression Time", "Decompression Memory Usage", "Original Size (KB)", "Compressed Size (KB)", "Compression Ratio", "PSNR", "MSE", "SSIM"])
+
+        original_array = load_pixels(image_path, 'L')
 
         for K in ks:
             for epsilon in epsilons:
                 compressed_rep_path = f"/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/data={K}_clusters={epsilon}.npz"
                 decompressed_image_path = f"/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/comp_k={K}_clusters={epsilon}.bmp"
 
-                compress_time, compress_memory = compress_and_save(image_path, compressed_rep_path, K, epsilon)
+                compress_time, compress_memory = compress_and_save(image_path, compressed_rep_path, K, epsilon, cache)
                 image_array_reconstructed, decompress_time, decompress_memory = decompress(compressed_rep_path)
                 original_size_kb = os.path.getsize(image_path) / 1024
                 compressed_size_kb = os.path.getsize(compressed_rep_path) / 1024
                 compression_ratio = compressed_size_kb / original_size_kb
 
+                from PIL import Image
                 decompressed_image = Image.fromarray(image_array_reconstructed, mode="L")
                 decompressed_image.save(decompressed_image_path)
 
-                writer.writerow([K, epsilon, f"{compress_time:.2f}", f"{compress_memory:.2f}", f"{decompress_time:.2f}", f"{decompress_memory:.2f}", f"{original_size_kb:.2f}", f"{compressed_size_kb:.2f}", f"{compression_ratio:.2f}"])
+                quality = cache.evaluate(original_array, image_array_reconstructed)
+
+                writer.writerow([K, epsilon, f"{compress_time:.2f}", f"{compress_memory:.2f}", f"{decompress_time:.2f}", f"{decompress_memory:.2f}", f"{original_size_kb:.2f}", f"{compressed_size_kb:.2f}", f"{compression_ratio:.2f}", f"{quality['psnr']:.2f}", f"{quality['mse']:.2f}", f"{quality['ssim']:.4f}"])
 
 if __name__ == "__main__":
     main()
@@ -1,26 +1,54 @@
 from PIL import Image
 import numpy as np
+import os
+import sys
 
-def convert_to_grayscale_and_save_array(input_image_path, output_image_path, array_output_path):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+from image_io import StripWriter, image_size, iter_gray_strips, save_array
+
+def convert_to_grayscale_and_save_array(input_image_path, output_image_path=None, array_output_path=None):
+    """
+    Convert an image to grayscale and return the uint8 array, so it can be passed to a codec directly.
+    The grayscale BMP and the array file (.npy, or .txt for the text dump) are only written when a path is given.
+    """
     img = Image.open(input_image_path)
     grayscale_img = img.convert('L')
-    grayscale_img.save(output_image_path)
-    print(f"Image successfully converted to grayscale and saved to {output_image_path}.")
+    if output_image_path:
+        grayscale_img.save(output_image_path)
+        print(f"Image successfully converted to grayscale and saved to {output_image_path}.")
 
     # Convert the grayscale image to an array
     grayscale_array = np.array(grayscale_img)
 
-    # Write the grayscale array to a .txt file
-    with open(array_output_path, 'w') as f:
-        for row in grayscale_array:
-            f.write(' '.join([str(pixel) for pixel in row]) + '\n')
+    if array_output_path:
+        save_array(grayscale_array, array_output_path)
+        print(f"Grayscale array saved to {array_output_path}.")
 
-    print(f"Grayscale array saved to {array_output_path}.")
+    return grayscale_array
 
-# Image conversion
-input_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/pepper.bmp'
-output_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/gray.bmp'
-array_output_path = '/Users/ahmedalwan/Desktop/FYP/Code/Testing Images/grayscale.txt'
-convert_to_grayscale_and_save_array(input_image_path, output_image_path, array_output_path)
+def convert_to_grayscale_streaming(input_image_path, output_image_path=None, array_output_path=None, strip_rows=256):
+    """
+    Convert an image to grayscale strip by strip, writing each strip to the outputs as it is produced.
+    Memory stays flat for uncompressed BMP and .npy sources; the result matches convert_to_grayscale_and_save_array.
+    """
+    height, width = image_size(input_image_path)
+    writers = [StripWriter(path, height, width) for path in (output_image_path, array_output_path) if path]
+    try:
+        for y, strip in iter_gray_strips(input_image_path, strip_rows):
+            for writer in writers:
+                writer.write_rows(y, strip)
+    finally:
+        for writer in writers:
+            writer.close()
 
+    if output_image_path:
+        print(f"Image successfully converted to grayscale and saved to {output_image_path}.")
+    if array_output_path:
+        print(f"Grayscale array saved to {array_output_path}.")
 
+if __name__ == "__main__":
+    # Image conversion
+    input_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/pepper.bmp'
+    output_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/gray.bmp'
+    array_output_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/gray.npy'
+    convert_to_grayscale_and_save_array(input_image_path, output_image_path, array_output_path)
@@ -1,11 +1,14 @@
-import numpy as np
-import cv2
-import time
+import io
 import os
-import psutil
-from collections import Counter
+import sys
 import heapq
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+from image_io import load_pixels, source_nbytes
+from instrumentation import Instrumentation, NO_INSTRUMENTATION, default_sink, print_stages
+from prefix_codes import byte_histogram, encode_symbols, tree_codes, write_symbols
+from result_cache import default_cache
+
 class HuffmanNode:
     def __init__(self, char, freq):
         self.char = char
@@ -20,9 +23,12 @@ class HuffmanNode:
         return self.freq == other.freq
 
 def calculate_frequencies(image):
-    pixels = image.flatten()
-    frequencies = Counter(pixels)
-    return frequencies
+    """Counts of black (0) and white (255) pixels, where any nonzero pixel is white."""
+    histogram = byte_histogram(image)
+    counts = {0: int(histogram[0]), 255: int(histogram[1:].sum())}
+    # Keep the order in which values first appear, as the tree's tie-breaking depends on it
+    first = 255 if image.size and image.flat[0] else 0
+    return {pixel: counts[pixel] for pixel in (first, 255 - first) if counts[pixel]}
 
 def build_huffman_tree(frequencies):
     priority_queue = [HuffmanNode(pixel, freq) for pixel, freq in frequencies.items()]
@@ -40,56 +46,75 @@ def build_huffman_tree(frequencies):
 
     return priority_queue[0]
 
-def build_codes(node, current_code, codes):
-    if node is None:
-        return
+def huffman_encoding(image, frequencies=None):
+    if frequencies is None:
+        frequencies = calculate_frequencies(image)
+    root = build_huffman_tree(frequencies)
+    return tree_codes(root), frequencies
 
-    if node.char is not None:
-        codes[node.char] = current_code
-        return
+def pixel_codes(codes):
+    """The code of every pixel value: the black code for 0, the white code for any other value."""
+    return {value: codes[255 if value else 0] for value in range(256) if (255 if value else 0) in codes}
 
-    build_codes(node.left, current_code + "0", codes)
-    build_codes(node.right, current_code + "1", codes)
+def encode_image(image, codes):
+    # '0'/'1' characters as a uint8 array
+    return encode_symbols(image, pixel_codes(codes))
 
-def huffman_encoding(image):
-    frequencies = calculate_frequencies(image)
-    root = build_huffman_tree(frequencies)
-    codes = {}
-    build_codes(root, "", codes)
-    return codes, frequencies
+def build_shared_table(image):
+    """Frequencies of the whole image, for tiles that share one code table."""
+    return {str(pixel): int(freq) for pixel, freq in calculate_frequencies(image).items()}
 
-def encode_image(image, codes):
-    flattened = image.flatten()
-    encoded_output = ''.join([codes[pixel] for pixel in flattened])
-    return encoded_output
+def text_header(image, frequencies):
+    lines = [f'{image.shape[0]},{image.shape[1]}\n']
+    for pixel, freq in frequencies.items():
+        lines.append(f'{pixel} {freq}\n')
+    lines.append('-' * 50 + '\n')
+    return ''.join(lines).encode()
+
+def encoded_to_text(image, frequencies, encoded_data):
+    return b''.join([text_header(image, frequencies), encoded_data])
 
 def save_encoded_data(filepath, image, codes, frequencies, encoded_data):
-    with open(filepath, 'w') as file:
-        file.write(f'{image.shape[0]},{image.shape[1]}\n')
-        for pixel, freq in frequencies.items():
-            file.write(f'{pixel} {freq}\n')
-        file.write('-' * 50 + '\n')
-        file.write(encoded_data)
+    with open(filepath, 'wb') as file:
+        file.write(encoded_to_text(image, frequencies, encoded_data))
+
+def compress_array(image, instrumentation=NO_INSTRUMENTATION, table=None):
+    """
+    Huffman-encode an in-memory binary image (0/1 or 0/255) and return the serialized data as bytes.
+    With a table from build_shared_table the codes come from that table and the
+    frequency list is left out of the output; the decoder must be given the same table.
+    """
+    with instrumentation.stage('encode'):
+        frequencies = None if table is None else {int(pixel): freq for pixel, freq in table.items()}
+        codes, frequencies = huffman_encoding(image, frequencies)
+    with instrumentation.stage('serialize'):
+        # The bits are written straight after the header, with no 0/255 copy of the image and no copy of the bits
+        buffer = io.BytesIO()
+        buffer.write(text_header(image, {} if table is not None else frequencies))
+        write_symbols(buffer, image, pixel_codes(codes))
+        return buffer.getvalue()
 
 def compress_image(input_image_path, output_txt_path):
-    start_time = time.time()
-    image = cv2.imread(input_image_path, cv2.IMREAD_GRAYSCALE)
-    if image is None:
-        raise ValueError("Image not found or path is incorrect")
-
-    _, binary_image = cv2.threshold(image, 127, 255, cv2.THRESH_BINARY)
-
-    codes, frequencies = huffman_encoding(binary_image)
-    encoded_data = encode_image(binary_image, codes)
-    save_encoded_data(output_txt_path, binary_image, codes, frequencies, encoded_data)
-    
-    end_time = time.time()
-    compression_time = end_time - start_time
-    process = psutil.Process(os.getpid())
-    memory_usage = process.memory_info().rss / (1024 ** 2)  # Convert bytes to megabytes
-
-    original_size = os.path.getsize(input_image_path)
-    compressed_size = os.path.getsize(output_txt_path)
+    cache = default_cache()
+    hits = cache.hits
+    with Instrumentation('huffman_binary.compress', sink=default_sink()) as instrumentation:
+        with instrumentation.stage('read'):
+            binary_image = load_pixels(input_image_path, '1')
+        instrumentation.count_in(source_nbytes(input_image_path))
+
+        encoded_data = cache.get_or_compute(
+            'huffman_binary.compress', lambda: compress_array(binary_image, instrumentation), (binary_image,),
+            source=__file__)
+        with instrumentation.stage('write'):
+            with open(output_txt_path, 'wb') as file:
+                file.write(encoded_data)
+        instrumentation.count_out(len(encoded_data))
+
+    if cache.hits > hits:
+        print("Cache hit: the compressed data was read from the result cache, so no encode stages were timed.")
+    report = instrumentation.report
+    original_size = report['bytes_in']
+    compressed_size = report['bytes_out']
     original_size_kb = original_size / 1024
     compressed_size_kb = compressed_size / 1024
     compression_ratio = compressed_size / original_size
@@ -97,10 +122,12 @@ def compress_image(input_image_path, output_txt_path):
     print(f"Original Size: {original_size_kb:.2f} KB")
     print(f"Compressed Size: {compressed_size_kb:.2f} KB")
     print(f"Compression Ratio: {compression_ratio:.2f} (Compressed/Original)")
-    print(f"Compression Time: {compression_time:.2f} seconds")
-    print(f"Memory Usage: {memory_usage:.2f} MB")
-
-# Example usage - Update paths as needed
-input_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/binary.bmp'
-output_txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/huffman.txt'
-compress_image(input_image_path, output_txt_path)
+    print(f"Compression Time: {report['total_seconds']:.2f} seconds")
+    print(f"Peak Memory Usage: {report['peak_rss_mb']:.2f} MB")
+    print_stages(report)
+
+if __name__ == "__main__":
+    # Example usage - Update paths as needed
+    input_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/binary.bmp'
+    output_txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/huffman.txt'
+    compress_image(input_image_path, output_txt_path)
@@ -1,10 +1,13 @@
 import numpy as np
-from PIL import Image
-import time
-import psutil
 import os
-from skimage.metrics import structural_similarity as ssim
-from skimage.metrics import mean_squared_error
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+from image_io import load_pixels
+from instrumentation import Instrumentation, NO_INSTRUMENTATION, default_sink, print_stages
+from metrics import print_metrics
+from prefix_codes import decode_symbols, tree_codes
+from result_cache import default_cache
 
 class HuffmanNode:
     def __init__(self, char, freq):
@@ -25,72 +28,84 @@ def build_huffman_tree_from_frequencies(frequencies):
         nodes.append(merged)
     return nodes[0]
 
-def decode(encoded_data, root):
-    decoded_output = []
-    current_node = root
-    for bit in encoded_data:
-        current_node = current_node.left if bit == '0' else current_node.right
-        if current_node.char is not None:
-            decoded_output.append(current_node.char)
-            current_node = root
-    return decoded_output
+def decode(encoded_data, root, count):
+    # A single-color image has the one-symbol code "0": one bit per pixel
+    return decode_symbols(encoded_data, tree_codes(root), count)
 
-def read_encoded_data(filepath):
-    with open(filepath, 'r') as file:
-        lines = file.readlines()
+def parse_encoded_data(text):
+    if isinstance(text, str):
+        text = text.encode()
+    separator = b'-' * 50 + b'\n'
+    separator_index = text.find(separator)
+    if separator_index < 0:
+        raise ValueError("Missing separator line in Huffman data")
+    lines = text[:separator_index].decode().splitlines()
     dimensions = tuple(map(int, lines[0].strip().split(',')))
-    separator_index = lines.index('-' * 50 + '\n')
-    frequencies = {int(line.split()[0]): int(line.split()[1]) for line in lines[1:separator_index]}
-    encoded_data = ''.join(lines[separator_index + 1:]).replace('\n', '')
+    frequencies = {int(line.split()[0]): int(line.split()[1]) for line in lines[1:]}
+    encoded_data = np.frombuffer(text, dtype=np.uint8, offset=separator_index + len(separator))
     return dimensions, frequencies, encoded_data
 
+def read_encoded_data(filepath):
+    with open(filepath, 'rb') as file:
+        return parse_encoded_data(file.read())
+
 def reconstruct_image(dimensions, decoded_pixels):
     height, width = dimensions
-    image_array = np.array(decoded_pixels, dtype=np.uint8).reshape((height, width))
+    image_array = np.asarray(decoded_pixels, dtype=np.uint8).reshape((height, width))
     return image_array
 
 def save_image_pil(image_array, output_image_path):
+    from PIL import Image
     img = Image.fromarray(image_array)
     img = img.convert('1')  # Convert the image to 1-bit pixels, black and white
     img.save(output_image_path, 'BMP')  # Save the image in BMP format
 
+def decode_to_array(data, instrumentation=NO_INSTRUMENTATION, table=None):
+    """
+    Decode serialized Huffman data to the stored pixel values (0 and 255).
+    table is the shared code table the data was encoded with, if it carries no frequencies.
+    """
+    with instrumentation.stage('parse'):
+        dimensions, frequencies, encoded_data = parse_encoded_data(data)
+        if not frequencies:
+            frequencies = {int(pixel): freq for pixel, freq in table.items()}
+    with instrumentation.stage('decode'):
+        root = build_huffman_tree_from_frequencies(frequencies)
+        decoded_pixels = decode(encoded_data, root, dimensions[0] * dimensions[1])
+        return reconstruct_image(dimensions, decoded_pixels)
+
+def decompress_bytes(data, instrumentation=NO_INSTRUMENTATION, table=None):
+    """Decode serialized Huffman data and return the binary image as a 0/1 uint8 array."""
+    image_array = decode_to_array(data, instrumentation, table)
+    np.minimum(image_array, 1, out=image_array)  # 0/255 to 0/1 in place
+    return image_array
+
 def decompress_image(input_txt_path, output_image_path, original_image_path):
-    start_time = time.time()
-    dimensions, frequencies, encoded_data = read_encoded_data(input_txt_path)
-    root = build_huffman_tree_from_frequencies(frequencies)
-    decoded_pixels = decode(encoded_data, root)
-    image_array = reconstruct_image(dimensions, decoded_pixels)
-    
-    # Save using PIL to ensure 1-bit depth
-    save_image_pil(image_array, output_image_path)
-    
-    end_time = time.time()
-    decompression_time = end_time - start_time
-    process = psutil.Process(os.getpid())
-    memory_usage = process.memory_info().rss / (1024 ** 2)  # Convert bytes to megabytes
-
-    # Load the original and the decompressed image for quality metrics calculation
-    original_img = np.array(Image.open(original_image_path).convert('L'))
-    decompressed_img = np.array(Image.open(output_image_path).convert('L'))
-
-    # Calculate PSNR, SME, and SSIM
-    mse_value = mean_squared_error(original_img, decompressed_img)
-    if mse_value == 0:
-        psnr_value = 100  # Cap the PSNR at 100 if MSE is 0
-    else:
-        psnr_value = 20 * np.log10(255 / np.sqrt(mse_value))
-        psnr_value = min(psnr_value, 100)  # Cap the PSNR at 100
-
-    ssim_value = ssim(original_img, decompressed_img, data_range=decompressed_img.max() - decompressed_img.min())
-
-    print(f"Decompression Time: {decompression_time:.2f} seconds")
-    print(f"Memory Usage: {memory_usage:.2f} MB")
-    print(f"PSNR: {psnr_value:.2f}")
-    print(f"SME: {mse_value:.2f}")
-    print(f"SSIM: {ssim_value:.2f}")
-
-# Example usage - Update paths as needed
-input_txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/huffman.txt'
-output_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/recon.bmp'
-original_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/binary.bmp'
-decompress_image(input_txt_path, output_image_path, original_image_path)
+    with Instrumentation('huffman_binary.decompress', sink=default_sink()) as instrumentation:
+        with instrumentation.stage('read'):
+            with open(input_txt_path, 'rb') as file:
+                data = file.read()
+        instrumentation.count_in(len(data))
+
+        image_array = decode_to_array(data, instrumentation)
+
+        # Save using PIL to ensure 1-bit depth
+        with instrumentation.stage('write'):
+            save_image_pil(image_array, output_image_path)
+        instrumentation.count_out(os.path.getsize(output_image_path))
+
+    # Compare the original with the reconstruction already in memory
+    original_img = load_pixels(original_image_path, '1') * 255
+
+    report = instrumentation.report
+    print(f"Decompression Time: {report['total_seconds']:.2f} seconds")
+    print(f"Peak Memory Usage: {report['peak_rss_mb']:.2f} MB")
+    print_stages(report)
+    print_metrics(default_cache().evaluate(original_img, image_array))
+
+if __name__ == "__main__":
+    # Example usage - Update paths as needed
+    input_txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/huffman.txt'
+    output_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/recon.bmp'
+    original_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/binary.bmp'
+    decompress_image(input_txt_path, output_image_path, original_image_path)
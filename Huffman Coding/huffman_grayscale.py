@@ -1,11 +1,13 @@
-import numpy as np
-import cv2
-from collections import Counter
 import heapq
-from PIL import Image
+import io
 import os
-import time
-import psutil
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+from image_io import load_pixels, source_nbytes
+from instrumentation import Instrumentation, NO_INSTRUMENTATION, default_sink, print_stages
+from prefix_codes import byte_histogram, encode_symbols, encoded_length, order_of_appearance, tree_codes, write_symbols
+from result_cache import default_cache
 
 class HuffmanNode:
     def __init__(self, char, freq):
@@ -18,8 +20,9 @@ class HuffmanNode:
         return self.freq < other.freq
 
 def calculate_frequencies(image):
-    pixels = image.flatten()
-    frequencies = Counter(pixels)
+    histogram = byte_histogram(image)
+    # Keep the order in which values first appear, as the tree's tie-breaking depends on it
+    frequencies = {pixel: int(histogram[pixel]) for pixel in order_of_appearance(image, histogram)}
     frequencies['EOF'] = 1  # Add EOF marker with a frequency of 1
     return frequencies
 
@@ -39,63 +42,82 @@ def build_huffman_tree(frequencies):
 
     return priority_queue[0]
 
-def build_codes(node, current_code, codes):
-    if node is None:
-        return
-
-    if node.char is not None:
-        codes[node.char] = current_code
-        return
-
-    build_codes(node.left, current_code + "0", codes)
-    build_codes(node.right, current_code + "1", codes)
-
-def huffman_encoding(image):
-    frequencies = calculate_frequencies(image)
+def huffman_encoding(image, frequencies=None):
+    if frequencies is None:
+        frequencies = calculate_frequencies(image)
     root = build_huffman_tree(frequencies)
-    codes = {}
-    build_codes(root, "", codes)
-    return codes, frequencies
+    return tree_codes(root), frequencies
 
 def encode_image(image, codes):
-    flattened = image.flatten()
-    encoded_output = ''.join([codes[pixel] for pixel in flattened])
-    encoded_output += codes['EOF']  # Append the EOF marker
-    return encoded_output
-
-def save_encoded_data(filepath, image, codes, frequencies, encoded_data):
+    # '0'/'1' characters as a uint8 array, with the EOF marker appended
+    return encode_symbols(image, codes, tail=codes['EOF'])
+
+def build_shared_table(image):
+    """Frequencies of the whole image (plus EOF), for tiles that share one code table."""
+    return {str(pixel): int(freq) for pixel, freq in calculate_frequencies(image).items()}
+
+def table_to_frequencies(table):
+    return {int(char) if char.isdigit() else char: freq for char, freq in table.items()}
+
+def text_header(image, frequencies, padding):
+    # Image dimensions
+    lines = [f'{image.shape[0]},{image.shape[1]}\n']
+    # Frequencies, excluding the EOF marker for clarity in this snippet
+    for pixel, freq in frequencies.items():
+        lines.append(f'{pixel} {freq}\n')
+    # Write padding information
+    lines.append(f'Padding: {padding}\n')
+    lines.append('-' * 50 + '\n')
+    return ''.join(lines).encode()
+
+def encoded_to_text(image, frequencies, encoded_data):
     # Calculate padding to make the encoded data a multiple of 8
     padding = (8 - len(encoded_data) % 8) % 8
-    encoded_data += '0' * padding  # Add padding bits to the encoded data
-
-    with open(filepath, 'w') as file:
-        # Image dimensions
-        file.write(f'{image.shape[0]},{image.shape[1]}\n')
-        # Frequencies, excluding the EOF marker for clarity in this snippet
-        for pixel, freq in frequencies.items():
-            file.write(f'{pixel} {freq}\n')
-        # Write padding information
-        file.write(f'Padding: {padding}\n')
-        file.write('-' * 50 + '\n')
-        # Encoded data
-        file.write(encoded_data)
+    # Encoded data, followed by the padding bits
+    return b''.join([text_header(image, frequencies, padding), encoded_data, b'0' * padding])
+
+def save_encoded_data(filepath, image, codes, frequencies, encoded_data):
+    with open(filepath, 'wb') as file:
+        file.write(encoded_to_text(image, frequencies, encoded_data))
+
+def compress_array(image, instrumentation=NO_INSTRUMENTATION, table=None):
+    """
+    Huffman-encode an in-memory grayscale image and return the serialized data as bytes.
+    With a table from build_shared_table the codes come from that table and the
+    frequency list is left out of the output; the decoder must be given the same table.
+    """
+    with instrumentation.stage('encode'):
+        codes, frequencies = huffman_encoding(image, None if table is None else table_to_frequencies(table))
+        # The padding goes in the header, so count the encoded bits before writing them
+        padding = -(encoded_length(byte_histogram(image), codes) + len(codes['EOF'])) % 8
+    with instrumentation.stage('serialize'):
+        # The bits are written straight after the header, as encoded_to_text lays them out, without a copy
+        buffer = io.BytesIO()
+        buffer.write(text_header(image, {} if table is not None else frequencies, padding))
+        write_symbols(buffer, image, codes, tail=codes['EOF'])
+        buffer.write(b'0' * padding)
+        return buffer.getvalue()
 
 def compress_grayscale_image(input_image_path, output_txt_path):
-    start_time = time.time()
-    image = Image.open(input_image_path).convert('L')
-    image = np.array(image)
-    
-    codes, frequencies = huffman_encoding(image)
-    encoded_data = encode_image(image, codes)
-    save_encoded_data(output_txt_path, image, codes, frequencies, encoded_data)
-
-    end_time = time.time()
-    compression_time = end_time - start_time
-    process = psutil.Process(os.getpid())
-    memory_usage = process.memory_info().rss / (1024 ** 2)  # Convert bytes to megabytes
-
-    original_size = os.path.getsize(input_image_path)
-    compressed_size = os.path.getsize(output_txt_path)
+    cache = default_cache()
+    hits = cache.hits
+    with Instrumentation('huffman_grayscale.compress', sink=default_sink()) as instrumentation:
+        with instrumentation.stage('read'):
+            image = load_pixels(input_image_path, 'L')
+        instrumentation.count_in(source_nbytes(input_image_path))
+
+        encoded_data = cache.get_or_compute(
+            'huffman_grayscale.compress', lambda: compress_array(image, instrumentation), (image,), source=__file__)
+        with instrumentation.stage('write'):
+            with open(output_txt_path, 'wb') as file:
+                file.write(encoded_data)
+        instrumentation.count_out(len(encoded_data))
+
+    if cache.hits > hits:
+        print("Cache hit: the compressed data was read from the result cache, so no encode stages were timed.")
+    report = instrumentation.report
+    original_size = report['bytes_in']
+    compressed_size = report['bytes_out']
     original_size_kb = original_size / 1024
     compressed_size_kb = compressed_size / 1024
     compression_ratio = compressed_size / original_size
@@ -103,10 +125,12 @@ def compress_grayscale_image(input_image_path, output_txt_path):
     print(f"Original Size: {original_size_kb:.2f} KB")
     print(f"Compressed Size: {compressed_size_kb:.2f} KB")
     print(f"Compression Ratio: {compression_ratio:.2f} (Compressed/Original)")
-    print(f"Compression Time: {compression_time:.2f} seconds")
-    print(f"Memory Usage: {memory_usage:.2f} MB")
-
-# Example usage - Update paths as needed
-input_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/gray.bmp'  # Path to the grayscale BMP image
-output_txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/huffman.txt'  # Path for saving the Huffman encoded data
-compress_grayscale_image(input_image_path, output_txt_path)
+    print(f"Compression Time: {report['total_seconds']:.2f} seconds")
+    print(f"Peak Memory Usage: {report['peak_rss_mb']:.2f} MB")
+    print_stages(report)
+
+if __name__ == "__main__":
+    # Example usage - Update paths as needed
+    input_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/gray.bmp'  # Path to the grayscale BMP image
+    output_txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/huffman.txt'  # Path for saving the Huffman encoded data
+    compress_grayscale_image(input_image_path, output_txt_path)
@@ -1,11 +1,14 @@
 import heapq
 import os
 import numpy as np
-from PIL import Image
-import time
-import psutil
-from skimage.metrics import structural_similarity as ssim
-from skimage.metrics import mean_squared_error
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+from image_io import load_pixels
+from instrumentation import Instrumentation, NO_INSTRUMENTATION, default_sink, print_stages
+from metrics import print_metrics
+from prefix_codes import decode_symbols, tree_codes
+from result_cache import default_cache
 
 class HuffmanNode:
     def __init__(self, char, freq):
@@ -32,29 +35,26 @@ def build_huffman_tree_from_frequencies(frequencies):
 
     return nodes[0]
 
-def decode(encoded_data, root):
-    decoded_output = []
-    current_node = root
-    for bit in encoded_data:
-        current_node = current_node.left if bit == '0' else current_node.right
-        if current_node.char is not None:
-            if current_node.char == 'EOF':
-                break
-            decoded_output.append(current_node.char)
-            current_node = root
-    return decoded_output
-
-def read_encoded_data(filepath):
-    with open(filepath, 'r') as file:
-        lines = file.readlines()
+def decode(encoded_data, root, count):
+    # Decode exactly count pixels; the EOF code and the padding after them are not needed
+    codes = {char: code for char, code in tree_codes(root).items() if char != 'EOF'}
+    return decode_symbols(encoded_data, codes, count)
+
+def parse_encoded_data(text):
+    if isinstance(text, str):
+        text = text.encode()
+    separator = b'-' * 50 + b'\n'
+    separator_index = text.find(separator)
+    if separator_index < 0:
+        raise ValueError("Missing separator line in Huffman data")
+    lines = text[:separator_index].decode().splitlines()
     dimensions = tuple(map(int, lines[0].strip().split(',')))
-    separator_index = lines.index('-' * 50 + '\n')
     
     # Initialize an empty dictionary for frequencies
     frequencies = {}
     
     # Parse frequency data, skipping lines with non-integer keys or 'Padding'
-    for line in lines[1:separator_index]:
+    for line in lines[1:]:
         if 'Padding' in line:
             padding = int(line.split()[1])
         else:
@@ -66,53 +66,63 @@ def read_encoded_data(filepath):
                 char = int(char)  # Convert character key to integer if it is a digit
             frequencies[char] = freq
 
-    encoded_data = ''.join(lines[separator_index + 1:]).replace('\n', '')
+    # The '0'/'1' characters, viewed in place as a uint8 array
+    encoded_data = np.frombuffer(text, dtype=np.uint8, offset=separator_index + len(separator))
     return dimensions, frequencies, encoded_data, padding
 
+def read_encoded_data(filepath):
+    with open(filepath, 'rb') as file:
+        return parse_encoded_data(file.read())
 
 def reconstruct_image(dimensions, decoded_pixels):
     height, width = dimensions
-    image_array = np.array(decoded_pixels, dtype=np.uint8).reshape((height, width))
+    image_array = np.asarray(decoded_pixels, dtype=np.uint8).reshape((height, width))
     return image_array
 
+def decompress_bytes(data, instrumentation=NO_INSTRUMENTATION, table=None):
+    """
+    Decode serialized Huffman data and return the grayscale image array.
+    table is the shared code table the data was encoded with, if it carries no frequencies.
+    """
+    with instrumentation.stage('parse'):
+        dimensions, frequencies, encoded_data, padding = parse_encoded_data(data)
+        if not frequencies:
+            frequencies = {int(char) if char.isdigit() else char: freq for char, freq in table.items()}
+    with instrumentation.stage('decode'):
+        root = build_huffman_tree_from_frequencies(frequencies)
+        if padding:
+            encoded_data = encoded_data[:-padding]  # Remove padding bits
+        decoded_pixels = decode(encoded_data, root, dimensions[0] * dimensions[1])
+        return reconstruct_image(dimensions, decoded_pixels)
+
 def decompress_grayscale_image(input_txt_path, output_image_path, original_image_path):
-    start_time = time.time()
-    dimensions, frequencies, encoded_data, padding = read_encoded_data(input_txt_path)
-    root = build_huffman_tree_from_frequencies(frequencies)
-    encoded_data = encoded_data[:-padding]  # Remove padding bits
-    decoded_pixels = decode(encoded_data, root)
-    image_array = reconstruct_image(dimensions, decoded_pixels)
-
-    img = Image.fromarray(image_array, mode='L')
-    img.save(output_image_path)
-
-    end_time = time.time()
-    decompression_time = end_time - start_time
-    process = psutil.Process(os.getpid())
-    memory_usage = process.memory_info().rss / (1024 ** 2)  # Convert bytes to megabytes
-
-    # Load the original and the decompressed image for quality metrics calculation
-    original_img = np.array(Image.open(original_image_path).convert('L'))
-    decompressed_img = np.array(Image.open(output_image_path).convert('L'))
-
-    mse_value = mean_squared_error(original_img, decompressed_img)
-    if mse_value == 0:
-        psnr_value = 100
-    else:
-        psnr_value = 20 * np.log10(255 / np.sqrt(mse_value))
-        psnr_value = min(psnr_value, 100)  # Cap PSNR at 100
-
-    ssim_value = ssim(original_img, decompressed_img, data_range=255)
-
-    print(f"Decompression Time: {decompression_time:.2f} seconds")
-    print(f"Memory Usage: {memory_usage:.2f} MB")
-    print(f"PSNR: {psnr_value:.2f}")
-    print(f"SME: {mse_value:.2f}")
-    print(f"SSIM: {ssim_value:.2f}")
-
-# Example usage - Update paths as needed
-input_txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/huffman.txt'
-output_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/recon.bmp'
-original_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/gray.bmp'
-
-decompress_grayscale_image(input_txt_path, output_image_path, original_image_path)
+    with Instrumentation('huffman_grayscale.decompress', sink=default_sink()) as instrumentation:
+        with instrumentation.stage('read'):
+            with open(input_txt_path, 'rb') as file:
+                data = file.read()
+        instrumentation.count_in(len(data))
+
+        image_array = decompress_bytes(data, instrumentation)
+
+        with instrumentation.stage('write'):
+            from PIL import Image
+            img = Image.fromarray(image_array, mode='L')
+            img.save(output_image_path)
+        instrumentation.count_out(os.path.getsize(output_image_path))
+
+    # Compare the original with the reconstruction already in memory
+    original_img = load_pixels(original_image_path, 'L')
+
+    report = instrumentation.report
+    print(f"Decompression Time: {report['total_seconds']:.2f} seconds")
+    print(f"Peak Memory Usage: {report['peak_rss_mb']:.2f} MB")
+    print_stages(report)
+    print_metrics(default_cache().evaluate(original_img, image_array))
+
+if __name__ == "__main__":
+    # Example usage - Update paths as needed
+    input_txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/huffman.txt'
+    output_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/recon.bmp'
+    original_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/gray.bmp'
+
+    decompress_grayscale_image(input_txt_path, output_image_path, original_image_path)
@@ -1,57 +1,74 @@
 import numpy as np
-from PIL import Image
 import os
-import time
-import psutil
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+from array_text import format_batches, format_columns
+from image_io import load_pixels, source_nbytes
+from instrumentation import Instrumentation, NO_INSTRUMENTATION, default_sink, print_stages
+from lzw_dictionary import DEFAULT_MAX_SIZE, format_dictionary_option, iter_codes, lzw_encode
+from result_cache import default_cache
+from scan_order import format_header, iter_scan_blocks, resolve_scan_order
 
 def read_image(file_path):
-    """Reads an image and converts it to grayscale."""
-    image = Image.open(file_path).convert('L')
-    data = np.array(image)
-    return data
+    """Reads an image, array file or array and converts it to grayscale."""
+    return load_pixels(file_path, 'L')
+
+def lzw_compress(data, max_size=None, policy='reset'):
+    """
+    Compresses data using the LZW algorithm, given as a buffer of byte symbols.
+    max_size caps the dictionary, and policy ('reset', 'freeze' or 'lru') says what happens when it is full.
+    """
+    return lzw_encode(data, max_size, policy)
 
-def lzw_compress(data):
-    """Compresses data using the LZW algorithm."""
-    dictionary = {chr(i): i for i in range(256)}  # Initialize dictionary with single character strings
-    dict_size = 256  # Next code to assign
-    p = ""
-    compressed = []
-    for c in data:
-        pc = p + c
-        if pc in dictionary:
-            p = pc
-        else:
-            compressed.append(dictionary[p])
-            dictionary[pc] = dict_size
-            dict_size += 1
-            p = c
-    if p:  # Don't forget to output the last code
-        compressed.append(dictionary[p])
-    return compressed
+def text_header(dimensions, order='row', max_size=None, policy='reset'):
+    """The first line of the .txt format: image dimensions, scan order and dictionary limits."""
+    return format_header(dimensions, order, ',', [format_dictionary_option(max_size, policy)])
+
+def compressed_to_text(compressed, dimensions, order='row', max_size=None, policy='reset'):
+    """Serializes compressed codes along with image dimensions to the .txt format."""
+    codes = np.frombuffer(compressed, dtype=np.uint32)
+    return format_columns([codes], ('\n',), header=text_header(dimensions, order, max_size, policy))
 
 def save_compressed_data(compressed, output_file, dimensions):
     """Saves compressed data along with image dimensions to a file."""
-    with open(output_file, 'w') as file:
-        file.write(f"{dimensions[0]},{dimensions[1]}\n")
-        for code in compressed:
-            file.write(f"{code}\n")
+    with open(output_file, 'wb') as file:
+        file.write(compressed_to_text(compressed, dimensions))
+
+def compress_array(data, instrumentation=NO_INSTRUMENTATION, order='row', max_size=DEFAULT_MAX_SIZE, policy='reset'):
+    """
+    Compresses an in-memory grayscale image and returns the serialized data as bytes.
+    order: a scan order from scan_order.ORDERS, or 'auto' for the one giving the fewest runs.
+    max_size, policy: bound the LZW dictionary (see lzw_dictionary.py), None for no bound; recorded in the header.
+    """
+    with instrumentation.stage('transform'):
+        order = resolve_scan_order(data, order)
+        symbols = iter_scan_blocks(np.asarray(data, dtype=np.uint8), order)  # one byte per pixel, a block at a time
+    with instrumentation.stage('encode'):
+        # Each batch of codes is written out as it is emitted, so the codes of the whole image are never held
+        batches = ((np.frombuffer(codes, dtype=np.uint32),) for codes in iter_codes(symbols, max_size, policy))
+        return format_batches(batches, ('\n',), header=text_header(data.shape, order, max_size, policy))
 
 def compress_grayscale_image(input_file, output_file):
     """Compresses a grayscale image and saves the compressed data."""
-    start_time = time.time()
-    data = read_image(input_file)
-    flat_data = data.flatten()
-    char_data = [chr(pixel) for pixel in flat_data]  # Convert pixels to characters
-    compressed_data = lzw_compress(char_data)
-    save_compressed_data(compressed_data, output_file, data.shape)
-    
-    end_time = time.time()
-    compression_time = end_time - start_time
-    process = psutil.Process(os.getpid())
-    memory_usage = process.memory_info().rss / (1024 ** 2)  # Convert bytes to megabytes
+    cache = default_cache()
+    hits = cache.hits
+    with Instrumentation('lzw_grayscale.compress', sink=default_sink()) as instrumentation:
+        with instrumentation.stage('read'):
+            data = read_image(input_file)
+        instrumentation.count_in(source_nbytes(input_file))
+        compressed_data = cache.get_or_compute(
+            'lzw_grayscale.compress', lambda: compress_array(data, instrumentation), (data,), source=__file__)
+        with instrumentation.stage('write'):
+            with open(output_file, 'wb') as file:
+                file.write(compressed_data)
+        instrumentation.count_out(len(compressed_data))
 
-    original_size = os.path.getsize(input_file)
-    compressed_size = os.path.getsize(output_file)
+    if cache.hits > hits:
+        print("Cache hit: the compressed data was read from the result cache, so no encode stages were timed.")
+    report = instrumentation.report
+    original_size = report['bytes_in']
+    compressed_size = report['bytes_out']
     original_size_kb = original_size / 1024
     compressed_size_kb = compressed_size / 1024
     compression_ratio = compressed_size / original_size if original_size != 0 else float('inf')
@@ -60,11 +77,13 @@ def compress_grayscale_image(input_file, output_file):
     print(f"Original Size: {original_size_kb:.2f} KB")
     print(f"Compressed Size: {compressed_size_kb:.2f} KB")
     print(f"Compression Ratio: {compression_ratio:.2f} (Original/Compressed)")
-    print(f"Compression Time: {compression_time:.2f} seconds")
-    print(f"Memory Usage: {memory_usage:.2f} MB")
+    print(f"Compression Time: {report['total_seconds']:.2f} seconds")
+    print(f"Peak Memory Usage: {report['peak_rss_mb']:.2f} MB")
+    print_stages(report)
     print(f"Compression completed. Compressed data saved to {output_file}")
 
-# Example usage
-input_file = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/gray.bmp'
-output_file = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/lzw.txt'
-compress_grayscale_image(input_file, output_file)
+if __name__ == "__main__":
+    # Example usage
+    input_file = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/gray.bmp'
+    output_file = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/lzw.txt'
+    compress_grayscale_image(input_file, output_file)
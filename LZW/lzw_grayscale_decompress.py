@@ -1,73 +1,88 @@
 import numpy as np
 import os
-from PIL import Image
-import time
-import psutil
-from skimage.metrics import structural_similarity as ssim
-from skimage.metrics import mean_squared_error
+import sys
+from itertools import chain
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+from array_text import iter_integers, parse_integers, split_header
+from image_io import load_pixels
+from instrumentation import Instrumentation, NO_INSTRUMENTATION, default_sink, print_stages
+from lzw_dictionary import lzw_decode, parse_dictionary_option
+from metrics import print_metrics
+from result_cache import default_cache
+from scan_order import parse_header, unscan_pixels
+
+def parse_compressed_data(text):
+    """
+    Returns the codes (as uint32), image dimensions, scan order and dictionary (max_size, policy)
+    of LZW .txt content, given as bytes or str.
+    """
+    if isinstance(text, str):
+        text = text.encode()
+    dimensions, order, dictionary, offset = parse_text_header(text)
+    compressed_data = parse_integers(text, offset, dtype=np.uint32)
+    return compressed_data, dimensions, order, dictionary
+
+def parse_text_header(text):
+    """Image dimensions, scan order, dictionary (max_size, policy) and the offset of the codes in LZW .txt content."""
+    header, offset = split_header(text)
+    dimensions, order, options = parse_header(header, ',')
+    return dimensions, order, parse_dictionary_option(options), offset
+
+def iter_text_codes(text, offset):
+    """The codes of LZW .txt content from offset on, parsed a block at a time as they are consumed."""
+    return chain.from_iterable(memoryview(codes) for codes in iter_integers(text, offset, dtype=np.uint32))
 
 def read_compressed_data(input_file):
-    with open(input_file, 'r') as file:
-        lines = file.readlines()
-        dimensions = tuple(map(int, lines[0].strip().split(',')))
-        compressed_data = [int(line.strip()) for line in lines[1:]]
-    return compressed_data, dimensions
+    with open(input_file, 'rb') as file:
+        return parse_compressed_data(file.read())
 
-def lzw_decompress(compressed):
-    dictionary = {i: chr(i) for i in range(256)}
-    result = []
-    
-    w = chr(compressed.pop(0))
-    result.append(w)
-    
-    for k in compressed:
-        if k in dictionary:
-            entry = dictionary[k]
-        else:
-            entry = w + w[0]
-        result.append(entry)
-        
-        dictionary[len(dictionary)] = w + entry[0]
-        w = entry
-    
-    return ''.join(result)
+def lzw_decompress(compressed, size, max_size=None, policy='reset'):
+    """Decodes the codes into a bytearray of size symbols, with the dictionary limits they were encoded with."""
+    return lzw_decode(memoryview(np.ascontiguousarray(compressed, dtype=np.uint32)), size, max_size, policy)
 
 def reconstruct_image(data, dimensions):
-    pixels = [ord(pixel) for pixel in data]
-    image_array = np.array(pixels).reshape(dimensions)
-    image = Image.fromarray(image_array.astype('uint8'), 'L')
+    image_array = np.frombuffer(data, dtype=np.uint8).reshape(dimensions)
+    from PIL import Image
+    image = Image.fromarray(image_array, 'L')
     return image
 
+def decompress_bytes(data, instrumentation=NO_INSTRUMENTATION):
+    """Decodes serialized LZW data and returns the grayscale image array."""
+    with instrumentation.stage('parse'):
+        dimensions, order, dictionary, offset = parse_text_header(data)
+    with instrumentation.stage('decode'):
+        decompressed_data = lzw_decode(iter_text_codes(data, offset), dimensions[0] * dimensions[1], *dictionary)
+    with instrumentation.stage('transform'):
+        return unscan_pixels(np.frombuffer(decompressed_data, dtype=np.uint8), dimensions, order)
+
 def decompress_grayscale_image(input_file, output_file, original_image_path):
-    start_time = time.time()
-    compressed_data, dimensions = read_compressed_data(input_file)
-    decompressed_data = lzw_decompress(compressed_data)
-    image = reconstruct_image(decompressed_data, dimensions)
-    image.save(output_file)
+    with Instrumentation('lzw_grayscale.decompress', sink=default_sink()) as instrumentation:
+        with instrumentation.stage('read'):
+            with open(input_file, 'rb') as file:
+                data = file.read()
+        instrumentation.count_in(len(data))
 
-    end_time = time.time()
-    decompression_time = end_time - start_time
-    process = psutil.Process(os.getpid())
-    memory_usage = process.memory_info().rss / (1024 ** 2)  # Convert bytes to megabytes
+        decompressed_img = decompress_bytes(data, instrumentation)
 
-    # Load the original and the decompressed image for quality metrics calculation
-    original_img = np.array(Image.open(original_image_path).convert('L'))
-    decompressed_img = np.array(Image.open(output_file).convert('L'))
+        with instrumentation.stage('write'):
+            from PIL import Image
+            Image.fromarray(decompressed_img, 'L').save(output_file)
+        instrumentation.count_out(os.path.getsize(output_file))
 
-    mse_value = mean_squared_error(original_img, decompressed_img)
-    psnr_value = 20 * np.log10(255 / np.sqrt(mse_value)) if mse_value != 0 else float('inf')
-    psnr_value = min(psnr_value, 100)  # Cap PSNR at 100
-    ssim_value = ssim(original_img, decompressed_img, data_range=255)
+    # Compare the original with the reconstruction already in memory
+    original_img = load_pixels(original_image_path, 'L')
 
-    print(f"Decompression Time: {decompression_time:.2f} seconds")
-    print(f"Memory Usage: {memory_usage:.2f} MB")
-    print(f"PSNR: {psnr_value:.2f}")
-    print(f"SME: {mse_value:.2f}")
-    print(f"SSIM: {ssim_value:.2f}")
+    report = instrumentation.report
+    print(f"Decompression Time: {report['total_seconds']:.2f} seconds")
+    print(f"Peak Memory Usage: {report['peak_rss_mb']:.2f} MB")
+    print_stages(report)
+    print_metrics(default_cache().evaluate(original_img, decompressed_img))
     print(f"Decompression completed. Image saved to {output_file}")
 
-# Example usage - Update paths as needed
-input_file = '/Users/ahmedalwan/Desktop/FYP/Code/Final/barbara/lzw.txt'
-output_file = '/Users/ahmedalwan/Desktop/FYP/Code/Final/barbara/recon.bmp'
-original_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/barbara/gray.bmp'
-decompress_grayscale_image(input_file, output_file, original_image_path)
+if __name__ == "__main__":
+    # Example usage - Update paths as needed
+    input_file = '/Users/ahmedalwan/Desktop/FYP/Code/Final/barbara/lzw.txt'
+    output_file = '/Users/ahmedalwan/Desktop/FYP/Code/Final/barbara/recon.bmp'
+    original_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/barbara/gray.bmp'
+    decompress_grayscale_image(input_file, output_file, original_image_path)
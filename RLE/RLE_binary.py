@@ -1,81 +1,101 @@
-from PIL import Image
 import numpy as np
 import os
-import time
-import psutil
+import sys
 
-def rle_encode(img_array):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+from array_text import format_batches, format_columns
+from image_io import load_pixels, source_nbytes
+from instrumentation import Instrumentation, NO_INSTRUMENTATION, default_sink, print_stages
+from result_cache import default_cache
+from rice_coding import CODINGS, encode_runs, iter_runs, join_runs
+from scan_order import format_header, iter_scan_blocks, resolve_scan_order
+
+def rle_encode(img_array, order='row'):
     """
-    Run-Length Encoding for an image. Assumes img_array contains 0s and 1s as integer values.
+    Run-Length Encoding for a binary image. Any nonzero pixel counts as 1, so 0/1 and 0/255 images give the same runs.
+    Returns the run values (0/1 uint8) and run lengths as arrays.
+    The pixels are read in the given scan order (see scan_order.py).
     """
-    if img_array.dtype != int:
-        img_array = img_array.astype(int)
-
-    pixels = img_array.flatten()
-    rle = []
-    prev_pixel = pixels[0]
-    count = 1
+    return join_runs(iter_runs(iter_scan_blocks(img_array, order), binary=True), img_array.size)
 
-    for pixel in pixels[1:]:
-        if pixel == prev_pixel:
-            count += 1
-        else:
-            rle.append((prev_pixel, count))
-            prev_pixel = pixel
-            count = 1
-    rle.append((prev_pixel, count))
-    return rle
+def rle_to_text(rle_data, shape, order='row'):
+    """
+    Serialize RLE data to the .txt format, with image dimensions (and the scan order, if not row) on the first line.
+    """
+    values, counts = rle_data
+    return format_columns([values, counts], (' ', '\n'), header=format_header(shape, order))
 
 def save_rle_to_txt_with_dimensions(rle_data, txt_path, shape):
     """
     Save RLE data to a .txt file with image dimensions included.
     """
-    with open(txt_path, 'w') as file:
-        file.write(f"{shape[0]} {shape[1]}\n")
-        for pixel, count in rle_data:
-            # No need to change pixel value, just use as is
-            file.write(f"{pixel} {count}\n")
+    with open(txt_path, 'wb') as file:
+        file.write(rle_to_text(rle_data, shape))
 
-def calculate_metrics(original_path, compressed_path, start_time, end_time):
+def compress_array(img_array, instrumentation=NO_INSTRUMENTATION, order='row', coding='text'):
     """
-    Calculate and print compression ratio, compression time, and memory usage.
+    Encode an in-memory binary image and return the serialized .txt content as bytes.
+    order: a scan order from scan_order.ORDERS, or 'auto' for the one giving the fewest runs.
+    coding: 'text' for the .txt format, or 'rice' for adaptive Golomb-Rice coded runs (see rice_coding.py).
     """
-    original_size = os.path.getsize(original_path)
-    compressed_size = os.path.getsize(compressed_path)
+    if coding not in CODINGS:
+        raise ValueError(f"Unknown RLE coding '{coding}'. Available codings: {', '.join(CODINGS)}")
+    with instrumentation.stage('encode'):
+        order = resolve_scan_order(img_array, order)
+        runs = iter_runs(iter_scan_blocks(img_array, order), binary=True)
+        if coding == 'rice':
+            return encode_runs(runs, img_array.shape[:2], order, 'binary')
+        # Each batch of runs is written out as it is found, so the runs of the whole image are never held
+        return format_batches(runs, (' ', '\n'), header=format_header(img_array.shape[:2], order))
+
+def calculate_metrics(report):
+    """
+    Print compression ratio, compression time, and peak memory usage from an instrumentation report.
+    """
+    original_size = report['bytes_in']
+    compressed_size = report['bytes_out']
     # Convert bytes to kilobytes for a more readable format
     original_size_kb = original_size / 1024
     compressed_size_kb = compressed_size / 1024
 
     compression_ratio = compressed_size / original_size  # Keep the ratio in bytes for accurate calculation
-    compression_time = end_time - start_time
-    process = psutil.Process(os.getpid())
-    memory_usage = process.memory_info().rss / (1024 ** 2)  # Convert bytes to megabytes
 
     print(f"Original Size: {original_size_kb:.2f} KB")
     print(f"Compressed Size: {compressed_size_kb:.2f} KB")
     print(f"Compression Ratio: {compression_ratio:.2f} (Compressed/Original)")
-    print(f"Compression Time: {compression_time:.2f} seconds")
-    print(f"Memory Usage: {memory_usage:.2f} MB")
-
-
+    print(f"Compression Time: {report['total_seconds']:.2f} seconds")
+    print(f"Peak Memory Usage: {report['peak_rss_mb']:.2f} MB")
+    print_stages(report)
 
-# Path setup
-image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/binary.bmp'
-rle_txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/rle.txt'
+if __name__ == "__main__":
+    # Path setup (binary.bmp, or the .bits/.npy array written by Convert_binary.py)
+    image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/binary.bmp'
+    rle_txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/rle.txt'
+    order = 'row'    # or 'column', 'serpentine', 'hilbert', 'auto'
+    coding = 'text'  # or 'rice'
+    cache = default_cache()
+    hits = cache.hits
 
-# Open and process image
-img = Image.open(image_path)
-img_array = np.array(img)
+    with Instrumentation('rle_binary.compress', sink=default_sink()) as instrumentation:
+        # Open and process image
+        with instrumentation.stage('read'):
+            img_array = load_pixels(image_path, '1')
+        instrumentation.count_in(source_nbytes(image_path))
 
-# Compression
-start_time = time.time()
-rle_compressed = rle_encode(img_array)
-end_time = time.time()
+        # Compression
+        rle_data = cache.get_or_compute(
+            'rle_binary.compress', lambda: compress_array(img_array, instrumentation, order=order, coding=coding),
+            (img_array,), {'order': order, 'coding': coding}, source=__file__)
 
-# Save compressed data
-save_rle_to_txt_with_dimensions(rle_compressed, rle_txt_path, img_array.shape[:2])
+        # Save compressed data
+        with instrumentation.stage('write'):
+            with open(rle_txt_path, 'wb') as file:
+                file.write(rle_data)
+        instrumentation.count_out(len(rle_data))
 
-# Metrics calculation
-calculate_metrics(image_path, rle_txt_path, start_time, end_time)
+    # Metrics calculation
+    if cache.hits > hits:
+        print("Cache hit: the compressed data was read from the result cache, so no encode stages were timed.")
+    calculate_metrics(instrumentation.report)
 
-print("RLE data saved to .txt file.")
+    print("RLE data saved to .txt file.")
@@ -1,59 +1,82 @@
-from PIL import Image
 import numpy as np
 import os
-import time
-import psutil
-from skimage.metrics import structural_similarity as ssim
-from skimage.metrics import mean_squared_error
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+from array_text import iter_rows, parse_integers, split_header
+from image_io import load_pixels
+from instrumentation import Instrumentation, NO_INSTRUMENTATION, default_sink, print_stages
+from metrics import print_metrics
+from result_cache import default_cache
+from rice_coding import decode_pixels, decode_runs, expand_runs, is_rice_data
+from scan_order import parse_header
+
+def parse_rle_runs(data):
+    """
+    Parse the contents of an RLE .txt file (bytes or str), or Rice-coded RLE data, into (height, width),
+    run values, run lengths and the scan order the runs follow.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    if is_rice_data(data):
+        return decode_runs(data, 'binary')
+    header, offset = split_header(data)
+    (height, width), order, _ = parse_header(header)
+    runs = parse_integers(data, offset, np.uint32 if height * width < 2 ** 32 else np.int64).reshape(-1, 2)
+    values, counts = runs[:, 0], runs[:, 1]
+    if counts.sum() != height * width:
+        raise ValueError(f"RLE runs cover {counts.sum()} pixels, expected {height * width}")
+    return (height, width), values, counts, order
+
+def rle_decode_text(text):
+    """
+    Rebuild the binary image (0 and 255 values) from the contents of an RLE .txt file.
+    """
+    img_array = decompress_bytes(text.encode() if isinstance(text, str) else text)
+    img_array *= 255
+    return img_array
+
+def decompress_bytes(data, instrumentation=NO_INSTRUMENTATION):
+    """
+    Decode serialized RLE data and return the binary image as a 0/1 uint8 array.
+    The runs are parsed and expanded a block at a time, never all at once.
+    """
+    with instrumentation.stage('decode'):
+        if is_rice_data(data):
+            return decode_pixels(data, 'binary')
+        header, offset = split_header(data)
+        (height, width), order, _ = parse_header(header)
+        rows = iter_rows(data, 2, offset, np.uint32 if height * width < 2 ** 32 else np.int64)
+        return expand_runs((((runs[:, 0] == 1).view(np.uint8), runs[:, 1]) for runs in rows), (height, width), order)
 
 def rle_decompress(txt_path, output_image_path, original_image_path):
-    start_time = time.time()
-    
-    with open(txt_path, 'r') as file:
-        lines = file.readlines()
-
-    height, width = map(int, lines[0].strip().split(' '))
-    img_array = np.zeros((height, width), dtype=np.uint8)
-
-    index = 0
-    for line in lines[1:]:
-        value, count = map(int, line.strip().split(' '))
-        fill_value = 255 if value == 1 else 0
-        for _ in range(count):
-            img_array[index // width][index % width] = fill_value
-            index += 1
-
-    img = Image.fromarray(img_array)
-    img.save(output_image_path, 'BMP')
-    
-    end_time = time.time()
-    decompression_time = end_time - start_time
-    process = psutil.Process(os.getpid())
-    memory_usage = process.memory_info().rss / (1024 ** 2)  # Convert bytes to megabytes
-
-    print(f"Decompression Time: {decompression_time:.2f} seconds")
-    print(f"Memory Usage: {memory_usage:.2f} MB")
-
-    original_img = np.array(Image.open(original_image_path).convert('L'))
-    decompressed_img = np.array(Image.open(output_image_path).convert('L'))
-
-    psnr_value = psnr(original_img, decompressed_img)
-    sme_value = mean_squared_error(original_img, decompressed_img)
-    ssim_value = ssim(original_img, decompressed_img, data_range=decompressed_img.max() - decompressed_img.min())
-
-    print(f"PSNR: {psnr_value:.2f}")
-    print(f"SME: {sme_value:.2f}")
-    print(f"SSIM: {ssim_value:.2f}")
-
-def psnr(original, compressed):
-    mse = mean_squared_error(original, compressed)
-    if mse == 0:
-        return 100
-    max_pixel = 255.0
-    return 20 * np.log10(max_pixel / np.sqrt(mse))
-
-# Example usage
-txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/rle.txt' 
-output_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/recon.bmp' 
-original_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/binary.bmp'
-rle_decompress(txt_path, output_image_path, original_image_path)
+    with Instrumentation('rle_binary.decompress', sink=default_sink()) as instrumentation:
+        with instrumentation.stage('read'):
+            with open(txt_path, 'rb') as file:
+                text = file.read()
+        instrumentation.count_in(os.path.getsize(txt_path))
+
+        with instrumentation.stage('decode'):
+            img_array = rle_decode_text(text)
+
+        with instrumentation.stage('write'):
+            from PIL import Image
+            img = Image.fromarray(img_array)
+            img.save(output_image_path, 'BMP')
+        instrumentation.count_out(os.path.getsize(output_image_path))
+
+    report = instrumentation.report
+    print(f"Decompression Time: {report['total_seconds']:.2f} seconds")
+    print(f"Peak Memory Usage: {report['peak_rss_mb']:.2f} MB")
+    print_stages(report)
+
+    # Compare against the reconstruction already in memory
+    original_img = load_pixels(original_image_path, '1') * 255
+    print_metrics(default_cache().evaluate(original_img, img_array))
+
+if __name__ == "__main__":
+    # Example usage
+    txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/rle.txt' 
+    output_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/recon.bmp' 
+    original_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/binary.bmp'
+    rle_decompress(txt_path, output_image_path, original_image_path)
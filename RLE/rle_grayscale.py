@@ -1,79 +1,183 @@
-from PIL import Image
 import numpy as np
 import os
-import time
-import psutil
+import sys
 
-def rle_encode_grayscale(img_array):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+from array_text import format_batches, format_columns
+from image_io import load_pixels, source_nbytes
+from instrumentation import Instrumentation, NO_INSTRUMENTATION, default_sink, print_stages
+from metrics import evaluate, print_metrics
+from result_cache import default_cache
+from rice_coding import CODINGS, encode_runs, iter_runs, join_runs
+from scan_order import format_header, iter_scan_blocks, resolve_scan_order, unscan_pixels
+
+MERGE_BLOCK = 1 << 14
+
+def rle_encode_grayscale(img_array, delta=0, order='row'):
     """
     Run-Length Encoding for a grayscale image. Assumes img_array contains pixel values ranging from 0 to 255.
+    Returns the run values (uint8) and run lengths as arrays.
+    With delta > 0 the encoding is near-lossless: runs continue while every pixel stays
+    within +/-delta of the run value, so no pixel is reconstructed more than delta off.
+    The pixels are read in the given scan order (see scan_order.py).
+    """
+    if delta < 0:
+        raise ValueError(f"delta must be non-negative, got {delta}")
+    values, counts = join_runs(iter_runs(iter_scan_blocks(img_array, order)), img_array.size)
+    values = values.astype(np.uint8, copy=False)
+    if delta:
+        return merge_runs_near_lossless(values, counts, delta)
+    return values, counts
+
+def longest_runs(values, delta):
+    """
+    For every start position i, the longest run values[i:i + length] whose max - min is at most
+    2 * delta, with that run's min and max. Binary lifting over min/max tables of power-of-two
+    windows finds all of them at once.
+    """
+    n = values.size
+    mins, maxs = [values], [values]  # level k: min/max of values[i:i + 2**k]
+    while (1 << len(mins)) <= n:
+        half = 1 << (len(mins) - 1)
+        mins.append(np.minimum(mins[-1][:-half], mins[-1][half:]))
+        maxs.append(np.maximum(maxs[-1][:-half], maxs[-1][half:]))
+
+    length = np.ones(n, dtype=np.int64)
+    low, high = values.copy(), values.copy()
+    for level in reversed(range(len(mins))):
+        # Try to extend each run by the 2**level values that follow it
+        following = np.arange(n) + length
+        valid = following < mins[level].size
+        following[~valid] = 0
+        new_low = np.minimum(low, mins[level][following])
+        new_high = np.maximum(high, maxs[level][following])
+        extend = valid & (new_high - new_low <= 2 * delta)
+        length[extend] += 1 << level
+        low = np.where(extend, new_low, low)
+        high = np.where(extend, new_high, high)
+    return length, low, high
+
+def merge_runs_near_lossless(values, counts, delta):
+    """
+    Merge consecutive runs greedily, each merged run as long as its values stay within
+    +/-delta of its value, the midpoint of their min and max. Returns (values, counts).
+    """
+    run_starts, run_values = [], []
+    position = 0
+    block_size = MERGE_BLOCK
+    while position < values.size:
+        block = values[position:position + block_size]
+        length, low, high = longest_runs(block, delta)
+
+        # Follow the greedy chain 0 -> length[0] -> ... by pointer doubling
+        jumps = np.append(np.minimum(np.arange(block.size) + length, block.size), block.size)
+        starts = np.zeros(1, dtype=np.int64)
+        while starts[-1] < block.size:
+            starts = np.concatenate([starts, jumps[starts]])
+            jumps = jumps[jumps]
+        starts = starts[:np.searchsorted(starts, block.size)]
+        if position + block.size < values.size:
+            if starts.size == 1:
+                block_size *= 2  # one run covers the whole block; look further ahead
+                continue
+            starts = starts[:-1]  # the last run may continue into the next block; redo it there
+
+        run_starts.append(starts + position)
+        run_values.append(low[starts] + (high[starts] - low[starts]) // 2)
+        position += int(starts[-1] + length[starts[-1]])
+        block_size = MERGE_BLOCK
+
+    run_starts = np.concatenate(run_starts)
+    return np.concatenate(run_values), np.add.reduceat(counts, run_starts)
+
+def rle_to_text_grayscale(rle_data, shape, order='row'):
+    """
+    Serialize grayscale RLE data to the .txt format, with image dimensions (and the scan order, if not row)
+    on the first line.
     """
-    pixels = img_array.flatten()
-    rle = []
-    prev_pixel = pixels[0]
-    count = 1
-
-    for pixel in pixels[1:]:
-        if pixel == prev_pixel:
-            count += 1
-        else:
-            rle.append((prev_pixel, count))
-            prev_pixel = pixel
-            count = 1
-    rle.append((prev_pixel, count))
-    return rle
+    values, counts = rle_data
+    return format_columns([values, counts], (' ', '\n'), header=format_header(shape, order))
 
 def save_rle_to_txt_with_dimensions_grayscale(rle_data, txt_path, shape):
     """
     Save RLE data to a .txt file with image dimensions included, specifically for grayscale images.
     Pixels values and their counts are saved, supporting the full range from 0 to 255.
     """
-    with open(txt_path, 'w') as file:
-        file.write(f"{shape[0]} {shape[1]}\n")
-        for pixel_value, count in rle_data:
-            file.write(f"{pixel_value} {count}\n")
+    with open(txt_path, 'wb') as file:
+        file.write(rle_to_text_grayscale(rle_data, shape))
 
-def calculate_metrics(original_path, compressed_path, start_time, end_time):
+def compress_array(img_array, instrumentation=NO_INSTRUMENTATION, delta=0, order='row', coding='text'):
     """
-    Calculate and print compression ratio, compression time, and memory usage.
+    Encode an in-memory grayscale image and return the serialized .txt content as bytes.
+    delta > 0 selects near-lossless coding with a maximum error of delta per pixel; the
+    output is in the same format and decodes with the usual decompressor.
+    order: a scan order from scan_order.ORDERS, or 'auto' for the one giving the fewest runs.
+    coding: 'text' for the .txt format, or 'rice' for adaptive Golomb-Rice coded runs (see rice_coding.py).
     """
-    original_size = os.path.getsize(original_path)
-    compressed_size = os.path.getsize(compressed_path)
+    if coding not in CODINGS:
+        raise ValueError(f"Unknown RLE coding '{coding}'. Available codings: {', '.join(CODINGS)}")
+    with instrumentation.stage('encode'):
+        order = resolve_scan_order(img_array, order)
+        runs = [rle_encode_grayscale(img_array, delta, order)] if delta else iter_runs(iter_scan_blocks(img_array, order))
+        if coding == 'rice':
+            return encode_runs(runs, img_array.shape[:2], order, 'grayscale')
+        # Lossless runs are written out a batch at a time as they are found, so the runs of the whole image are
+        # never held; near-lossless runs have to be merged first
+        return format_batches(runs, (' ', '\n'), header=format_header(img_array.shape[:2], order))
+
+def calculate_metrics(report):
+    """
+    Print compression ratio, compression time, and peak memory usage from an instrumentation report.
+    """
+    original_size = report['bytes_in']
+    compressed_size = report['bytes_out']
     original_size_kb = original_size / 1024
     compressed_size_kb = compressed_size / 1024
     compression_ratio = compressed_size / original_size
-    compression_time = end_time - start_time
-    process = psutil.Process(os.getpid())
-    memory_usage = process.memory_info().rss / (1024 ** 2)  # Convert bytes to megabytes
 
     print(f"Original Size: {original_size_kb:.2f} KB")
     print(f"Compressed Size: {compressed_size_kb:.2f} KB")
     print(f"Compression Ratio: {compression_ratio:.2f} (Compressed/Original)")
-    print(f"Compression Time: {compression_time:.2f} seconds")
-    print(f"Memory Usage: {memory_usage:.2f} MB")
-
-# Load your grayscale image
-image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/gray.bmp'
-img = Image.open(image_path)
-
-# Ensure the image is in grayscale mode
-if img.mode != 'L':
-    img = img.convert('L')
+    print(f"Compression Time: {report['total_seconds']:.2f} seconds")
+    print(f"Peak Memory Usage: {report['peak_rss_mb']:.2f} MB")
+    print_stages(report)
 
-img_array = np.array(img)
+if __name__ == "__main__":
+    # Load your grayscale image (gray.bmp, or the .npy array written by Convert_to_grayscale.py)
+    image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/gray.bmp'
+    rle_txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/rle.txt'
+    delta = 0  # 0 for lossless; e.g. 2 lets every pixel be reconstructed up to 2 gray levels off
+    order = 'row'    # or 'column', 'serpentine', 'hilbert', 'auto'
+    coding = 'text'  # or 'rice'
+    cache = default_cache()
+    hits = cache.hits
 
-# Perform RLE compression
-start_time = time.time()
-rle_compressed = rle_encode_grayscale(img_array)
-end_time = time.time()
+    with Instrumentation('rle_grayscale.compress', sink=default_sink()) as instrumentation:
+        with instrumentation.stage('read'):
+            # Ensure the image is in grayscale mode
+            img_array = load_pixels(image_path, 'L')
+        instrumentation.count_in(source_nbytes(image_path))
 
-# Save RLE compressed data to a .txt file
-rle_txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/rle.txt'
-original_shape = img_array.shape[:2]  # This ensures you're only getting the height and width
+        # Perform RLE compression
+        rle_data = cache.get_or_compute(
+            'rle_grayscale.compress',
+            lambda: compress_array(img_array, instrumentation, delta=delta, order=order, coding=coding),
+            (img_array,), {'delta': delta, 'order': order, 'coding': coding}, source=__file__)
 
-save_rle_to_txt_with_dimensions_grayscale(rle_compressed, rle_txt_path, original_shape)
+        # Save RLE compressed data to a .txt file
+        with instrumentation.stage('write'):
+            with open(rle_txt_path, 'wb') as file:
+                file.write(rle_data)
+        instrumentation.count_out(len(rle_data))
 
-# Metrics calculation
-calculate_metrics(image_path, rle_txt_path, start_time, end_time)
+    # Metrics calculation
+    if cache.hits > hits:
+        print("Cache hit: the compressed data was read from the result cache, so no encode stages were timed.")
+    calculate_metrics(instrumentation.report)
+    if delta:
+        print(f"Guaranteed Maximum Error: {delta}")
+        order = resolve_scan_order(img_array, order)
+        reconstructed = unscan_pixels(np.repeat(*rle_encode_grayscale(img_array, delta, order)), img_array.shape, order)
+        print_metrics(evaluate(img_array, reconstructed))
 
-print("RLE data saved to .txt file.")
+    print("RLE data saved to .txt file.")
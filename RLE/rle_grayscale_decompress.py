@@ -1,71 +1,75 @@
-from PIL import Image
 import numpy as np
 import os
-import time
-import psutil
-from skimage.metrics import structural_similarity as ssim
-from skimage.metrics import mean_squared_error
+import sys
 
-def rle_decompress_grayscale(txt_path, output_image_path, original_image_path):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+from array_text import iter_rows, split_header
+from image_io import load_pixels
+from instrumentation import Instrumentation, NO_INSTRUMENTATION, default_sink, print_stages
+from metrics import print_metrics
+from result_cache import default_cache
+from rice_coding import decode_pixels, expand_runs, is_rice_data
+from scan_order import parse_header
+
+def rle_decode_text_grayscale(text):
     """
-    Decompress RLE data from a .txt file for a grayscale image and reconstruct
-    the original image, ensuring it matches the original BMP in appearance and file size,
-    and calculating performance and quality metrics.
+    Rebuild the grayscale image from the contents of an RLE .txt file (bytes or str), or Rice-coded RLE data.
     """
-    start_time = time.time()
-
-    # Open and read the RLE compressed data
-    with open(txt_path, 'r') as file:
-        lines = file.readlines()
+    if isinstance(text, str):
+        text = text.encode()
+    if is_rice_data(text):
+        return decode_pixels(text, 'grayscale')
 
     # Extract image dimensions
-    height, width = map(int, lines[0].strip().split(' '))
-    
-    # Initialize an empty array to hold the decompressed pixel data
-    img_array = np.zeros((height, width), dtype=np.uint8)
-
-    # Process the RLE data
-    index = 0
-    for line in lines[1:]:
-        value, count = map(int, line.strip().split(' '))
-        for _ in range(count):
-            img_array[index // width][index % width] = value
-            index += 1
-
-    # Convert the numpy array to a PIL Image object in L mode (grayscale)
-    img = Image.fromarray(img_array, mode='L')
+    header, offset = split_header(text)
+    (height, width), order, _ = parse_header(header)
 
-    # Save the image in BMP format
-    img.save(output_image_path, 'BMP')
+    # Expand the (value, count) runs straight into the pixel array, a block of them at a time
+    rows = iter_rows(text, 2, offset, np.uint32 if height * width < 2 ** 32 else np.int64)
+    return expand_runs(((runs[:, 0].astype(np.uint8), runs[:, 1]) for runs in rows), (height, width), order)
 
-    end_time = time.time()
-    decompression_time = end_time - start_time
-    process = psutil.Process(os.getpid())
-    memory_usage = process.memory_info().rss / (1024 ** 2)  # Convert bytes to megabytes
+def decompress_bytes(data, instrumentation=NO_INSTRUMENTATION):
+    """
+    Decode serialized grayscale RLE data and return the image array.
+    """
+    with instrumentation.stage('decode'):
+        return rle_decode_text_grayscale(data)
 
-    print(f"Decompression Time: {decompression_time:.2f} seconds")
-    print(f"Memory Usage: {memory_usage:.2f} MB")
+def rle_decompress_grayscale(txt_path, output_image_path, original_image_path):
+    """
+    Decompress RLE data from a .txt file for a grayscale image and reconstruct
+    the original image, ensuring it matches the original BMP in appearance and file size,
+    and calculating performance and quality metrics.
+    """
+    with Instrumentation('rle_grayscale.decompress', sink=default_sink()) as instrumentation:
+        # Open and read the RLE compressed data
+        with instrumentation.stage('read'):
+            with open(txt_path, 'rb') as file:
+                text = file.read()
+        instrumentation.count_in(os.path.getsize(txt_path))
 
-    # Load the original and the decompressed image for quality metrics calculation
-    original_img = np.array(Image.open(original_image_path).convert('L'))
-    decompressed_img = np.array(Image.open(output_image_path).convert('L'))
+        with instrumentation.stage('decode'):
+            img_array = rle_decode_text_grayscale(text)
 
-    # Calculate PSNR, MSE, and SSIM
-    mse_value = mean_squared_error(original_img, decompressed_img)
-    if mse_value == 0:
-        psnr_value = 100  # Cap the PSNR at 100 if MSE is 0
-    else:
-        psnr_value = 20 * np.log10(255 / np.sqrt(mse_value))
-        psnr_value = min(psnr_value, 100)  # Cap the PSNR at 100
+        # Convert the numpy array to a PIL Image object in L mode (grayscale) and save it as BMP
+        with instrumentation.stage('write'):
+            from PIL import Image
+            img = Image.fromarray(img_array, mode='L')
+            img.save(output_image_path, 'BMP')
+        instrumentation.count_out(os.path.getsize(output_image_path))
 
-    ssim_value = ssim(original_img, decompressed_img, data_range=decompressed_img.max() - decompressed_img.min())
+    report = instrumentation.report
+    print(f"Decompression Time: {report['total_seconds']:.2f} seconds")
+    print(f"Peak Memory Usage: {report['peak_rss_mb']:.2f} MB")
+    print_stages(report)
 
-    print(f"PSNR: {psnr_value:.2f}")
-    print(f"SME: {mse_value:.2f}")
-    print(f"SSIM: {ssim_value:.2f}")
+    # Calculate PSNR, MSE, and SSIM against the reconstruction already in memory
+    original_img = load_pixels(original_image_path, 'L')
+    print_metrics(default_cache().evaluate(original_img, img_array))
 
-# Example usage
-txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/rle.txt'
-output_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/recon.bmp'
-original_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/gray.bmp'
-rle_decompress_grayscale(txt_path, output_image_path, original_image_path)
+if __name__ == "__main__":
+    # Example usage
+    txt_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/rle.txt'
+    output_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/recon.bmp'
+    original_image_path = '/Users/ahmedalwan/Desktop/FYP/Code/Final/pepper/gray.bmp'
+    rle_decompress_grayscale(txt_path, output_image_path, original_image_path)
@@ -0,0 +1,133 @@
+"""
+Array-backed reading and writing of the codecs' decimal text formats.
+
+The RLE and LZW .txt files are columns of non-negative integers, one row per
+line ("value count\\n", "code\\n"). Formatting them with an f-string per row,
+or parsing them with split() and int() per line, creates several Python
+objects for every run or code. These helpers produce and consume the same
+bytes directly from and into NumPy integer arrays, a block of rows at a time,
+so temporary memory is bounded by the block size rather than the image size.
+
+The codecs produce their rows in batches (runs a batch of pixels at a time,
+LZW codes a batch at a time), and format_batches writes each batch as it
+comes into one growing buffer. iter_rows parses the text back a block at a
+time, so a decoder can expand each block into the image and drop it; neither
+side ever holds every run or code of the image at once.
+"""
+import io
+
+import numpy as np
+
+BLOCK_ROWS = 1 << 13
+BLOCK_BYTES = 1 << 15
+POWERS_OF_TEN = 10 ** np.arange(1, 20, dtype=np.uint64)
+
+
+def digit_counts(values):
+    """Number of decimal digits of each non-negative integer."""
+    return np.searchsorted(POWERS_OF_TEN, values.astype(np.uint64), side='right') + 1
+
+
+def _format_block(columns, separators):
+    widths = [digit_counts(column) for column in columns]
+    row_lengths = sum(widths) + sum(len(separator) for separator in separators)
+    ends = np.cumsum(row_lengths)
+    out = np.empty(int(ends[-1]), dtype=np.uint8)
+    position = ends - row_lengths
+    for column, width, separator in zip(columns, widths, separators):
+        values = column.astype(np.uint64)
+        last = position + width - 1
+        for digit in range(int(width.max())):
+            has_digit = width > digit
+            out[last[has_digit] - digit] = 48 + values[has_digit] % 10
+            values //= 10
+        position = position + width
+        for offset, char in enumerate(separator.encode('ascii')):
+            out[position + offset] = char
+        position = position + len(separator)
+    return out.tobytes()
+
+
+def format_batches(batches, separators, header=''):
+    """
+    Format integer columns that arrive in batches as text rows and return the bytes.
+
+    Every batch is a sequence of equal-length arrays, one per column, and
+    separators[i] follows column i on every row, so (values, counts) batches with
+    (' ', '\\n') give "value count\\n" lines. header is written first.
+    """
+    buffer = io.BytesIO()
+    buffer.write(header.encode('ascii'))
+    for columns in batches:
+        for start in range(0, len(columns[0]), BLOCK_ROWS):
+            buffer.write(_format_block([column[start:start + BLOCK_ROWS] for column in columns], separators))
+    return buffer.getvalue()  # the buffer's own bytes, not a copy
+
+
+def format_columns(columns, separators, header=''):
+    """Format equal-length integer arrays as text rows and return the bytes, as format_batches does for one batch."""
+    return format_batches([columns], separators, header)
+
+
+def _parse_block(block):
+    is_digit = np.zeros(block.size + 2, dtype=np.int8)
+    is_digit[1:-1] = (block >= 48) & (block <= 57)
+    edges = np.diff(is_digit)
+    starts = np.flatnonzero(edges == 1)
+    lengths = np.flatnonzero(edges == -1) - starts
+    values = np.zeros(starts.size, dtype=np.int64)
+    for digit in range(int(lengths.max(initial=0))):
+        active = lengths > digit
+        values[active] = values[active] * 10 + (block[starts[active] + digit] - 48)
+    return values
+
+
+def iter_integers(data, offset=0, dtype=np.int64):
+    """
+    Parse every run of decimal digits in data[offset:], yielding them as one array
+    per block of about BLOCK_BYTES bytes. Anything else (spaces, commas, newlines)
+    only separates numbers.
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8, offset=offset)
+    start = 0
+    while start < buffer.size:
+        end = min(start + BLOCK_BYTES, buffer.size)
+        # Extend the block to the end of the number it would otherwise split
+        while end < buffer.size and 48 <= buffer[end] <= 57:
+            end += 1
+        yield _parse_block(buffer[start:end]).astype(dtype, copy=False)
+        start = end
+
+
+def parse_integers(data, offset=0, dtype=np.int64):
+    """Parse every run of decimal digits in data[offset:] and return them as one array."""
+    parts = list(iter_integers(data, offset, dtype))
+    if not parts:
+        return np.zeros(0, dtype=dtype)
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+def iter_rows(data, n_columns, offset=0, dtype=np.int64):
+    """
+    Parse the integers of data[offset:] as iter_integers does and yield them as
+    (rows, n_columns) arrays, a block at a time. Raises ValueError when the count
+    of integers is not a multiple of n_columns.
+    """
+    left_over = np.zeros(0, dtype=dtype)
+    for values in iter_integers(data, offset, dtype):
+        if left_over.size:
+            values = np.concatenate([left_over, values])
+        full = values.size - values.size % n_columns
+        left_over = values[full:]
+        if full:
+            yield values[:full].reshape(-1, n_columns)
+    if left_over.size:
+        raise ValueError(f"Expected rows of {n_columns} numbers, {left_over.size} left over")
+
+
+def split_header(data, separator=b'\n'):
+    """Return (first line as str, offset of the rest) for a text format with a one-line header."""
+    end = data.find(separator)
+    if end < 0:
+        raise ValueError("Missing header line")
+    return bytes(data[:end]).decode('ascii').strip(), end + len(separator)
@@ -0,0 +1,376 @@
+"""
+Cross-codec benchmark.
+
+Runs every registered codec over a reproducible set of synthetic images (noise,
+gradients and text-like bilevel pages at several sizes) plus an optional corpus
+of user images, and reports encode/decode throughput, bits per pixel and peak
+memory. Results are written as JSON or CSV so that runs can be compared.
+
+Throughput is measured on the in-memory codec path (array -> bytes -> array),
+so every codec is timed over the same scope and disk I/O is excluded. Raw size
+is counted as one byte per pixel for both binary and grayscale inputs.
+
+With --memory-budget FACTOR the run instead checks that each lossless codec
+keeps its pixels compact: the peak of Python and NumPy allocations (traced
+with tracemalloc) must stay within FACTOR times the raw image, for compress
+and for decompress each. There is no allowance for tables or output buffers,
+with one exception: the bytes compress returns are added to its budget once,
+because they must exist in full when it returns and the text formats can be
+several times larger than the raw pixels. Any violation exits with status 1.
+The codecs work in blocks of a fixed size, which outweigh images much smaller
+than 2048x2048, so check the budget at that size or larger.
+
+With --import-time the run instead measures cold start: the wall time of a
+fresh interpreter that imports each codec through the registry, as a worker
+process does, next to one that only imports NumPy, and which heavy optional
+libraries the import pulled in.
+
+Example:
+    python benchmark.py --sizes 64 256 --repeat 3 --warmup 1 --output results.json
+    python benchmark.py --corpus images/ --codecs rle_grayscale lzw_grayscale --output results.csv
+    python benchmark.py --output new.json --compare results.json
+    python benchmark.py --sizes 2048 --memory-budget 2
+    python benchmark.py --import-time --repeat 10
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from codec_registry import CODECS, ROOT_DIR, get_codec
+from instrumentation import PeakMemory
+from metrics import evaluate
+
+SYNTHETIC_KINDS = ('noise', 'gradient', 'text')
+IMAGE_EXTENSIONS = ('.bmp', '.png', '.jpg', '.jpeg', '.tif', '.tiff', '.pgm')
+HEAVY_MODULES = ('PIL', 'psutil', 'cv2', 'skimage', 'sklearn', 'scipy')  # reported by --import-time
+
+
+def make_text_image(size, rng):
+    """Build a bilevel page of random glyphs laid out in lines, like scanned text."""
+    scale = max(1, size // 128)
+    glyph_h, glyph_w = 7 * scale, 5 * scale
+    glyphs = [np.kron(rng.random((7, 5)) < 0.45, np.ones((scale, scale), dtype=bool)) for _ in range(26)]
+
+    page = np.full((size, size), 255, dtype=np.uint8)
+    margin = 2 * scale
+    y = margin
+    while y + glyph_h <= size - margin:
+        x = margin
+        while x + glyph_w <= size - margin:
+            if rng.random() < 0.18:
+                x += glyph_w + scale  # word gap
+                continue
+            glyph = glyphs[rng.integers(len(glyphs))]
+            page[y:y + glyph_h, x:x + glyph_w][glyph] = 0
+            x += glyph_w + scale
+        y += glyph_h + 3 * scale
+    return page
+
+
+def make_synthetic_image(kind, size, seed=0):
+    """Generate one reproducible synthetic grayscale image of the given kind."""
+    rng = np.random.default_rng(seed)
+    if kind == 'noise':
+        return rng.integers(0, 256, (size, size), dtype=np.uint8)
+    if kind == 'gradient':
+        ramp = np.linspace(0, 255, size)
+        return ((ramp[None, :] + ramp[:, None]) / 2).astype(np.uint8)
+    if kind == 'text':
+        return make_text_image(size, rng)
+    raise ValueError(f"Unknown synthetic image kind '{kind}'")
+
+
+def load_corpus(corpus_dir):
+    """Load every image in a directory as a grayscale array."""
+    from PIL import Image
+    images = []
+    for filename in sorted(os.listdir(corpus_dir)):
+        if filename.lower().endswith(IMAGE_EXTENSIONS):
+            path = os.path.join(corpus_dir, filename)
+            images.append((filename, np.array(Image.open(path).convert('L'))))
+    return images
+
+
+def build_image_set(sizes, seed=0, corpus_dir=None):
+    """Return (name, grayscale array) pairs for the synthetic set and optional corpus."""
+    images = []
+    for size in sizes:
+        for kind in SYNTHETIC_KINDS:
+            images.append((f"{kind}_{size}", make_synthetic_image(kind, size, seed)))
+    if corpus_dir:
+        images.extend(load_corpus(corpus_dir))
+    return images
+
+
+def prepare_input(codec, gray_array, threshold=128):
+    """Convert a grayscale image to the pixel format a codec expects."""
+    if codec.kind == 'binary':
+        return (gray_array > threshold).astype(np.uint8)
+    return gray_array
+
+
+def benchmark_codec(codec, image_name, gray_array, repeat=3, warmup=1):
+    """Time compress and decompress of one image and return a result record."""
+    img_array = prepare_input(codec, gray_array)
+    raw_mb = img_array.size / 1e6
+
+    for _ in range(warmup):
+        codec.decompress(codec.compress(img_array))
+
+    encode_times, decode_times = [], []
+    with PeakMemory() as sampler:
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            data = codec.compress(img_array)
+            encode_times.append(time.perf_counter() - start_time)
+
+            start_time = time.perf_counter()
+            decoded = codec.decompress(data)
+            decode_times.append(time.perf_counter() - start_time)
+
+    quality = evaluate(img_array, decoded, compute_ssim=False, data_range=1 if codec.kind == 'binary' else 255)
+    encode_time = statistics.median(encode_times)
+    decode_time = statistics.median(decode_times)
+    return {
+        'codec': codec.name,
+        'image': image_name,
+        'height': img_array.shape[0],
+        'width': img_array.shape[1],
+        'compressed_bytes': len(data),
+        'bits_per_pixel': 8 * len(data) / img_array.size,
+        'encode_seconds': encode_time,
+        'decode_seconds': decode_time,
+        'encode_mb_per_s': raw_mb / encode_time if encode_time > 0 else float('inf'),
+        'decode_mb_per_s': raw_mb / decode_time if decode_time > 0 else float('inf'),
+        'peak_memory_mb': sampler.peak_increase / (1024 ** 2),
+        'psnr': quality['psnr'],
+        'max_error': quality['max_error'],
+        'exact': quality['lossless'],
+        'lossless': codec.lossless,
+    }
+
+
+def check_memory_budget(codec, image_name, gray_array, factor):
+    """
+    Trace the allocation peaks of compress and of decompress separately and compare
+    each with factor * raw bytes; the bytes compress returns are added to its budget once.
+    """
+    img_array = prepare_input(codec, gray_array)
+    codec.decompress(codec.compress(img_array))  # imports and caches are not part of the budget
+
+    tracemalloc.start()
+    try:
+        data = codec.compress(img_array)
+        encode_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    tracemalloc.start()  # the compressed bytes already exist and are not traced again
+    try:
+        decoded = codec.decompress(data)
+        decode_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    budget = factor * img_array.size
+    return {
+        'codec': codec.name,
+        'image': image_name,
+        'raw_bytes': img_array.size,
+        'compressed_bytes': len(data),
+        'encode_peak_bytes': encode_peak,
+        'decode_peak_bytes': decode_peak,
+        'encode_budget_bytes': budget + len(data),
+        'decode_budget_bytes': budget,
+        'within_budget': (encode_peak <= budget + len(data) and decode_peak <= budget
+                          and np.array_equal(decoded, img_array)),
+    }
+
+
+def run_memory_checks(codec_names, images, factor, verbose=True):
+    """Check the memory budget of every lossless codec over every image and return the records."""
+    results = []
+    for name in codec_names:
+        codec = get_codec(name)
+        if not codec.lossless:
+            print(f"Skipping {name}: lossy codecs are not held to the memory budget")
+            continue
+        for image_name, gray_array in images:
+            record = check_memory_budget(codec, image_name, gray_array, factor)
+            results.append(record)
+            if verbose:
+                print(f"{record['codec']:<18} {record['image']:<16} "
+                      f"encode {record['encode_peak_bytes'] / 1024 ** 2:7.2f} of "
+                      f"{record['encode_budget_bytes'] / 1024 ** 2:7.2f} MB  "
+                      f"decode {record['decode_peak_bytes'] / 1024 ** 2:7.2f} of "
+                      f"{record['decode_budget_bytes'] / 1024 ** 2:7.2f} MB  "
+                      f"{'ok' if record['within_budget'] else 'OVER BUDGET'}")
+    return results
+
+
+def measure_import_time(statement, repeat=5):
+    """
+    Median wall time in seconds of a fresh interpreter running statement from the
+    repository root, and the HEAVY_MODULES it left imported.
+    """
+    report = f"import sys; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        completed = subprocess.run([sys.executable, '-c', f"{statement}; {report}"], cwd=ROOT_DIR,
+                                   capture_output=True, text=True, check=True)
+        times.append(time.perf_counter() - start_time)
+    return statistics.median(times), completed.stdout.split()
+
+
+def run_import_checks(codec_names, repeat=5, verbose=True):
+    """Measure the cold-start import time of every codec and return the records."""
+    baseline, _ = measure_import_time('import numpy', repeat)
+    if verbose:
+        print(f"{'python + numpy':<28} {baseline * 1000:7.1f} ms")
+    results = []
+    for name in codec_names:
+        seconds, heavy = measure_import_time(f"import codec_registry; codec_registry.get_codec({name!r}).load()",
+                                             repeat)
+        results.append({
+            'codec': name,
+            'import_seconds': seconds,
+            'above_numpy_seconds': seconds - baseline,
+            'heavy_modules': ' '.join(heavy),
+        })
+        if verbose:
+            print(f"{name:<28} {seconds * 1000:7.1f} ms  (+{(seconds - baseline) * 1000:6.1f} ms)  "
+                  f"{' '.join(heavy) or '-'}")
+    return results
+
+
+def run_benchmark(codec_names, images, repeat=3, warmup=1, verbose=True):
+    """Benchmark every codec over every image and return the list of records."""
+    results = []
+    for name in codec_names:
+        codec = get_codec(name)
+        try:
+            codec.load()
+        except ImportError as e:
+            print(f"Skipping {name}: {e}")
+            continue
+        for image_name, gray_array in images:
+            record = benchmark_codec(codec, image_name, gray_array, repeat, warmup)
+            results.append(record)
+            if verbose:
+                print(f"{record['codec']:<18} {record['image']:<16} "
+                      f"enc {record['encode_mb_per_s']:8.3f} MB/s  "
+                      f"dec {record['decode_mb_per_s']:8.3f} MB/s  "
+                      f"{record['bits_per_pixel']:7.3f} bpp  "
+                      f"peak {record['peak_memory_mb']:7.2f} MB")
+            if codec.lossless and not record['exact']:
+                print(f"WARNING: {name} did not reproduce {image_name} exactly")
+    return results
+
+
+def save_results(results, output_path, settings):
+    """Write results as CSV or JSON depending on the file extension."""
+    if output_path.lower().endswith('.csv'):
+        with open(output_path, mode='w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(output_path, 'w') as file:
+            json.dump({'settings': settings, 'results': results}, file, indent=2)
+    print(f"Results saved to {output_path}")
+
+
+def load_results(path):
+    """Load results saved by save_results (JSON or CSV) as a list of records."""
+    if path.lower().endswith('.csv'):
+        with open(path, newline='') as file:
+            return [{key: (value if key in ('codec', 'image') else float(value))
+                     for key, value in row.items() if key not in ('exact', 'lossless')}
+                    for row in csv.DictReader(file)]
+    with open(path) as file:
+        return json.load(file)['results']
+
+
+def compare_results(results, baseline, tolerance=0.2):
+    """
+    Compare results against a baseline run and return a list of regression messages.
+    A regression is a throughput drop or a size increase larger than the tolerance.
+    """
+    baseline_by_key = {(r['codec'], r['image']): r for r in baseline}
+    regressions = []
+    for record in results:
+        old = baseline_by_key.get((record['codec'], record['image']))
+        if old is None:
+            continue
+        for key in ('encode_mb_per_s', 'decode_mb_per_s'):
+            if record[key] < old[key] * (1 - tolerance):
+                regressions.append(f"{record['codec']} {record['image']}: {key} {old[key]:.3f} -> {record[key]:.3f}")
+        if record['bits_per_pixel'] > old['bits_per_pixel'] * (1 + tolerance):
+            regressions.append(f"{record['codec']} {record['image']}: bits_per_pixel "
+                               f"{old['bits_per_pixel']:.3f} -> {record['bits_per_pixel']:.3f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the RLE, LZW, Huffman and DR-KM codecs.")
+    parser.add_argument('--codecs', nargs='+', default=list(CODECS), choices=list(CODECS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[64, 256])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--corpus', help="Directory of additional images to benchmark")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--output', help="Write results to a .json or .csv file")
+    parser.add_argument('--compare', help="Baseline results file to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--memory-budget', type=float, metavar='FACTOR',
+                        help="Only check the compress and decompress allocation peaks against FACTOR x raw size")
+    parser.add_argument('--import-time', action='store_true',
+                        help="Only measure the cold-start import time of each codec")
+    args = parser.parse_args()
+
+    if args.import_time:
+        results = run_import_checks(args.codecs, args.repeat)
+        if args.output:
+            save_results(results, args.output, {'repeat': args.repeat, 'python': platform.python_version()})
+        return
+
+    images = build_image_set(args.sizes, args.seed, args.corpus)
+    if args.memory_budget:
+        results = run_memory_checks(args.codecs, images, args.memory_budget)
+        if not all(record['within_budget'] for record in results):
+            raise SystemExit(1)
+        return
+
+    results = run_benchmark(args.codecs, images, args.repeat, args.warmup)
+
+    if args.output and results:
+        settings = {
+            'sizes': args.sizes,
+            'seed': args.seed,
+            'corpus': args.corpus,
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+        }
+        save_results(results, args.output, settings)
+
+    if args.compare:
+        regressions = compare_results(results, load_results(args.compare), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION: {message}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
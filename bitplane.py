@@ -0,0 +1,285 @@
+"""
+Bit-plane coding of grayscale images with the binary codecs.
+
+A grayscale image is converted to Gray code and split into eight bilevel
+planes. In Gray code, neighbouring intensities differ in a single bit, so a
+smooth ramp that would flip the low bits of every plain binary plane at
+once only flips one plane per step. The high-order planes of smooth
+imagery are then large uniform areas with long runs, which the binary
+codecs code in a few bytes. The low-order planes are close to noise, and
+the text formats of the binary codecs would make them larger than their
+bits. Those planes are stored as packed raw bits (np.packbits) instead.
+
+Every plane is coded on its own. Serially, each plane is cut out of the
+image a block of rows at a time into one reused buffer and coded before the
+next, and the decoder folds each plane into the image as soon as it is
+decoded, so memory stays near twice the size of the image; with workers,
+all eight planes are held and coded concurrently. The coded planes are
+stored one after another behind a small header:
+
+    magic b'FYPL', format version, length of the JSON metadata
+    metadata  shape, Gray code flag, coder of each plane ('raw' or a binary
+              codec name), size of each plane
+    planes    the most significant plane first
+
+With codec='auto', each plane gets whichever of the binary codecs and raw
+packing the size models in codec_selection predict to be smallest, from
+statistics of a sample of the plane; no codec is run to choose. Naming a
+binary codec uses it for every plane it is predicted to shrink below raw
+packing. In both cases a plane that comes out larger than raw packing is
+stored raw.
+
+Example:
+    python bitplane.py compress pepper.bmp pepper.fypb --workers 4
+    python bitplane.py decompress pepper.fypb recon.bmp --original pepper.bmp
+"""
+import argparse
+import io
+import json
+import struct
+from itertools import repeat
+
+import numpy as np
+
+from codec_registry import get_codec, lossless_codecs
+from codec_selection import estimate_sizes, image_statistics
+from image_io import load_pixels
+from instrumentation import NO_INSTRUMENTATION
+from metrics import evaluate, print_metrics
+from parallel import compress_tile, decompress_tile, tile_executor
+
+MAGIC = b'FYPL'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')  # magic, version, metadata length
+
+BIT_DEPTH = 8
+BITS = range(BIT_DEPTH - 1, -1, -1)  # plane order: most significant first
+RAW = 'raw'
+SAMPLE_PIXELS = 1 << 16  # pixels of each plane sampled for the size models
+ROW_BLOCK_PIXELS = 1 << 16  # pixels of a block of rows transformed at a time
+BINARY_CODECS = lossless_codecs('binary')
+
+
+def to_gray_code(img_array):
+    """Reflected binary Gray code of every pixel of a uint8 array."""
+    return img_array ^ (img_array >> 1)
+
+
+def from_gray_code(gray):
+    """
+    Inverse of to_gray_code, in place: every bit becomes the XOR of itself and
+    all the bits above it. Returns gray.
+    """
+    for shift in (1, 2, 4):
+        gray ^= gray >> shift
+    return gray
+
+
+def row_blocks(shape):
+    """
+    Slices of about ROW_BLOCK_PIXELS pixels of rows that cover an image of this shape.
+    The number of rows is a multiple of 8, so every block of a packed plane starts on a byte.
+    """
+    rows = max(8, ROW_BLOCK_PIXELS // max(shape[1], 1) // 8 * 8)
+    return [slice(start, start + rows) for start in range(0, shape[0], rows)]
+
+
+def extract_plane(img_array, bit, gray_code, out):
+    """
+    Write bit number bit (0 is the least significant) of every pixel, or of its Gray code,
+    into out as 0/1, a block of rows at a time. Returns out.
+    """
+    for rows in row_blocks(img_array.shape):
+        block = to_gray_code(img_array[rows]) if gray_code else img_array[rows]
+        np.right_shift(block, bit, out=out[rows])
+        out[rows] &= 1
+    return out
+
+
+def pack_plane(plane):
+    return np.packbits(plane, axis=None).tobytes()
+
+
+def fold_packed_plane(img_array, data):
+    """Shift every pixel left a bit and OR in the bit of a plane packed by pack_plane, a block of rows at a time."""
+    if len(data) != -(-img_array.size // 8):
+        raise ValueError(f"A packed plane of {img_array.size} pixels needs {-(-img_array.size // 8)} bytes, "
+                         f"got {len(data)}")
+    for rows in row_blocks(img_array.shape):
+        block = img_array[rows]
+        start = rows.start * img_array.shape[1] // 8
+        packed = np.frombuffer(data, dtype=np.uint8, count=-(-block.size // 8), offset=start)
+        block <<= 1
+        block |= np.unpackbits(packed, count=block.size).reshape(block.shape)
+
+
+def estimate_plane_sizes(plane):
+    """Predicted bytes of raw packing and of every binary codec for a 0/1 plane."""
+    estimates = estimate_sizes(image_statistics(plane, SAMPLE_PIXELS), 'binary')
+    estimates[RAW] = -(-plane.size // 8)
+    return estimates
+
+
+def choose_plane_coder(plane, codec_name='auto'):
+    """'raw' or the binary codec predicted to code a 0/1 plane smallest."""
+    estimates = estimate_plane_sizes(plane)
+    if codec_name != 'auto':
+        estimates = {name: estimates[name] for name in (codec_name, RAW)}
+    return min(estimates, key=estimates.get)
+
+
+def _store_plane(plane, coder, coded):
+    """(coder, coded) when the coded plane is smaller than raw packing, otherwise ('raw', packed bits)."""
+    if coded is not None and len(coded) < -(-plane.size // 8):
+        return coder, coded
+    return RAW, pack_plane(plane)
+
+
+def compress_array(img_array, instrumentation=NO_INSTRUMENTATION, codec='auto', gray_code=True, workers=None):
+    """
+    Code a 2-D uint8 image as eight bit planes and return the bytes.
+
+    codec: a binary codec for the planes worth coding, or 'auto' to pick one per plane.
+    workers: number of processes, or an Executor, to code the planes concurrently.
+    """
+    if img_array.ndim != 2:
+        raise ValueError(f"Expected a 2-D grayscale image, got shape {img_array.shape}")
+    if codec != 'auto' and codec not in BINARY_CODECS:
+        raise ValueError(f"Bit planes need a lossless binary codec; available: {', '.join(BINARY_CODECS)}")
+    img_array = img_array.astype(np.uint8, copy=False)
+
+    coders, payloads = [], []
+    with tile_executor(workers) as executor:
+        if executor is None:
+            plane = np.empty(img_array.shape, dtype=np.uint8)
+            for bit in BITS:
+                with instrumentation.stage('transform'):
+                    extract_plane(img_array, bit, gray_code, plane)
+                with instrumentation.stage('encode'):
+                    coder = choose_plane_coder(plane, codec)
+                    coded = None if coder == RAW else get_codec(coder).compress(plane)
+                    coder, payload = _store_plane(plane, coder, coded)
+                coders.append(coder)
+                payloads.append(payload)
+        else:
+            with instrumentation.stage('transform'):
+                planes = [extract_plane(img_array, bit, gray_code, np.empty(img_array.shape, dtype=np.uint8))
+                          for bit in BITS]
+            with instrumentation.stage('encode'):
+                chosen = [choose_plane_coder(plane, codec) for plane in planes]
+                coded = [index for index, coder in enumerate(chosen) if coder != RAW]
+                results = dict(zip(coded, executor.map(compress_tile, [chosen[i] for i in coded],
+                                                       [planes[i] for i in coded], repeat({}))))
+                for index, (plane, coder) in enumerate(zip(planes, chosen)):
+                    coder, payload = _store_plane(plane, coder, results.pop(index, None))
+                    coders.append(coder)
+                    payloads.append(payload)
+            del planes
+
+    with instrumentation.stage('serialize'):
+        metadata = json.dumps({
+            'shape': list(img_array.shape),
+            'gray_code': gray_code,
+            'coders': coders,
+            'sizes': [len(data) for data in payloads],
+        }).encode('utf-8')
+        buffer = io.BytesIO()
+        buffer.write(HEADER.pack(MAGIC, VERSION, len(metadata)))
+        buffer.write(metadata)
+        while payloads:
+            buffer.write(payloads.pop(0))  # drop each plane once it is written
+        return buffer.getvalue()
+
+
+def read_bitplane_header(data):
+    """Parse the header of bit-plane data. Returns (metadata, offset of the first plane)."""
+    magic, version, metadata_length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not bit-plane codec data")
+    if version > VERSION:
+        raise ValueError(f"Bit-plane data version {version} is newer than supported version {VERSION}")
+    metadata = json.loads(bytes(data[HEADER.size:HEADER.size + metadata_length]).decode('utf-8'))
+    return metadata, HEADER.size + metadata_length
+
+
+def decompress_bytes(data, instrumentation=NO_INSTRUMENTATION, workers=None):
+    """Decode bytes produced by compress_array and return the uint8 image."""
+    with instrumentation.stage('parse'):
+        metadata, offset = read_bitplane_header(data)
+        shape = tuple(metadata['shape'])
+        coders = metadata['coders']
+        if len(coders) != BIT_DEPTH or len(metadata['sizes']) != BIT_DEPTH:
+            raise ValueError(f"Bit-plane data must have {BIT_DEPTH} planes")
+        view = memoryview(data)
+        payloads = []
+        for size in metadata['sizes']:
+            payloads.append(view[offset:offset + size])
+            offset += size
+
+    with instrumentation.stage('decode'):
+        img_array = np.zeros(shape, dtype=np.uint8)
+        with tile_executor(workers) as executor:
+            results = {}
+            if executor is not None:
+                coded = [index for index, coder in enumerate(coders) if coder != RAW]
+                results = dict(zip(coded, executor.map(decompress_tile, [coders[i] for i in coded],
+                                                       [bytes(payloads[i]) for i in coded], repeat({}))))
+            for index, (coder, payload) in enumerate(zip(coders, payloads)):
+                if coder == RAW:
+                    fold_packed_plane(img_array, payload)
+                    continue
+                plane = results.pop(index) if index in results else get_codec(coder).decompress(bytes(payload))
+                if plane.shape != shape:
+                    raise ValueError(f"Bit plane {index} decodes to shape {plane.shape}, expected {shape}")
+                img_array <<= 1
+                img_array |= plane
+                del plane  # before the next plane is decoded
+
+    with instrumentation.stage('transform'):
+        if metadata['gray_code']:
+            for rows in row_blocks(shape):
+                from_gray_code(img_array[rows])
+        return img_array
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress grayscale images as bit planes with the binary codecs.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compress_parser = subparsers.add_parser('compress', help="Compress a grayscale image")
+    compress_parser.add_argument('input')
+    compress_parser.add_argument('output')
+    compress_parser.add_argument('--codec', default='auto', choices=BINARY_CODECS + ['auto'])
+    compress_parser.add_argument('--no-gray-code', action='store_true', help="Split the plain binary value instead")
+    compress_parser.add_argument('--workers', type=int, default=None)
+
+    decompress_parser = subparsers.add_parser('decompress', help="Decompress to an image file")
+    decompress_parser.add_argument('input')
+    decompress_parser.add_argument('output')
+    decompress_parser.add_argument('--original', help="Original image to compare the reconstruction with")
+    decompress_parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == 'compress':
+        img_array = load_pixels(args.input)
+        data = compress_array(img_array, codec=args.codec, gray_code=not args.no_gray_code, workers=args.workers)
+        with open(args.output, 'wb') as file:
+            file.write(data)
+        metadata, _ = read_bitplane_header(data)
+        for bit, (coder, size) in enumerate(zip(metadata['coders'], metadata['sizes'])):
+            print(f"Plane {BIT_DEPTH - 1 - bit}: {coder}, {size / 1024:.2f} KB")
+        print(f"Original Size: {img_array.nbytes / 1024:.2f} KB")
+        print(f"Compressed Size: {len(data) / 1024:.2f} KB")
+        print(f"Compression Ratio: {len(data) / img_array.nbytes:.2f} (Compressed/Original)")
+    else:
+        with open(args.input, 'rb') as file:
+            img_array = decompress_bytes(file.read(), workers=args.workers)
+        from PIL import Image
+        Image.fromarray(img_array).save(args.output)
+        print(f"Decoded {img_array.shape[1]}x{img_array.shape[0]} image to {args.output}")
+        if args.original:
+            print_metrics(evaluate(load_pixels(args.original), img_array))
+
+
+if __name__ == "__main__":
+    main()
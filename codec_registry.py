@@ -0,0 +1,119 @@
+"""
+Registry of the codecs in this repository.
+
+Every codec script exposes an in-memory entry point (compress_array in the
+compressor, decompress_bytes in the decompressor). The registry loads those
+scripts by path, since the codec folders are not Python packages, and wraps
+them behind one interface:
+
+    codec = get_codec('rle_grayscale')
+    data = codec.compress(img_array)      # bytes, same content as the .txt file
+    img_array = codec.decompress(data)    # numpy array
+
+Binary codecs take and return 0/1 uint8 arrays, grayscale codecs uint8 arrays.
+"""
+import importlib.util
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_modules = {}
+
+
+def load_module(relative_path):
+    """Import a codec script by its path relative to the repository root."""
+    if relative_path in _modules:
+        return _modules[relative_path]
+
+    path = os.path.join(ROOT_DIR, relative_path)
+    directory = os.path.dirname(path)
+    # Make sibling modules importable, as they are when the script is run directly
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    _modules[relative_path] = module
+    return module
+
+
+class Codec:
+    def __init__(self, name, kind, compressor, decompressor, lossless=True, options=None, shared_table=False):
+        self.name = name
+        self.kind = kind  # 'binary' or 'grayscale'
+        self.compressor = compressor
+        self.decompressor = decompressor
+        self.lossless = lossless
+        self.options = options or {}
+        # The compressor exposes build_shared_table(img_array), and both entry points
+        # accept table=..., so tiles of one image can share a single code table
+        self.shared_table = shared_table
+
+    def load(self):
+        """Import the codec scripts up front, so import cost is not paid on first use."""
+        load_module(self.compressor)
+        load_module(self.decompressor)
+        return self
+
+    def compress(self, img_array, instrumentation=None, **kwargs):
+        """Encode an image array and return the serialized data as bytes."""
+        kwargs = {**self.options, **kwargs}
+        if instrumentation is not None:
+            kwargs['instrumentation'] = instrumentation
+        return load_module(self.compressor).compress_array(img_array, **kwargs)
+
+    def decompress(self, data, instrumentation=None, **kwargs):
+        """Decode bytes produced by compress and return the image array."""
+        if instrumentation is not None:
+            kwargs['instrumentation'] = instrumentation
+        return load_module(self.decompressor).decompress_bytes(data, **kwargs)
+
+    def build_shared_table(self, img_array):
+        """Build the code table shared by all tiles of img_array, as a JSON-serializable dict."""
+        if not self.shared_table:
+            raise ValueError(f"Codec '{self.name}' does not support shared tables")
+        return load_module(self.compressor).build_shared_table(img_array)
+
+    def __repr__(self):
+        return f"Codec({self.name!r}, {self.kind!r})"
+
+
+CODECS = {
+    'rle_binary': Codec('rle_binary', 'binary', 'RLE/RLE_binary.py', 'RLE/rle_binary_decompress.py'),
+    'rle_binary_rice': Codec('rle_binary_rice', 'binary', 'RLE/RLE_binary.py', 'RLE/rle_binary_decompress.py',
+                             options={'coding': 'rice'}),
+    'rle_grayscale': Codec('rle_grayscale', 'grayscale', 'RLE/rle_grayscale.py', 'RLE/rle_grayscale_decompress.py'),
+    'rle_grayscale_rice': Codec('rle_grayscale_rice', 'grayscale', 'RLE/rle_grayscale.py',
+                                'RLE/rle_grayscale_decompress.py', options={'coding': 'rice'}),
+    # Lossy: kept out of lossless_codecs(), which the modulo-256 paths (color, sequence, pyramid) draw from
+    'rle_grayscale_near_lossless': Codec('rle_grayscale_near_lossless', 'grayscale', 'RLE/rle_grayscale.py',
+                                         'RLE/rle_grayscale_decompress.py', lossless=False, options={'delta': 2}),
+    'lzw_binary': Codec('lzw_binary', 'binary', 'LZW/lzw_binary.py', 'LZW/lzw_binary_decompress.py'),
+    'lzw_grayscale': Codec('lzw_grayscale', 'grayscale', 'LZW/lzw_grayscale.py', 'LZW/lzw_grayscale_decompress.py'),
+    'huffman_binary': Codec('huffman_binary', 'binary', 'Huffman Coding/huffman_binary.py',
+                            'Huffman Coding/huffman_binary_decompress.py', shared_table=True),
+    'huffman_grayscale': Codec('huffman_grayscale', 'grayscale', 'Huffman Coding/huffman_grayscale.py',
+                               'Huffman Coding/huffman_grayscale_decompress.py', shared_table=True),
+    'drkm': Codec('drkm', 'grayscale', 'DR-KM/Code.py', 'DR-KM/Code.py', lossless=False,
+                  options={'K': 10, 'epsilon': 0.5}),
+    'bitplane': Codec('bitplane', 'grayscale', 'bitplane.py', 'bitplane.py'),
+}
+
+
+def get_codec(name):
+    """Look up a codec by name, raising ValueError for unknown names."""
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown codec '{name}'. Available codecs: {', '.join(CODECS)}")
+
+
+def lossless_codecs(kind=None):
+    """
+    Names of the lossless codecs, optionally of one kind. Paths that code modulo-256
+    differences or transforms use only these, since an error of 1 there can wrap to 255.
+    """
+    return [name for name, codec in CODECS.items() if codec.lossless and kind in (None, codec.kind)]
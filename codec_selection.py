@@ -0,0 +1,259 @@
+"""
+Automatic codec selection from cheap image statistics.
+
+Picking RLE, LZW or Huffman by hand often goes wrong: text RLE on a natural
+grayscale image, for instance, is larger than the raw pixels. select_codec()
+samples a few full-width row bands of the image, gathers a handful of
+statistics and predicts the serialized size every lossless codec would
+produce, without running any of them:
+
+    RLE      run count and the digits of each run, which give the .txt size
+             directly; for Rice-coded RLE, the bits the sampled runs code to
+    Huffman  code lengths built from the sampled histogram, plus the frequency
+             table, which give the encoded size almost exactly
+    LZW      the order-1 conditional entropy of neighbouring pixels, used in
+             the LZ78 phrase-count bound c * log2(c) = n * h and scaled by a
+             factor measured on the benchmark and skimage test images (the
+             measured ratio was 1.0-1.8)
+
+With confirm set, the best candidates are also trial-encoded on one sample
+tile and the smallest actual output wins. DR-KM is lossy and has no cheap size
+model, so it is not considered.
+
+Example:
+    python codec_selection.py pepper.bmp --confirm 2
+"""
+import argparse
+import heapq
+
+import numpy as np
+
+from codec_registry import CODECS, get_codec
+from image_io import load_pixels
+from lzw_dictionary import DEFAULT_MAX_SIZE
+from rice_coding import HEADER as RICE_HEADER, rice_cost, zigzag_steps
+
+DEFAULT_SAMPLE_PIXELS = 1 << 18
+SAMPLE_BANDS = 16
+STATISTICS_CHUNK = 1 << 14  # pixels of a band gathered at once, which bounds the temporaries
+LZW_CALIBRATION = 1.35  # measured codes / predicted phrases, median over the calibration images
+LZW_DICTIONARY_START = 256
+
+
+def infer_kind(img_array):
+    """'binary' for 0/1 images, which the binary codecs take, otherwise 'grayscale'."""
+    return 'binary' if img_array.max(initial=0) <= 1 else 'grayscale'
+
+
+def sample_bands(img_array, sample_pixels=DEFAULT_SAMPLE_PIXELS, seed=0):
+    """
+    Return a list of flattened row bands covering about sample_pixels pixels.
+    Whole rows are kept so that runs and neighbouring-pixel patterns survive.
+    """
+    height, width = img_array.shape[:2]
+    if height * width <= sample_pixels:
+        return [img_array.ravel()]
+    band_rows = max(1, sample_pixels // (SAMPLE_BANDS * width))
+    n_bands = min(SAMPLE_BANDS, height // band_rows)
+    rng = np.random.default_rng(seed)
+    starts = np.sort(rng.choice(height - band_rows + 1, n_bands, replace=False))
+    return [img_array[y:y + band_rows].ravel() for y in starts]
+
+
+def _digits(values):
+    """Number of decimal digits of each non-negative integer."""
+    return np.floor(np.log10(np.maximum(values, 1))).astype(np.int64) + 1
+
+
+def _entropy(counts):
+    p = counts[counts > 0] / counts.sum()
+    return float(-(p * np.log2(p)).sum())
+
+
+def image_statistics(img_array, sample_pixels=DEFAULT_SAMPLE_PIXELS, seed=0):
+    """Gather the statistics the size models need from a sample of the image."""
+    bands = sample_bands(img_array, sample_pixels, seed)
+    n_sampled = sum(band.size for band in bands)
+
+    # Pair counts only need a row per value present: 4 entries for a 0/1 plane instead of 65536
+    levels = max(int(band.max(initial=0)) for band in bands) + 1
+    histogram = np.zeros(256, dtype=np.int64)
+    pair_counts = np.zeros(levels * levels, dtype=np.int64)
+    n_runs = 0
+    run_text_bytes = 0  # bytes of the "value count\n" RLE lines for the sampled runs
+    rice_length_bits = rice_value_bits = 0  # Rice-coded run lengths and grayscale run values
+    for band in bands:
+        for start in range(0, band.size, STATISTICS_CHUNK):
+            chunk = band[start:start + STATISTICS_CHUNK]
+            histogram += np.bincount(chunk, minlength=256)
+            pair_counts += np.bincount(chunk[:-1].astype(np.intp) * levels + chunk[1:], minlength=levels * levels)
+            run_starts = np.flatnonzero(np.diff(chunk)) + 1
+            run_starts = np.concatenate(([0], run_starts))
+            run_lengths = np.diff(np.append(run_starts, chunk.size))
+            n_runs += run_starts.size
+            run_text_bytes += int((_digits(chunk[run_starts]) + _digits(run_lengths) + 2).sum())
+            rice_length_bits += rice_cost(run_lengths - 1)
+            rice_value_bits += rice_cost(zigzag_steps(chunk[run_starts]))
+
+    entropy = _entropy(histogram)
+    # H(X | previous X) = H(pairs) - H(previous)
+    previous_counts = pair_counts.reshape(levels, levels).sum(axis=1)
+    conditional_entropy = max(_entropy(pair_counts) - _entropy(previous_counts), 0.0)
+
+    return {
+        'pixels': img_array.shape[0] * img_array.shape[1],
+        'shape': img_array.shape[:2],
+        'sampled_pixels': n_sampled,
+        'histogram': histogram,
+        'distinct_values': int(np.count_nonzero(histogram)),
+        'entropy': entropy,
+        'conditional_entropy': conditional_entropy,
+        'runs_per_pixel': n_runs / n_sampled,
+        'mean_run_length': n_sampled / n_runs,
+        'bytes_per_run': run_text_bytes / n_runs,
+        'rice_length_bits_per_run': rice_length_bits / n_runs,
+        'rice_value_bits_per_run': rice_value_bits / n_runs,
+    }
+
+
+def huffman_code_lengths(frequencies):
+    """Code length of every symbol of a {symbol: frequency} table, as Huffman coding assigns them."""
+    if len(frequencies) == 1:
+        return {symbol: 1 for symbol in frequencies}
+    heap = [(freq, i, (symbol,)) for i, (symbol, freq) in enumerate(frequencies.items())]
+    heapq.heapify(heap)
+    lengths = dict.fromkeys(frequencies, 0)
+    counter = len(heap)
+    while len(heap) > 1:
+        freq_a, _, symbols_a = heapq.heappop(heap)
+        freq_b, _, symbols_b = heapq.heappop(heap)
+        for symbol in symbols_a + symbols_b:
+            lengths[symbol] += 1
+        heapq.heappush(heap, (freq_a + freq_b, counter, symbols_a + symbols_b))
+        counter += 1
+    return lengths
+
+
+def _header_bytes(shape):
+    return len(f"{shape[0]} {shape[1]}\n")
+
+
+def estimate_rle(stats):
+    return float(_header_bytes(stats['shape']) + stats['runs_per_pixel'] * stats['pixels'] * stats['bytes_per_run'])
+
+
+def estimate_rle_rice(stats, kind):
+    bits_per_run = stats['rice_length_bits_per_run']
+    if kind == 'grayscale':
+        bits_per_run += stats['rice_value_bits_per_run']
+    return float(RICE_HEADER.size + stats['runs_per_pixel'] * stats['pixels'] * bits_per_run / 8)
+
+
+def estimate_huffman(stats, kind):
+    scale = stats['pixels'] / stats['sampled_pixels']
+    frequencies = {value: int(round(count * scale)) or 1
+                   for value, count in enumerate(stats['histogram']) if count}
+    if kind == 'binary':
+        frequencies = {255 if value else 0: freq for value, freq in frequencies.items()}
+    else:
+        frequencies['EOF'] = 1
+    lengths = huffman_code_lengths(frequencies)
+    encoded_bits = sum(frequencies[symbol] * lengths[symbol] for symbol in frequencies)
+    table_bytes = sum(len(f"{symbol} {freq}\n") for symbol, freq in frequencies.items())
+    if kind == 'grayscale':
+        encoded_bits += 7  # padding to a whole byte
+        table_bytes += len("Padding: 0\n")
+    return _header_bytes(stats['shape']) + table_bytes + 51 + encoded_bits  # one character per bit
+
+
+def estimate_lzw(stats):
+    n_symbols = stats['pixels'] * max(stats['conditional_entropy'], 1e-3)
+    phrases = max(n_symbols, 2.0)
+    for _ in range(30):  # fixed point of c * log2(c) = n * h
+        phrases = n_symbols / max(np.log2(phrases), 1.0)
+    codes = min(LZW_CALIBRATION * phrases, stats['pixels'])
+    # Emitted codes are spread over the growing dictionary, which the codecs reset when it reaches
+    # DEFAULT_MAX_SIZE entries; one decimal number per line
+    code_values = np.linspace(0, min(LZW_DICTIONARY_START + codes, DEFAULT_MAX_SIZE), 64)
+    return float(_header_bytes(stats['shape']) + codes * (_digits(code_values).mean() + 1))
+
+
+def estimate_sizes(stats, kind):
+    """Predicted serialized size in bytes of every lossless codec for this kind of image."""
+    return {
+        f'rle_{kind}': estimate_rle(stats),
+        f'rle_{kind}_rice': estimate_rle_rice(stats, kind),
+        f'lzw_{kind}': estimate_lzw(stats),
+        f'huffman_{kind}': estimate_huffman(stats, kind),
+    }
+
+
+def sample_tile(img_array, tile_size=128):
+    """The tile_size x tile_size tile at the centre of the image."""
+    height, width = img_array.shape[:2]
+    y = max((height - tile_size) // 2, 0)
+    x = max((width - tile_size) // 2, 0)
+    return np.ascontiguousarray(img_array[y:y + tile_size, x:x + tile_size])
+
+
+def select_codec(img_array, kind=None, confirm=0, tile_size=128, sample_pixels=DEFAULT_SAMPLE_PIXELS, seed=0):
+    """
+    Choose the lossless codec expected to give the smallest output for img_array.
+
+    kind: 'binary' or 'grayscale'; inferred with infer_kind when not given.
+    confirm: trial-encode this many of the best-ranked codecs on one sample tile
+        and keep the one with the smallest actual output.
+
+    Returns a dict with the chosen 'codec', the 'estimates' in bytes, the
+    'statistics', 'trial_bytes' for confirmed candidates, and 'raw_bytes' (one
+    byte per pixel) so callers can tell when no codec shrinks the image.
+    """
+    kind = kind or infer_kind(img_array)
+    stats = image_statistics(img_array, sample_pixels, seed)
+    estimates = estimate_sizes(stats, kind)
+    ranking = sorted(estimates, key=estimates.get)
+
+    trial_bytes = {}
+    if confirm:
+        tile = sample_tile(img_array, tile_size)
+        for name in ranking[:confirm]:
+            trial_bytes[name] = len(get_codec(name).compress(tile))
+        ranking = sorted(trial_bytes, key=trial_bytes.get) + ranking[confirm:]
+
+    return {
+        'codec': ranking[0],
+        'kind': kind,
+        'estimates': estimates,
+        'trial_bytes': trial_bytes,
+        'statistics': stats,
+        'raw_bytes': stats['pixels'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suggest the codec that should compress an image best.")
+    parser.add_argument('input')
+    parser.add_argument('--kind', choices=('binary', 'grayscale'), help="Default: binary for 0/1 arrays")
+    parser.add_argument('--confirm', type=int, default=0, help="Trial-encode the N best codecs on a sample tile")
+    parser.add_argument('--compare', action='store_true', help="Also encode the full image with every codec")
+    args = parser.parse_args()
+
+    img_array = load_pixels(args.input, '1' if args.kind == 'binary' else 'L')
+    selection = select_codec(img_array, args.kind, args.confirm)
+    stats = selection['statistics']
+    print(f"Entropy: {stats['entropy']:.3f} bits/pixel, conditional entropy: {stats['conditional_entropy']:.3f}, "
+          f"mean run length: {stats['mean_run_length']:.2f}")
+    for name, estimate in sorted(selection['estimates'].items(), key=lambda item: item[1]):
+        line = f"{name:<18} estimated {estimate / 1024:10.2f} KB ({estimate / selection['raw_bytes']:.2f} of raw)"
+        if name in selection['trial_bytes']:
+            line += f", sample tile {selection['trial_bytes'][name] / 1024:.2f} KB"
+        if args.compare:
+            line += f", actual {len(CODECS[name].compress(img_array)) / 1024:.2f} KB"
+        print(line)
+    print(f"Selected codec: {selection['codec']}")
+    if min(selection['estimates'].values()) > selection['raw_bytes']:
+        print("Warning: no codec is expected to make this image smaller than its raw pixels")
+
+
+if __name__ == "__main__":
+    main()
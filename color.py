@@ -0,0 +1,214 @@
+"""
+Color images for the grayscale codecs.
+
+The RLE, LZW and Huffman engines only code single 8-bit planes. For color,
+the RGB channels first go through a reversible color transform (YCoCg-R),
+which moves most of the information into the luma plane and leaves two
+low-entropy chroma planes. Each plane is then coded on its own with an
+existing grayscale codec, concurrently when workers are given, and the coded
+planes are stored one after another behind a small header:
+
+    magic b'FYPR', format version, length of the JSON metadata
+    metadata  shape, transform, codec of each plane, size of each plane
+    planes    what codec.compress returned for each plane, in order
+
+The YCoCg-R lifting steps are done modulo 256, with the chroma differences
+wrapped to 8 bits. Every plane therefore stays uint8 and feeds the grayscale
+codecs unchanged, and the transform is exactly invertible. For pixels whose
+channel differences fit in a signed byte (almost all of a natural image) the
+result is the textbook YCoCg-R. An alpha channel is coded as a fourth plane,
+untransformed.
+
+Example:
+    python color.py compress peppers.png peppers.fypr --codec lzw_grayscale --workers 3
+    python color.py decompress peppers.fypr recon.png --original peppers.png
+"""
+import argparse
+import json
+import struct
+from itertools import repeat
+
+import numpy as np
+
+from codec_registry import get_codec, lossless_codecs
+from codec_selection import select_codec
+from instrumentation import NO_INSTRUMENTATION
+from metrics import evaluate, print_metrics
+from parallel import compress_tile, decompress_tile, tile_executor
+
+MAGIC = b'FYPR'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')  # magic, version, metadata length
+
+TRANSFORMS = ('ycocg-r', 'none')
+# YCoCg-R works modulo 256, so an error of 1 in a plane can become an error of 255 in RGB
+GRAYSCALE_CODECS = lossless_codecs('grayscale')
+
+
+def _wrap_signed(values):
+    """Wrap int16 values into the signed byte range [-128, 127], i.e. modulo 256."""
+    return ((values + 128) & 255) - 128
+
+
+def rgb_to_ycocg_r(rgb):
+    """Forward YCoCg-R modulo 256. Returns Y, Co and Cg as uint8 planes, chroma offset by 128."""
+    r, g, b = (rgb[..., channel].astype(np.int16) for channel in range(3))
+    co = _wrap_signed(r - b)
+    t = (b + (co >> 1)) & 255
+    cg = _wrap_signed(g - t)
+    y = (t + (cg >> 1)) & 255
+    return y.astype(np.uint8), (co + 128).astype(np.uint8), (cg + 128).astype(np.uint8)
+
+
+def ycocg_r_to_rgb(y, co, cg):
+    """Inverse of rgb_to_ycocg_r, exact for every input."""
+    y = y.astype(np.int16)
+    co = co.astype(np.int16) - 128
+    cg = cg.astype(np.int16) - 128
+    t = (y - (cg >> 1)) & 255
+    g = (cg + t) & 255
+    b = (t - (co >> 1)) & 255
+    r = (b + co) & 255
+    return np.stack([r, g, b], axis=-1).astype(np.uint8)
+
+
+def split_planes(image, transform='ycocg-r'):
+    """Split an (H, W, 3 or 4) uint8 image into the planes that get coded."""
+    if image.ndim != 3 or image.shape[2] not in (3, 4):
+        raise ValueError(f"Expected an RGB or RGBA image, got shape {image.shape}")
+    if transform == 'ycocg-r':
+        planes = list(rgb_to_ycocg_r(image))
+    elif transform == 'none':
+        planes = [image[..., channel] for channel in range(3)]
+    else:
+        raise ValueError(f"Unknown color transform '{transform}'. Available transforms: {', '.join(TRANSFORMS)}")
+    if image.shape[2] == 4:
+        planes.append(image[..., 3])
+    return [np.ascontiguousarray(plane) for plane in planes]
+
+
+def merge_planes(planes, transform='ycocg-r'):
+    """Inverse of split_planes."""
+    if transform == 'ycocg-r':
+        rgb = ycocg_r_to_rgb(*planes[:3])
+    else:
+        rgb = np.stack(planes[:3], axis=-1)
+    if len(planes) == 4:
+        rgb = np.concatenate([rgb, planes[3][..., None]], axis=-1)
+    return rgb
+
+
+def compress_color(image, codec_name='lzw_grayscale', transform='ycocg-r', workers=None,
+                   instrumentation=NO_INSTRUMENTATION):
+    """
+    Code an RGB or RGBA uint8 image and return the bytes.
+
+    codec_name: a lossless grayscale codec, or 'auto' to let select_codec pick one per plane.
+    workers: number of processes, or an Executor, to code the planes concurrently.
+    """
+    with instrumentation.stage('transform'):
+        planes = split_planes(image, transform)
+    if codec_name == 'auto':
+        codec_names = [select_codec(plane, 'grayscale')['codec'] for plane in planes]
+    elif get_codec(codec_name).kind != 'grayscale':
+        raise ValueError(f"Color planes need a grayscale codec; '{codec_name}' is {get_codec(codec_name).kind}")
+    elif not get_codec(codec_name).lossless:
+        raise ValueError(f"Color planes need a lossless codec, and '{codec_name}' is lossy")
+    else:
+        codec_names = [codec_name] * len(planes)
+
+    with instrumentation.stage('encode'):
+        with tile_executor(workers) as executor:
+            if executor is None:
+                coded = [get_codec(name).compress(plane) for name, plane in zip(codec_names, planes)]
+            else:
+                coded = list(executor.map(compress_tile, codec_names, planes, repeat({})))
+
+    with instrumentation.stage('serialize'):
+        metadata = json.dumps({
+            'shape': list(image.shape),
+            'transform': transform,
+            'codecs': codec_names,
+            'sizes': [len(data) for data in coded],
+        }).encode('utf-8')
+        return HEADER.pack(MAGIC, VERSION, len(metadata)) + metadata + b''.join(coded)
+
+
+def read_color_header(data):
+    """Parse the header of color data. Returns (metadata, offset of the first plane)."""
+    magic, version, metadata_length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not color codec data")
+    if version > VERSION:
+        raise ValueError(f"Color data version {version} is newer than supported version {VERSION}")
+    metadata = json.loads(bytes(data[HEADER.size:HEADER.size + metadata_length]).decode('utf-8'))
+    return metadata, HEADER.size + metadata_length
+
+
+def decompress_color(data, workers=None, instrumentation=NO_INSTRUMENTATION):
+    """Decode bytes produced by compress_color and return the (H, W, 3 or 4) uint8 image."""
+    with instrumentation.stage('parse'):
+        metadata, offset = read_color_header(data)
+        payloads = []
+        for size in metadata['sizes']:
+            payloads.append(bytes(data[offset:offset + size]))
+            offset += size
+
+    with instrumentation.stage('decode'):
+        with tile_executor(workers) as executor:
+            if executor is None:
+                planes = [get_codec(name).decompress(payload) for name, payload in zip(metadata['codecs'], payloads)]
+            else:
+                planes = list(executor.map(decompress_tile, metadata['codecs'], payloads, repeat({})))
+
+    with instrumentation.stage('transform'):
+        return merge_planes(planes, metadata['transform'])
+
+
+def load_color_pixels(path):
+    """Load an image as RGB, or RGBA when it has transparency, as a uint8 array."""
+    from PIL import Image
+    with Image.open(path) as image:
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        return np.array(image.convert('RGBA' if has_alpha else 'RGB'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress color images with the grayscale codecs.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compress_parser = subparsers.add_parser('compress', help="Compress a color image")
+    compress_parser.add_argument('input')
+    compress_parser.add_argument('output')
+    compress_parser.add_argument('--codec', default='lzw_grayscale', choices=GRAYSCALE_CODECS + ['auto'])
+    compress_parser.add_argument('--transform', default='ycocg-r', choices=TRANSFORMS)
+    compress_parser.add_argument('--workers', type=int, default=None)
+
+    decompress_parser = subparsers.add_parser('decompress', help="Decompress to an image file")
+    decompress_parser.add_argument('input')
+    decompress_parser.add_argument('output')
+    decompress_parser.add_argument('--original', help="Original image to compare the reconstruction with")
+    decompress_parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == 'compress':
+        image = load_color_pixels(args.input)
+        data = compress_color(image, args.codec, args.transform, args.workers)
+        with open(args.output, 'wb') as file:
+            file.write(data)
+        print(f"Original Size: {image.nbytes / 1024:.2f} KB")
+        print(f"Compressed Size: {len(data) / 1024:.2f} KB")
+        print(f"Compression Ratio: {len(data) / image.nbytes:.2f} (Compressed/Original)")
+    else:
+        with open(args.input, 'rb') as file:
+            image = decompress_color(file.read(), args.workers)
+        from PIL import Image
+        Image.fromarray(image).save(args.output)
+        print(f"Decoded {image.shape[1]}x{image.shape[0]} color image to {args.output}")
+        if args.original:
+            original = load_color_pixels(args.original)
+            print_metrics(evaluate(original, image, compute_ssim=False))
+
+
+if __name__ == "__main__":
+    main()
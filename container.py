@@ -0,0 +1,363 @@
+"""
+Random-access tiled container shared by all codecs.
+
+The image is cut into fixed-size tiles and every tile is compressed on its own
+by one of the registered codecs. The file starts with a versioned header and a
+tile index, so a reader can seek straight to the tiles covering a region of
+interest and decode only those:
+
+    header   magic b'FYPC', format version, image and tile size, tile count,
+             then the codec name and a JSON block of codec metadata
+    index    one (offset, length, CRC-32) entry per tile, in row-major order
+    tiles    the compressed tiles, each exactly what codec.compress returned
+
+The header and the index each end with their own CRC-32, and every tile is
+checked against its index entry when it is read.
+
+Because tiles are independent, they can be encoded and decoded concurrently:
+pass workers=N (or an existing executor) to spread the tiles over a process
+pool, which is what brings a single large image onto several cores. Codecs
+with a code table (Huffman) build one table for the whole image and store it
+once in the header metadata instead of repeating it in every tile.
+
+Example:
+    python container.py compress pepper.bmp pepper.fypc --codec rle_grayscale --tile 256 --workers 4
+    python container.py decompress pepper.fypc window.bmp --region 1024 2048 512 512
+"""
+import argparse
+import io
+import json
+import struct
+import zlib
+from itertools import repeat
+
+import numpy as np
+
+from codec_registry import CODECS, get_codec
+from codec_selection import select_codec
+from image_io import load_pixels
+from instrumentation import NO_INSTRUMENTATION
+from parallel import compress_tile, decompress_tile, tile_executor
+
+MAGIC = b'FYPC'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIIIIHI')  # magic, version, flags, height, width, tile h, tile w, tiles, name, meta
+INDEX_ENTRY = struct.Struct('<QII')     # offset, length, crc32
+CHECKSUM = struct.Struct('<I')
+
+DEFAULT_TILE_SIZE = 256
+
+
+class ContainerError(ValueError):
+    """Raised for files that are not valid containers or fail a checksum."""
+
+
+def tile_grid(height, width, tile_height, tile_width):
+    """Number of tile rows and columns needed to cover an image."""
+    return -(-height // tile_height), -(-width // tile_width)
+
+
+def iter_tiles(img_array, tile_height, tile_width):
+    """Yield (row, col, tile) for every tile of an image in row-major order."""
+    height, width = img_array.shape[:2]
+    rows, cols = tile_grid(height, width, tile_height, tile_width)
+    for row in range(rows):
+        for col in range(cols):
+            y, x = row * tile_height, col * tile_width
+            yield row, col, img_array[y:y + tile_height, x:x + tile_width]
+
+
+def as_file(target, mode):
+    """Open target if it is a path; return (file, should_close)."""
+    if isinstance(target, (str, bytes)) or hasattr(target, '__fspath__'):
+        return open(target, mode), True
+    return target, False
+
+
+def pack_header(header_struct, fields, codec_name, metadata):
+    """
+    Header bytes of a container, sequence or pyramid file: header_struct packed from
+    fields followed by the codec name and JSON metadata lengths, then the name, the
+    metadata and a CRC-32 of it all.
+    """
+    name = codec_name.encode('utf-8')
+    meta = json.dumps(metadata).encode('utf-8')
+    header = header_struct.pack(*fields, len(name), len(meta)) + name + meta
+    return header + CHECKSUM.pack(zlib.crc32(header))
+
+
+def pack_index(entries):
+    """Index bytes: the packed entries followed by a CRC-32 of them."""
+    index = b''.join(entries)
+    return index + CHECKSUM.pack(zlib.crc32(index))
+
+
+class FramedReader:
+    """
+    Base of the readers of files laid out as pack_header and pack_index write them:
+    a header, an index of (offset, length, CRC-32, ...) entries, and the payloads,
+    at offsets relative to the start of the file. Subclasses set the format's
+    MAGIC, VERSION, HEADER and INDEX_ENTRY, the error to raise, the name of
+    the format and the name of one payload for messages.
+    """
+
+    MAGIC = MAGIC
+    VERSION = VERSION
+    HEADER = HEADER
+    INDEX_ENTRY = INDEX_ENTRY
+    error = ContainerError
+    format_name = 'container'
+    item_name = 'tile'
+
+    def __init__(self, source):
+        self._file, self._should_close = as_file(source, 'rb')
+        self._start = self._file.tell()
+
+    def _read_exact(self, size):
+        data = self._file.read(size)
+        if len(data) != size:
+            raise self.error(f"{self.format_name.capitalize()} is truncated")
+        return data
+
+    def _read_header(self):
+        """
+        Read and verify the header, setting version, flags, codec_name and metadata.
+        Returns the fields between the flags and the name length.
+        """
+        fixed = self._read_exact(self.HEADER.size)
+        magic, self.version, self.flags, *fields, name_length, meta_length = self.HEADER.unpack(fixed)
+        if magic != self.MAGIC:
+            raise self.error(f"Not a {self.format_name} file")
+        if self.version > self.VERSION:
+            raise self.error(f"{self.format_name.capitalize()} version {self.version} is newer than "
+                             f"supported version {self.VERSION}")
+        variable = self._read_exact(name_length + meta_length)
+        (checksum,) = CHECKSUM.unpack(self._read_exact(CHECKSUM.size))
+        if zlib.crc32(fixed + variable) != checksum:
+            raise self.error("Header checksum mismatch")
+        self.codec_name = variable[:name_length].decode('utf-8')
+        self.metadata = json.loads(variable[name_length:].decode('utf-8'))
+        return fields
+
+    def _read_index(self, count):
+        """Read and verify an index of count entries at the current position; returns the entries."""
+        index = self._read_exact(count * self.INDEX_ENTRY.size)
+        (checksum,) = CHECKSUM.unpack(self._read_exact(CHECKSUM.size))
+        if zlib.crc32(index) != checksum:
+            raise self.error(f"{self.item_name.capitalize()} index checksum mismatch")
+        return list(self.INDEX_ENTRY.iter_unpack(index))
+
+    def read_payload(self, i, label=None):
+        """Return the verified bytes of payload i of the index; label names it in errors."""
+        offset, length, checksum = self.index[i][:3]
+        self._file.seek(self._start + offset)
+        data = self._read_exact(length)
+        if zlib.crc32(data) != checksum:
+            raise self.error(f"Checksum mismatch in {self.item_name} {i if label is None else label}")
+        return data
+
+    def close(self):
+        if self._should_close:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_container(target, img_array, codec_name, tile_size=DEFAULT_TILE_SIZE, metadata=None,
+                    shared_table=None, workers=None, instrumentation=NO_INSTRUMENTATION):
+    """
+    Compress img_array tile by tile with the named codec and write the container to
+    target (a path or a seekable binary file). Returns the number of bytes written.
+
+    tile_size: an int or a (height, width) pair.
+    shared_table: build one code table for the whole image and store it in the header.
+        Defaults to True for codecs that support it.
+    workers: number of processes, or an Executor, to encode tiles concurrently.
+    """
+    codec = get_codec(codec_name)
+    tile_height, tile_width = (tile_size, tile_size) if np.isscalar(tile_size) else tile_size
+    height, width = img_array.shape[:2]
+    rows, cols = tile_grid(height, width, tile_height, tile_width)
+
+    meta = {'kind': codec.kind, 'options': codec.options, **(metadata or {})}
+    tile_kwargs = {}
+    if codec.shared_table if shared_table is None else shared_table:
+        with instrumentation.stage('transform'):
+            meta['table'] = tile_kwargs['table'] = codec.build_shared_table(img_array)
+
+    header = pack_header(HEADER, (MAGIC, VERSION, 0, height, width, tile_height, tile_width, rows * cols),
+                         codec.name, meta)
+
+    file, should_close = as_file(target, 'wb')
+    try:
+        start = file.tell()
+        # Tile offsets are relative to the start of the container
+        offset = len(header) + rows * cols * INDEX_ENTRY.size + CHECKSUM.size
+        file.write(header)
+        file.seek(start + offset)
+
+        tiles = (np.ascontiguousarray(tile) for _, _, tile in iter_tiles(img_array, tile_height, tile_width))
+        index = []
+        with tile_executor(workers) as executor:
+            if executor is None:
+                encoded = (codec.compress(tile, instrumentation=instrumentation, **tile_kwargs) for tile in tiles)
+            else:
+                encoded = executor.map(compress_tile, repeat(codec.name), tiles, repeat(tile_kwargs))
+            for data in encoded:
+                with instrumentation.stage('write'):
+                    file.write(data)
+                index.append(INDEX_ENTRY.pack(offset, len(data), zlib.crc32(data)))
+                offset += len(data)
+
+        file.seek(start + len(header))
+        file.write(pack_index(index))
+        file.seek(start + offset)
+    finally:
+        if should_close:
+            file.close()
+    instrumentation.count_out(offset)
+    return offset
+
+
+def compress_tiled(img_array, codec_name, tile_size=DEFAULT_TILE_SIZE, workers=None, **kwargs):
+    """Like write_container, but return the container as bytes."""
+    buffer = io.BytesIO()
+    write_container(buffer, img_array, codec_name, tile_size, workers=workers, **kwargs)
+    return buffer.getvalue()
+
+
+def decompress_tiled(data, workers=None, instrumentation=NO_INSTRUMENTATION):
+    """Decode a whole container held in memory."""
+    with ContainerReader(io.BytesIO(data)) as reader:
+        return reader.read_all(instrumentation, workers=workers)
+
+
+class ContainerReader(FramedReader):
+    """
+    Reads a container lazily. Opening it reads and verifies only the header and the
+    tile index; tiles are read and decoded on demand.
+
+        with ContainerReader('pepper.fypc') as reader:
+            window = reader.read_region(1024, 2048, 512, 512)
+    """
+
+    format_name = 'tiled container'
+
+    def __init__(self, source):
+        super().__init__(source)
+        self.height, self.width, self.tile_height, self.tile_width, self.n_tiles = self._read_header()
+        self.tile_kwargs = {'table': self.metadata['table']} if 'table' in self.metadata else {}
+        self.rows, self.cols = tile_grid(self.height, self.width, self.tile_height, self.tile_width)
+        if self.rows * self.cols != self.n_tiles:
+            raise ContainerError("Tile count does not match the image and tile size")
+        self.index = self._read_index(self.n_tiles)
+        self.codec = get_codec(self.codec_name)
+
+    @property
+    def shape(self):
+        return self.height, self.width
+
+    def read_tile_bytes(self, row, col):
+        """Return the verified compressed bytes of one tile."""
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            raise IndexError(f"Tile ({row}, {col}) is outside the {self.rows}x{self.cols} grid")
+        return self.read_payload(row * self.cols + col, (row, col))
+
+    def read_tile(self, row, col, instrumentation=NO_INSTRUMENTATION):
+        """Decode one tile and return it as an array."""
+        with instrumentation.stage('read'):
+            data = self.read_tile_bytes(row, col)
+        instrumentation.count_in(len(data))
+        return self.codec.decompress(data, instrumentation=instrumentation, **self.tile_kwargs)
+
+    def tiles_in_region(self, y, x, height, width):
+        """(row, col) of every tile overlapping the region, clipped to the image."""
+        y_end, x_end = min(y + height, self.height), min(x + width, self.width)
+        y, x = max(y, 0), max(x, 0)
+        if y >= y_end or x >= x_end:
+            return []
+        return [(row, col)
+                for row in range(y // self.tile_height, (y_end - 1) // self.tile_height + 1)
+                for col in range(x // self.tile_width, (x_end - 1) // self.tile_width + 1)]
+
+    def read_region(self, y, x, height, width, instrumentation=NO_INSTRUMENTATION, workers=None):
+        """
+        Decode only the tiles overlapping a window and return the window, clipped to the image.
+        workers: number of processes, or an Executor, to decode tiles concurrently.
+        """
+        y_end, x_end = min(y + height, self.height), min(x + width, self.width)
+        y, x = max(y, 0), max(x, 0)
+        region = np.zeros((max(y_end - y, 0), max(x_end - x, 0)), dtype=np.uint8)
+        tiles = self.tiles_in_region(y, x, y_end - y, x_end - x)
+
+        with instrumentation.stage('read'):
+            payloads = [self.read_tile_bytes(row, col) for row, col in tiles]
+        instrumentation.count_in(sum(len(data) for data in payloads))
+
+        with tile_executor(workers) as executor:
+            if executor is None:
+                decoded = (self.codec.decompress(data, instrumentation=instrumentation, **self.tile_kwargs)
+                           for data in payloads)
+            else:
+                decoded = executor.map(decompress_tile, repeat(self.codec_name), payloads, repeat(self.tile_kwargs))
+            for (row, col), tile in zip(tiles, decoded):
+                tile_y, tile_x = row * self.tile_height, col * self.tile_width
+                top, left = max(y, tile_y), max(x, tile_x)
+                bottom, right = min(y_end, tile_y + tile.shape[0]), min(x_end, tile_x + tile.shape[1])
+                region[top - y:bottom - y, left - x:right - x] = tile[top - tile_y:bottom - tile_y,
+                                                                      left - tile_x:right - tile_x]
+        return region
+
+    def read_all(self, instrumentation=NO_INSTRUMENTATION, workers=None):
+        """Decode the whole image."""
+        return self.read_region(0, 0, self.height, self.width, instrumentation, workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack images into, or read regions from, a tiled container.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compress_parser = subparsers.add_parser('compress', help="Compress an image into a container")
+    compress_parser.add_argument('input')
+    compress_parser.add_argument('output')
+    compress_parser.add_argument('--codec', default='rle_grayscale', choices=list(CODECS) + ['auto'],
+                                 help="'auto' picks a lossless codec from image statistics")
+    compress_parser.add_argument('--binary', action='store_true', help="Threshold the input to 0/1 first")
+    compress_parser.add_argument('--tile', type=int, default=DEFAULT_TILE_SIZE)
+    compress_parser.add_argument('--workers', type=int, default=None)
+
+    decompress_parser = subparsers.add_parser('decompress', help="Decode a container, or a region of it")
+    decompress_parser.add_argument('input')
+    decompress_parser.add_argument('output')
+    decompress_parser.add_argument('--region', type=int, nargs=4, metavar=('Y', 'X', 'HEIGHT', 'WIDTH'))
+    decompress_parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == 'compress':
+        if args.codec == 'auto':
+            img_array = load_pixels(args.input, '1' if args.binary else 'L')
+            args.codec = select_codec(img_array, confirm=2)['codec']
+            print(f"Selected codec: {args.codec}")
+        else:
+            img_array = load_pixels(args.input, '1' if get_codec(args.codec).kind == 'binary' else 'L')
+        size = write_container(args.output, img_array, args.codec, args.tile, workers=args.workers)
+        print(f"Wrote {size} bytes to {args.output}")
+    else:
+        with ContainerReader(args.input) as reader:
+            if args.region:
+                region = reader.read_region(*args.region, workers=args.workers)
+            else:
+                region = reader.read_all(workers=args.workers)
+            if reader.codec.kind == 'binary':
+                region = region * 255
+        from PIL import Image
+        Image.fromarray(region.astype(np.uint8)).save(args.output)
+        print(f"Decoded {region.shape[0]}x{region.shape[1]} pixels to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""
+Pixel array interchange between the converters and the codecs.
+
+The converters used to dump every pixel as decimal text, and the codecs then
+re-decoded a BMP. Arrays are now exchanged as:
+
+    .npy   uint8 array (grayscale values or 0/1), memory-mappable with np.load
+    .bits  bit-packed binary image: 4-byte magic, uint32 height and width, then
+           each row packed with np.packbits (MSB first, rows padded to a byte)
+    .txt   the old space-separated text dump, only written on request
+
+load_pixels() accepts any of these, an image file or an in-memory array, so
+every codec can be handed whatever the previous step produced. Uncompressed
+8-bit grayscale BMPs are not decoded at all: map_bmp_pixels() parses the
+header and returns the pixel rows as a read-only memory-mapped view. The
+view is strided (BMPs are usually stored bottom-up, with rows padded to 4
+bytes), and the RLE, LZW and Huffman encoders read it a block of pixels at a
+time (scan_order.iter_scan_blocks) rather than flattening it, so the image
+is never copied whole; through PIL, the decoded image and the array made
+from it are two copies.
+
+For sources too large to decode at once, iter_gray_strips() yields the image
+as horizontal strips of 8-bit luma and StripWriter writes strips into a
+.npy, .bits, .txt or .bmp file as they arrive. Uncompressed BMPs, .npy and
+.bits files are read one strip at a time, so memory use does not depend on
+the image size; other formats fall back to PIL, which decodes the source once.
+"""
+import os
+import struct
+
+import numpy as np
+
+BITS_MAGIC = b'FYPB'
+BITS_HEADER = struct.Struct('<4sII')
+
+BMP_FILE_HEADER = struct.Struct('<2sIHHI')
+BMP_INFO_HEADER = struct.Struct('<IiiHHIIiiII')
+
+
+def save_packed_bits(binary_array, path):
+    """Save a 0/1 (or boolean) image as a .bits file, one bit per pixel."""
+    height, width = binary_array.shape
+    with open(path, 'wb') as file:
+        file.write(BITS_HEADER.pack(BITS_MAGIC, height, width))
+        file.write(np.packbits(binary_array.astype(bool), axis=1).tobytes())
+
+
+def load_packed_bits(path, mmap=False):
+    """Load a .bits file as a 0/1 uint8 array. With mmap the packed rows are not read up front."""
+    with open(path, 'rb') as file:
+        magic, height, width = BITS_HEADER.unpack(file.read(BITS_HEADER.size))
+    if magic != BITS_MAGIC:
+        raise ValueError(f"{path} is not a packed bits file")
+    row_bytes = (width + 7) // 8
+    if mmap:
+        packed = np.memmap(path, dtype=np.uint8, mode='r', offset=BITS_HEADER.size, shape=(height, row_bytes))
+    else:
+        packed = np.fromfile(path, dtype=np.uint8, offset=BITS_HEADER.size).reshape(height, row_bytes)
+    return np.unpackbits(packed, axis=1, count=width)
+
+
+def save_text_array(array, path):
+    """Write the array as space-separated decimal text, one image row per line."""
+    np.savetxt(path, array, fmt='%d', delimiter=' ')
+
+
+def save_array(array, path):
+    """Save an array in the format given by the file extension (.npy, .bits or .txt)."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        np.save(path, array)
+    elif extension == '.bits':
+        save_packed_bits(array, path)
+    elif extension == '.txt':
+        save_text_array(array, path)
+    else:
+        raise ValueError(f"Unsupported array format '{extension}', expected .npy, .bits or .txt")
+
+
+def load_array(path, mmap=True):
+    """Load an array saved by save_array. .npy files are memory-mapped by default."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        return np.load(path, mmap_mode='r' if mmap else None)
+    if extension == '.bits':
+        return load_packed_bits(path, mmap=mmap)
+    if extension == '.txt':
+        return np.loadtxt(path, dtype=np.uint8, ndmin=2)
+    raise ValueError(f"Unsupported array format '{extension}', expected .npy, .bits or .txt")
+
+
+def load_pixels(source, mode='L'):
+    """
+    Return the pixels of source as a uint8 array.
+
+    source may be a numpy array, an array file (.npy, .bits, .txt) or an image
+    file. mode 'L' gives grayscale values, mode '1' gives a 0/1 binary image;
+    image files are converted with PIL, exactly as the codecs did before, except
+    uncompressed 8-bit and 1-bit BMPs, which are read through map_bmp_pixels.
+    """
+    if isinstance(source, np.ndarray):
+        array = source
+    elif os.path.splitext(source)[1].lower() in ('.npy', '.bits', '.txt'):
+        array = load_array(source)
+    else:
+        array = map_bmp_pixels(source, mode) if source.lower().endswith('.bmp') else None
+        if array is None:
+            from PIL import Image
+            image = Image.open(source)
+            if image.mode != mode:
+                image = image.convert(mode)
+            array = np.array(image)
+
+    if mode == '1':
+        return array if array.dtype == np.uint8 and array.max(initial=0) <= 1 else (array > 0).astype(np.uint8)
+    return array if array.dtype == np.uint8 else array.astype(np.uint8)
+
+
+def source_nbytes(source):
+    """Size of the input in bytes: the file size for paths, the buffer size for arrays."""
+    if isinstance(source, np.ndarray):
+        return source.nbytes
+    return os.path.getsize(source)
+
+
+def rgb_to_luma(rgb):
+    """ITU-R 601-2 luma of an (..., 3+) uint8 array, bit-identical to PIL's convert('L')."""
+    r = rgb[..., 0].astype(np.uint32)
+    luma = r * 19595
+    luma += rgb[..., 1].astype(np.uint32) * 38470
+    luma += rgb[..., 2].astype(np.uint32) * 7471
+    luma += 0x8000
+    luma >>= 16
+    return luma.astype(np.uint8)
+
+
+def read_bmp_header(path):
+    """
+    Parse the headers of a BMP file. Returns None for files that are not
+    uncompressed BMPs, so callers can fall back to PIL.
+    """
+    with open(path, 'rb') as file:
+        file_header = file.read(BMP_FILE_HEADER.size)
+        info_header = file.read(BMP_INFO_HEADER.size)
+        if len(info_header) < BMP_INFO_HEADER.size:
+            return None
+        signature, _, _, _, pixel_offset = BMP_FILE_HEADER.unpack(file_header)
+        (header_size, width, height, _, bits_per_pixel, compression,
+         _, _, _, colors_used, _) = BMP_INFO_HEADER.unpack(info_header)
+        if signature != b'BM' or header_size < BMP_INFO_HEADER.size or compression != 0:
+            return None
+        if bits_per_pixel not in (1, 8, 24, 32):
+            return None
+
+        palette = None
+        if bits_per_pixel <= 8:
+            n_colors = colors_used or 2 ** bits_per_pixel
+            file.seek(BMP_FILE_HEADER.size + header_size)
+            entries = np.frombuffer(file.read(4 * n_colors), dtype=np.uint8).reshape(-1, 4)
+            palette = entries[:, 2::-1].copy()  # stored as B, G, R, reserved
+
+    return {
+        'width': width,
+        'height': abs(height),
+        'top_down': height < 0,
+        'bits_per_pixel': bits_per_pixel,
+        'pixel_offset': pixel_offset,
+        'stride': ((width * bits_per_pixel + 31) // 32) * 4,  # rows are padded to 4 bytes
+        'palette': palette,
+    }
+
+
+def map_bmp_rows(path, header=None):
+    """
+    Memory-map the pixel rows of an uncompressed BMP as an (height, stride) uint8
+    view in top-to-bottom order. Bottom-up files get a reversed (negative-stride)
+    view, not a copy; it is C-contiguous only for top-down files.
+    """
+    header = header or read_bmp_header(path)
+    rows = np.memmap(path, dtype=np.uint8, mode='r', offset=header['pixel_offset'],
+                     shape=(header['height'], header['stride']))
+    return np.asarray(rows if header['top_down'] else rows[::-1])
+
+
+def map_bmp_pixels(path, mode='L'):
+    """
+    Pixels of an uncompressed 8-bit or 1-bit BMP, as load_pixels would return them,
+    without decoding the file through PIL. Returns None when the file needs PIL.
+
+    An 8-bit BMP with a grayscale palette (what PIL writes for mode 'L') is returned
+    as a view of the file. The view is not C-contiguous unless the file is top-down
+    and its width a multiple of 4, which the encoders handle by copying a block of
+    pixels at a time. Other palettes go through a lookup table, and 1-bit rows are
+    unpacked, since the codecs need one value per pixel.
+    Mode '1' on an image that is not black and white is left to PIL, which dithers.
+    """
+    header = read_bmp_header(path)
+    if header is None or header['bits_per_pixel'] not in (1, 8):
+        return None
+    luma = rgb_to_luma(header['palette'])
+    if mode == '1' and not np.isin(luma, (0, 255)).all():
+        return None
+
+    rows = map_bmp_rows(path, header)
+    width = header['width']
+    if header['bits_per_pixel'] == 1:
+        indices = np.unpackbits(rows, axis=1, count=width)
+    else:
+        indices = rows[:, :width]
+        if mode == 'L' and len(luma) == 256 and np.array_equal(luma, np.arange(256, dtype=np.uint8)):
+            return indices
+    if mode == '1':
+        return (luma > 0).view(np.uint8)[indices]
+    return luma[indices]
+
+
+def read_rows(path, offset, stride, height, y, n_rows, bottom_up=False):
+    """
+    Read rows y .. y + n_rows (counted from the top) of a raw row-major pixel block
+    that starts at offset, as an (n_rows, stride) uint8 array. Rows are read with a
+    plain file read rather than a memory map, so they do not stay resident.
+    """
+    n_rows = min(n_rows, height - y)
+    first_row = height - y - n_rows if bottom_up else y
+    rows = np.fromfile(path, dtype=np.uint8, count=n_rows * stride,
+                       offset=offset + first_row * stride).reshape(n_rows, stride)
+    return rows[::-1] if bottom_up else rows
+
+
+def image_size(source):
+    """Return (height, width) of an image or array file without decoding the pixels."""
+    extension = os.path.splitext(source)[1].lower()
+    if extension == '.npy':
+        return np.load(source, mmap_mode='r').shape[:2]
+    if extension == '.bits':
+        with open(source, 'rb') as file:
+            _, height, width = BITS_HEADER.unpack(file.read(BITS_HEADER.size))
+        return height, width
+    from PIL import Image
+    with Image.open(source) as image:
+        return image.height, image.width
+
+
+def _npy_layout(path):
+    """Return (data offset, shape, dtype) of a C-ordered .npy file, without reading the data."""
+    array = np.load(path, mmap_mode='r')
+    if not array.flags.c_contiguous:
+        raise ValueError(f"{path} is stored in Fortran order and cannot be read in strips")
+    return array.offset, array.shape, array.dtype
+
+
+def _bmp_gray_strips(path, header, strip_rows):
+    width, height = header['width'], header['height']
+    bits_per_pixel, palette = header['bits_per_pixel'], header['palette']
+    if palette is not None:
+        lut = rgb_to_luma(palette)
+        identity = len(lut) == 256 and np.array_equal(lut, np.arange(256, dtype=np.uint8))
+    for y in range(0, height, strip_rows):
+        strip = read_rows(path, header['pixel_offset'], header['stride'], height, y, strip_rows,
+                          bottom_up=not header['top_down'])
+        if bits_per_pixel == 8:
+            indices = strip[:, :width]
+            yield y, np.ascontiguousarray(indices) if identity else lut[indices]
+        elif bits_per_pixel == 1:
+            yield y, lut[np.unpackbits(strip, axis=1, count=width)]
+        else:
+            channels = bits_per_pixel // 8
+            pixels = strip[:, :width * channels].reshape(len(strip), width, channels)
+            yield y, rgb_to_luma(pixels[..., 2::-1])  # stored as B, G, R(, A)
+
+
+def iter_gray_strips(source, strip_rows=256):
+    """
+    Yield (first_row, strip) pairs covering the source top to bottom, where each
+    strip is a (rows, width) uint8 luma array computed as PIL's convert('L') would.
+    """
+    extension = os.path.splitext(source)[1].lower()
+    if extension == '.npy':
+        offset, shape, dtype = _npy_layout(source)
+        row_size = int(np.prod(shape[1:])) * dtype.itemsize
+        for y in range(0, shape[0], strip_rows):
+            strip = read_rows(source, offset, row_size, shape[0], y, strip_rows)
+            strip = strip.view(dtype).reshape((len(strip),) + tuple(shape[1:]))
+            yield y, rgb_to_luma(strip) if strip.ndim == 3 else strip.astype(np.uint8, copy=False)
+        return
+    if extension == '.bits':
+        height, width = image_size(source)
+        for y in range(0, height, strip_rows):
+            packed = read_rows(source, BITS_HEADER.size, (width + 7) // 8, height, y, strip_rows)
+            yield y, np.unpackbits(packed, axis=1, count=width) * np.uint8(255)
+        return
+
+    header = read_bmp_header(source) if extension == '.bmp' else None
+    if header is not None:
+        yield from _bmp_gray_strips(source, header, strip_rows)
+        return
+
+    # Compressed formats cannot be read in strips, so PIL decodes the source once
+    from PIL import Image
+    with Image.open(source) as image:
+        for y in range(0, image.height, strip_rows):
+            strip = image.crop((0, y, image.width, min(y + strip_rows, image.height)))
+            if strip.mode in ('RGB', 'RGBA'):
+                yield y, rgb_to_luma(np.asarray(strip))
+            else:
+                yield y, np.asarray(strip if strip.mode == 'L' else strip.convert('L'))
+
+
+class StripWriter:
+    """
+    Writes an image strip by strip. The format follows the file extension:
+    .npy (uint8), .bits (packed 0/1), .txt (text dump) or .bmp (8-bit grayscale,
+    or 1-bit when binary is True). Strips must hold grayscale values, or 0/1
+    values when binary is True. Strips may arrive in any order except for .txt.
+    """
+
+    def __init__(self, path, height, width, binary=False):
+        self.path = path
+        self.height = height
+        self.width = width
+        self.binary = binary
+        self.extension = os.path.splitext(path)[1].lower()
+        self.bottom_up = False
+        packed = binary and self.extension in ('.bits', '.bmp')
+        self.stride = (width + 7) // 8 if packed else width
+
+        if self.extension == '.txt':
+            self._file = open(path, 'w')
+            return
+        self._file = open(path, 'w+b')
+        if self.extension == '.npy':
+            np.lib.format.write_array_header_1_0(
+                self._file, {'descr': '|u1', 'fortran_order': False, 'shape': (height, width)})
+        elif self.extension == '.bits':
+            self._file.write(BITS_HEADER.pack(BITS_MAGIC, height, width))
+        elif self.extension == '.bmp':
+            self._write_bmp_header()
+        else:
+            self._file.close()
+            raise ValueError(f"Unsupported output format '{self.extension}'")
+        self.offset = self._file.tell()
+        self._file.truncate(self.offset + self.stride * height)
+
+    def _write_bmp_header(self):
+        bits_per_pixel = 1 if self.binary else 8
+        n_colors = 2 if self.binary else 256
+        self.stride = ((self.width * bits_per_pixel + 31) // 32) * 4  # rows are padded to 4 bytes
+        self.bottom_up = True
+        pixel_offset = BMP_FILE_HEADER.size + BMP_INFO_HEADER.size + 4 * n_colors
+        image_bytes = self.stride * self.height
+        levels = np.array([0, 255] if self.binary else range(256), dtype=np.uint8)
+        palette = np.zeros((n_colors, 4), dtype=np.uint8)
+        palette[:, :3] = levels[:, None]
+
+        self._file.write(BMP_FILE_HEADER.pack(b'BM', pixel_offset + image_bytes, 0, 0, pixel_offset))
+        self._file.write(BMP_INFO_HEADER.pack(BMP_INFO_HEADER.size, self.width, self.height, 1, bits_per_pixel,
+                                              0, image_bytes, 2835, 2835, n_colors, n_colors))
+        self._file.write(palette.tobytes())
+
+    def write_rows(self, y, strip):
+        """Write a strip whose first row is image row y."""
+        if self.extension == '.txt':
+            np.savetxt(self._file, strip, fmt='%d', delimiter=' ')
+            return
+        if self.binary and self.extension in ('.bits', '.bmp'):
+            strip = np.packbits(strip, axis=1)
+        rows = np.zeros((len(strip), self.stride), dtype=np.uint8)
+        rows[:, :strip.shape[1]] = strip
+        first_row = self.height - y - len(strip) if self.bottom_up else y
+        self._file.seek(self.offset + first_row * self.stride)
+        self._file.write((rows[::-1] if self.bottom_up else rows).tobytes())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
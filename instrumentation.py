@@ -0,0 +1,281 @@
+"""
+Lightweight stage-level instrumentation for the codecs.
+
+An Instrumentation object times named stages (read, transform, encode,
+serialize, write, ...), counts bytes in and out and records the true peak RSS
+of the run, then hands a report dict to a sink: a JSON lines file, a CSV file
+or any callable.
+
+    with Instrumentation('rle_grayscale.compress', sink=default_sink()) as inst:
+        with inst.stage('read'):
+            ...
+        inst.count_in(n_bytes)
+
+Peak memory comes from the kernel's RSS high-water mark on Linux, which is
+reset at the start of the run, so it is exact and costs nothing while the codec
+runs. Elsewhere a background thread samples RSS with psutil, which is only
+imported there so that loading a codec stays cheap. Setting the
+FYP_METRICS environment variable to a .jsonl or .csv path makes default_sink()
+append every report there, so the instrumentation can stay on in production.
+"""
+import csv
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+STAGES = ('read', 'transform', 'encode', 'serialize', 'parse', 'decode', 'write')
+
+_PROC_STATUS = '/proc/self/status'
+_PROC_CLEAR_REFS = '/proc/self/clear_refs'
+_active_peak_trackers = 0
+_high_water_mark_usable = False
+_tracker_lock = threading.Lock()
+
+
+def _read_proc_status(field):
+    """Return a memory field of /proc/self/status (such as 'VmHWM') in bytes, or None when /proc is not available."""
+    try:
+        with open(_PROC_STATUS) as file:
+            for line in file:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _read_high_water_mark():
+    """Return VmHWM in bytes, or None when /proc is not available."""
+    return _read_proc_status('VmHWM')
+
+
+def current_rss():
+    """The current RSS of this process in bytes, from /proc when available, otherwise from psutil."""
+    rss = _read_proc_status('VmRSS')
+    if rss is None:
+        import psutil
+        rss = psutil.Process(os.getpid()).memory_info().rss
+    return rss
+
+
+def _reset_high_water_mark():
+    """Reset VmHWM to the current RSS (Linux >= 4.0). Returns False if not permitted."""
+    try:
+        with open(_PROC_CLEAR_REFS, 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class PeakMemorySampler:
+    """Samples the process RSS on a background thread and keeps the maximum."""
+
+    def __init__(self, interval=0.002):
+        import psutil
+        self.interval = interval
+        self.process = psutil.Process(os.getpid())
+        self.baseline = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.baseline = self.peak = self.process.memory_info().rss
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+    @property
+    def peak_increase(self):
+        """Peak RSS above the RSS measured when sampling started, in bytes."""
+        return self.peak - self.baseline
+
+
+class PeakMemory:
+    """
+    Tracks the peak RSS of a block of code, using the kernel high-water mark when
+    possible and falling back to PeakMemorySampler. When trackers are nested only
+    the outermost one resets the high-water mark, so inner peaks are upper bounds.
+    """
+
+    def __init__(self, sample_interval=0.005):
+        self.sample_interval = sample_interval
+        self.baseline = 0
+        self.peak = 0
+        self._sampler = None
+
+    def __enter__(self):
+        global _active_peak_trackers, _high_water_mark_usable
+        self.baseline = current_rss()
+        with _tracker_lock:
+            if _active_peak_trackers == 0:
+                _high_water_mark_usable = _reset_high_water_mark() and _read_high_water_mark() is not None
+            _active_peak_trackers += 1
+            use_high_water_mark = _high_water_mark_usable
+        if not use_high_water_mark:
+            self._sampler = PeakMemorySampler(self.sample_interval).__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        global _active_peak_trackers
+        with _tracker_lock:
+            _active_peak_trackers -= 1
+        if self._sampler is not None:
+            self._sampler.__exit__(*exc)
+            self.peak = self._sampler.peak
+        else:
+            self.peak = _read_high_water_mark()
+
+    @property
+    def peak_increase(self):
+        """Peak RSS above the RSS at the start of the block, in bytes."""
+        return max(self.peak - self.baseline, 0)
+
+
+class Instrumentation:
+    """Collects per-stage timings, byte counts and peak RSS for one codec run."""
+
+    def __init__(self, name, sink=None, track_memory=True):
+        self.name = name
+        self.sink = sink
+        self.track_memory = track_memory
+        self.stages = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.extra = {}
+        self.report = None
+        self._memory = None
+        self._start_time = None
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage; repeated stages with the same name accumulate."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start_time
+
+    def count_in(self, n_bytes):
+        self.bytes_in += n_bytes
+
+    def count_out(self, n_bytes):
+        self.bytes_out += n_bytes
+
+    def annotate(self, **values):
+        """Attach extra values (codec parameters, image shape, ...) to the report."""
+        self.extra.update(values)
+
+    def __enter__(self):
+        if self.track_memory:
+            self._memory = PeakMemory().__enter__()
+        self._start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        total_seconds = time.perf_counter() - self._start_time
+        if self._memory is not None:
+            self._memory.__exit__(exc_type, exc, tb)
+        self.report = {
+            'name': self.name,
+            'timestamp': time.time(),
+            'total_seconds': total_seconds,
+            'stages': dict(self.stages),
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'peak_rss_mb': self._memory.peak / (1024 ** 2) if self._memory else None,
+            'peak_increase_mb': self._memory.peak_increase / (1024 ** 2) if self._memory else None,
+            'ok': exc_type is None,
+            **self.extra,
+        }
+        if self.sink is not None:
+            self.sink(self.report)
+        return False
+
+
+class _NoInstrumentation:
+    """Stand-in used when a caller does not pass an Instrumentation; every call is a no-op."""
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def count_in(self, n_bytes):
+        pass
+
+    def count_out(self, n_bytes):
+        pass
+
+    def annotate(self, **values):
+        pass
+
+
+NO_INSTRUMENTATION = _NoInstrumentation()
+
+
+class JsonLinesSink:
+    """Appends each report as one JSON object per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, report):
+        with self._lock, open(self.path, 'a') as file:
+            file.write(json.dumps(report) + '\n')
+
+
+class CsvSink:
+    """Appends each report as a CSV row, with one column per standard stage."""
+
+    FIELDS = ['name', 'timestamp', 'total_seconds'] + [f'{stage}_seconds' for stage in STAGES] + \
+             ['bytes_in', 'bytes_out', 'peak_rss_mb', 'peak_increase_mb', 'ok']
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, report):
+        row = {key: report.get(key) for key in self.FIELDS}
+        for stage in STAGES:
+            row[f'{stage}_seconds'] = report['stages'].get(stage)
+        with self._lock:
+            new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, 'a', newline='') as file:
+                writer = csv.DictWriter(file, fieldnames=self.FIELDS)
+                if new_file:
+                    writer.writeheader()
+                writer.writerow(row)
+
+
+_default_sinks = {}
+
+
+def default_sink():
+    """Return the sink configured by the FYP_METRICS environment variable, or None."""
+    path = os.environ.get('FYP_METRICS')
+    if not path:
+        return None
+    if path not in _default_sinks:
+        _default_sinks[path] = CsvSink(path) if path.lower().endswith('.csv') else JsonLinesSink(path)
+    return _default_sinks[path]
+
+
+def print_stages(report):
+    """Print the per-stage timings of a report on one line."""
+    stages = ', '.join(f"{name} {seconds:.3f}s" for name, seconds in report['stages'].items())
+    print(f"Stages: {stages}")
@@ -0,0 +1,160 @@
+"""
+Load-test client for service.py.
+
+Opens a number of concurrent keep-alive connections to a running service and
+sends compress/decompress round trips for a synthetic image. Every round trip
+is checked to reproduce the input. The client reports throughput, latency
+percentiles and the status codes it saw, so the service can be load-tested
+on one machine.
+
+Example:
+    python service.py --workers 4 &
+    python load_test.py --codec rle_grayscale --size 256 --requests 200 --concurrency 16
+    python load_test.py --unix /tmp/fyp.sock --codec lzw_binary --requests 100
+"""
+import argparse
+import asyncio
+import io
+import json
+import statistics
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from benchmark import make_synthetic_image
+from service import DEFAULT_PORT
+
+
+class HttpConnection:
+    """A minimal HTTP/1.1 keep-alive client connection over TCP or a Unix socket."""
+
+    def __init__(self, host=None, port=None, unix_path=None):
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        if self.unix_path:
+            self.reader, self.writer = await asyncio.open_unix_connection(self.unix_path)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, body=b''):
+        """Send a request and return (status, body); reconnects if the server closed the connection."""
+        if self.writer is None:
+            await self.connect()
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host or 'localhost'}\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line, *header_lines = (await self.reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        headers = {}
+        for line in header_lines:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        data = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return int(status_line.split()[1]), data
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def encode_npy(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+async def worker(connection, jobs, codec, payload, expected, results):
+    """Take round trips off the job queue until it is empty, recording latency and status."""
+    while True:
+        try:
+            jobs.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        start_time = time.perf_counter()
+        status, compressed = await connection.request('POST', f'/compress/{codec}', payload)
+        if status == 200:
+            status, decoded = await connection.request('POST', f'/decompress/{codec}?format=npy', compressed)
+            if status == 200 and not np.array_equal(np.load(io.BytesIO(decoded)), expected):
+                status = 'mismatch'
+        results.append((status, time.perf_counter() - start_time))
+    await connection.close()
+
+
+async def run_load_test(codec, img_array, requests=100, concurrency=8, host='127.0.0.1', port=DEFAULT_PORT,
+                        unix_path=None):
+    """
+    Send requests round trips over concurrency connections and return the summary dict.
+    Binary codecs get the image thresholded at 128, as in the benchmark.
+    """
+    probe = HttpConnection(host, port, unix_path)
+    status, body = await probe.request('GET', '/codecs')
+    await probe.close()
+    kinds = json.loads(body)
+    if codec not in kinds:
+        raise ValueError(f"The service does not offer codec '{codec}'")
+
+    if kinds[codec] == 'binary':
+        img_array = (img_array > 128).astype(np.uint8)
+    payload = encode_npy(img_array)
+
+    jobs = asyncio.Queue()
+    for i in range(requests):
+        jobs.put_nowait(i)
+    results = []
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker(HttpConnection(host, port, unix_path), jobs, codec, payload, img_array, results)
+                           for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+
+    latencies = sorted(latency for status, latency in results if status == 200)
+    summary = {
+        'codec': codec,
+        'requests': requests,
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'round_trips_per_second': len(latencies) / elapsed,
+        'statuses': dict(Counter(str(status) for status, _ in results)),
+    }
+    if latencies:
+        summary.update({
+            'latency_mean_ms': 1000 * statistics.mean(latencies),
+            'latency_p50_ms': 1000 * latencies[len(latencies) // 2],
+            'latency_p95_ms': 1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            'latency_max_ms': 1000 * latencies[-1],
+        })
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test a running compression service.")
+    parser.add_argument('--url', default=f'http://127.0.0.1:{DEFAULT_PORT}')
+    parser.add_argument('--unix', help="Connect to this Unix socket instead of --url")
+    parser.add_argument('--codec', default='rle_grayscale')
+    parser.add_argument('--image', default='text', choices=('noise', 'gradient', 'text'))
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    img_array = make_synthetic_image(args.image, args.size)
+    summary = asyncio.run(run_load_test(args.codec, img_array, args.requests, args.concurrency,
+                                        url.hostname, url.port or DEFAULT_PORT, args.unix))
+    for key, value in summary.items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
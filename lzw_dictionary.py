@@ -0,0 +1,348 @@
+"""
+Array-backed LZW dictionary shared by the binary and grayscale LZW codecs.
+
+The original scripts kept the dictionary as Python strings, one string object
+per entry plus one character object per pixel. Here the symbols stay a byte
+buffer and the dictionary is a trie held in flat arrays:
+
+    encoder  a dense 256 x 256 table for the children of the single-symbol
+             codes, where almost every lookup lands, and first-child /
+             next-sibling arrays of 4-byte integers for longer phrases
+    decoder  each code is stored as the (start, length) of its first
+             occurrence in the output buffer, so phrases are copied out of
+             the pixels already decoded instead of being kept as strings
+
+Both sides use about 12 bytes per dictionary entry, whatever the phrase
+length. The codes are the same as the string-dictionary implementation's, so
+the .txt format is unchanged.
+
+By default the dictionary grows by one entry per emitted code. With max_size
+it holds at most max_size codes (the 256 single symbols included), which also
+bounds the code values, and one of three policies says what happens when it
+is full:
+
+    reset   GIF-style: the encoder emits the clear code (max_size itself) and
+            both sides start again from the 256 single symbols, so the
+            dictionary follows statistics that change partway through
+    freeze  no more entries are added; the full dictionary is kept to the end
+    lru     the least recently used leaf entry (a phrase no other entry
+            extends) is replaced. An entry counts as used when it is created
+            or emitted, which the decoder sees as well; an entry that becomes
+            a leaf again when its last child is replaced counts as the
+            least recently used
+
+The decoder must be given the same max_size and policy; the codecs record
+them in the .txt header. The codecs use DEFAULT_MAX_SIZE entries with reset
+unless told otherwise: an unbounded dictionary costs about 12 bytes for every
+code emitted, several times the pixels on noisy images, and on the benchmark
+images 65536 entries give output within a few percent of it. iter_codes
+yields the codes in batches and lzw_decode takes any iterable of codes, so
+the codecs never hold every code of an image either. iter_codes also takes
+the symbols as an iterator of blocks, so the codecs hand it their pixels a
+block at a time.
+"""
+from array import array
+from collections import OrderedDict
+from collections.abc import Iterator
+from itertools import chain
+
+FIRST_CODE = 256
+POLICIES = ('reset', 'freeze', 'lru')
+DEFAULT_MAX_SIZE = 1 << 16  # the codecs' dictionary size; codes then have at most five digits
+CODE_BATCH = 1 << 14        # codes iter_codes yields at a time
+
+
+def check_dictionary_limits(max_size, policy):
+    """Raise ValueError unless max_size and policy describe a valid dictionary."""
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown dictionary policy '{policy}'. Available policies: {', '.join(POLICIES)}")
+    if max_size is not None and not FIRST_CODE < max_size < 2 ** 32 - 1:
+        raise ValueError(f"Dictionary size must be between {FIRST_CODE + 1} and {2 ** 32 - 2}, got {max_size}")
+
+
+def format_dictionary_option(max_size, policy):
+    """The header option recording a bounded dictionary, such as 'lru:4096'. None when unbounded."""
+    return None if max_size is None else f"{policy}:{max_size}"
+
+
+def parse_dictionary_option(options):
+    """(max_size, policy) from the header options of an LZW file; (None, 'reset') when unbounded."""
+    for option in options:
+        policy, _, max_size = option.partition(':')
+        if policy in POLICIES:
+            check_dictionary_limits(int(max_size), policy)
+            return int(max_size), policy
+    return None, 'reset'
+
+
+def lzw_encode(symbols, max_size=None, policy='reset'):
+    """
+    LZW-encode a buffer of byte symbols and return the codes as array('I').
+    max_size and policy bound the dictionary as described in the module docstring.
+    """
+    codes = array('I')
+    for batch in iter_codes(symbols, max_size, policy):
+        codes.extend(batch)
+    return codes
+
+
+def iter_symbols(symbols):
+    """The byte values of a buffer, or of every buffer an iterator yields in turn."""
+    if isinstance(symbols, Iterator):
+        return chain.from_iterable(memoryview(block).cast('B') for block in symbols)
+    return iter(memoryview(symbols).cast('B'))
+
+
+def iter_codes(symbols, max_size=None, policy='reset'):
+    """
+    LZW-encode a buffer of byte symbols, or an iterator of such buffers, yielding the
+    codes as array('I') batches of about CODE_BATCH codes, so a caller can write them
+    out as they come.
+    """
+    check_dictionary_limits(max_size, policy)
+    if max_size is not None:
+        yield from _iter_codes_bounded(symbols, max_size, policy)
+        return
+    root_children = array('I', bytes(4 * FIRST_CODE * 256))
+    first_child = array('I', bytes(4 * FIRST_CODE))
+    next_sibling = array('I', bytes(4 * FIRST_CODE))
+    last_symbol = array('B', bytes(FIRST_CODE))
+    next_code = FIRST_CODE
+    codes = array('I')
+
+    iterator = iter_symbols(symbols)
+    prefix = next(iterator, None)
+    if prefix is None:
+        return
+    for symbol in iterator:
+        # Find the child of prefix that extends it by symbol; 0 means there is none
+        if prefix < FIRST_CODE:
+            child = root_children[(prefix << 8) | symbol]
+        else:
+            child = first_child[prefix]
+            while child and last_symbol[child] != symbol:
+                child = next_sibling[child]
+        if child:
+            prefix = child
+            continue
+
+        codes.append(prefix)
+        if len(codes) >= CODE_BATCH:
+            yield codes
+            codes = array('I')
+        if prefix < FIRST_CODE:
+            root_children[(prefix << 8) | symbol] = next_code
+            next_sibling.append(0)
+        else:
+            next_sibling.append(first_child[prefix])
+            first_child[prefix] = next_code
+        first_child.append(0)
+        last_symbol.append(symbol)
+        next_code += 1
+        prefix = symbol
+    codes.append(prefix)
+    yield codes
+
+
+def _iter_codes_bounded(symbols, max_size, policy):
+    root_children = array('I', bytes(4 * FIRST_CODE * 256))
+    first_child = array('I', bytes(4 * max_size))
+    next_sibling = array('I', bytes(4 * max_size))
+    last_symbol = array('B', bytes(max_size))
+    parent = array('I', bytes(4 * max_size))
+    leaves = OrderedDict()  # leaf entries, least recently used first (lru only)
+    lru = policy == 'lru'
+    next_code = FIRST_CODE
+    codes = array('I')
+
+    iterator = iter_symbols(symbols)
+    prefix = next(iterator, None)
+    if prefix is None:
+        return
+    for symbol in iterator:
+        if prefix < FIRST_CODE:
+            child = root_children[(prefix << 8) | symbol]
+        else:
+            child = first_child[prefix]
+            while child and last_symbol[child] != symbol:
+                child = next_sibling[child]
+        if child:
+            prefix = child
+            continue
+
+        codes.append(prefix)
+        if len(codes) >= CODE_BATCH:
+            yield codes
+            codes = array('I')
+        if lru and prefix in leaves:
+            leaves.move_to_end(prefix)
+        code = 0  # the code the new entry gets; 0 when none is added
+        if next_code < max_size:
+            code = next_code
+            next_code += 1
+        elif policy == 'reset':
+            codes.append(max_size)
+            root_children = array('I', bytes(4 * FIRST_CODE * 256))
+            next_code = FIRST_CODE
+        elif lru:
+            was_leaf = leaves.pop(prefix, False) is None  # prefix is about to get a child
+            if leaves:
+                code, _ = leaves.popitem(last=False)
+                # Unlink the replaced entry from its parent's children
+                owner = parent[code]
+                if owner < FIRST_CODE:
+                    root_children[(owner << 8) | last_symbol[code]] = 0
+                elif first_child[owner] == code:
+                    first_child[owner] = next_sibling[code]
+                else:
+                    sibling = first_child[owner]
+                    while next_sibling[sibling] != code:
+                        sibling = next_sibling[sibling]
+                    next_sibling[sibling] = next_sibling[code]
+                if owner >= FIRST_CODE and not first_child[owner]:
+                    leaves[owner] = None
+                    leaves.move_to_end(owner, last=False)
+            elif was_leaf:
+                leaves[prefix] = None
+
+        if code:
+            if prefix < FIRST_CODE:
+                root_children[(prefix << 8) | symbol] = code
+                next_sibling[code] = 0
+            else:
+                next_sibling[code] = first_child[prefix]
+                first_child[prefix] = code
+            first_child[code] = 0
+            last_symbol[code] = symbol
+            parent[code] = prefix
+            if lru:
+                leaves.pop(prefix, None)
+                leaves[code] = None
+        prefix = symbol
+    codes.append(prefix)
+    yield codes
+
+
+def lzw_decode(codes, size, max_size=None, policy='reset'):
+    """
+    Decode LZW codes into a bytearray of exactly size symbols.
+    max_size and policy must be the ones the codes were encoded with.
+    Raises ValueError for codes that are not in the dictionary or that decode to the wrong length.
+    """
+    check_dictionary_limits(max_size, policy)
+    if max_size is not None:
+        return _lzw_decode_bounded(codes, size, max_size, policy)
+    output = bytearray(size)
+    starts = array('Q')
+    lengths = array('I')
+    position = 0
+    previous_start = previous_length = 0
+
+    for code in codes:
+        if code < FIRST_CODE:
+            length = 1
+            if position >= size:
+                raise ValueError(f"LZW data decodes to more than {size} symbols")
+            output[position] = code
+        else:
+            index = code - FIRST_CODE
+            if index < len(starts):
+                start, length = starts[index], lengths[index]
+                if position + length > size:
+                    raise ValueError(f"LZW data decodes to more than {size} symbols")
+                output[position:position + length] = output[start:start + length]
+            elif index == len(starts) and previous_length:
+                # The code being defined right now: previous phrase + its first symbol
+                length = previous_length + 1
+                if position + length > size:
+                    raise ValueError(f"LZW data decodes to more than {size} symbols")
+                output[position:position + previous_length] = output[previous_start:position]
+                output[position + previous_length] = output[previous_start]
+            else:
+                raise ValueError(f"Invalid LZW code {code}")
+        if previous_length:
+            # previous phrase + first symbol of this one, which follows it in the output
+            starts.append(previous_start)
+            lengths.append(previous_length + 1)
+        previous_start, previous_length = position, length
+        position += length
+
+    if position != size:
+        raise ValueError(f"LZW data decodes to {position} symbols, expected {size}")
+    return output
+
+
+def _lzw_decode_bounded(codes, size, max_size, policy):
+    output = bytearray(size)
+    starts = array('Q', bytes(8 * max_size))
+    lengths = array('I', bytes(4 * max_size))
+    parent = array('I', bytes(4 * max_size))
+    children = array('I', bytes(4 * max_size))  # number of entries extending each code
+    leaves = OrderedDict()  # as in the encoder (lru only)
+    lru = policy == 'lru'
+    next_code = FIRST_CODE
+    position = 0
+    previous_code = previous_start = previous_length = 0
+
+    for code in codes:
+        if code == max_size and policy == 'reset':
+            next_code = FIRST_CODE
+            previous_length = 0
+            continue
+
+        # The code the encoder gave the entry "previous phrase + first symbol of this one"
+        slot = 0
+        if previous_length:
+            if next_code < max_size:
+                slot = next_code
+            elif lru:
+                was_leaf = leaves.pop(previous_code, False) is None
+                if leaves:
+                    slot, _ = leaves.popitem(last=False)
+                elif was_leaf:
+                    leaves[previous_code] = None
+
+        if code < FIRST_CODE:
+            length = 1
+            if position >= size:
+                raise ValueError(f"LZW data decodes to more than {size} symbols")
+            output[position] = code
+        elif code == slot:
+            # The entry being defined right now: previous phrase + its first symbol
+            length = previous_length + 1
+            if position + length > size:
+                raise ValueError(f"LZW data decodes to more than {size} symbols")
+            output[position:position + previous_length] = output[previous_start:position]
+            output[position + previous_length] = output[previous_start]
+        elif code < next_code:
+            start, length = starts[code], lengths[code]
+            if position + length > size:
+                raise ValueError(f"LZW data decodes to more than {size} symbols")
+            output[position:position + length] = output[start:start + length]
+        else:
+            raise ValueError(f"Invalid LZW code {code}")
+
+        if slot:
+            if slot == next_code:
+                next_code += 1
+            else:
+                owner = parent[slot]
+                children[owner] -= 1
+                if owner >= FIRST_CODE and not children[owner]:
+                    leaves[owner] = None
+                    leaves.move_to_end(owner, last=False)
+            starts[slot], lengths[slot] = previous_start, previous_length + 1
+            parent[slot] = previous_code
+            children[previous_code] += 1
+            children[slot] = 0
+            if lru:
+                leaves.pop(previous_code, None)
+                leaves[slot] = None
+        if lru and code in leaves:
+            leaves.move_to_end(code)
+        previous_code, previous_start, previous_length = code, position, length
+        position += length
+
+    if position != size:
+        raise ValueError(f"LZW data decodes to {position} symbols, expected {size}")
+    return output
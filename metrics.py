@@ -0,0 +1,155 @@
+"""
+Quality metrics (MSE, PSNR, SSIM, maximum error) computed on in-memory image arrays.
+
+The decoders used to save the reconstruction, reopen it and the original from
+disk and run skimage on the full image. evaluate() works on the arrays the
+decoder already has and skips SSIM entirely when the reconstruction is
+bit-exact. SSIM uses the same 7x7 uniform window and constants as skimage's
+default, computed with summed-area tables; it can run tile by tile to bound
+memory, or on a random sample of tiles for a fast estimate on large images.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PSNR_CAP = 100  # PSNR reported for identical images, and upper bound otherwise
+
+
+def mse(original, reconstructed):
+    """Mean squared error between two images of the same shape."""
+    _check_shapes(original, reconstructed)
+    diff = np.subtract(original, reconstructed, dtype=np.float64)
+    return float(np.mean(diff * diff))
+
+
+def psnr(original, reconstructed, max_pixel=255.0, mse_value=None):
+    """Peak signal-to-noise ratio in dB, capped at PSNR_CAP."""
+    if mse_value is None:
+        mse_value = mse(original, reconstructed)
+    if mse_value == 0:
+        return PSNR_CAP
+    return min(float(20 * np.log10(max_pixel / np.sqrt(mse_value))), PSNR_CAP)
+
+
+def max_error(original, reconstructed):
+    """Largest absolute difference between corresponding pixels."""
+    _check_shapes(original, reconstructed)
+    return int(np.max(np.abs(np.subtract(original, reconstructed, dtype=np.int32)), initial=0))
+
+
+def _window_sums(x, win_size):
+    """Sum of x over every valid win_size x win_size window, via a summed-area table."""
+    table = np.zeros((x.shape[0] + 1, x.shape[1] + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(x, axis=0), axis=1, out=table[1:, 1:])
+    return (table[win_size:, win_size:] - table[:-win_size, win_size:]
+            - table[win_size:, :-win_size] + table[:-win_size, :-win_size])
+
+
+def _ssim_block(a, b, data_range, win_size):
+    """Return (sum of the SSIM map, number of windows) for one block of the images."""
+    a = a.astype(np.float64)
+    b = b.astype(np.float64)
+    n = win_size * win_size
+    cov_norm = n / (n - 1)  # sample covariance, as skimage does by default
+
+    mu_a = _window_sums(a, win_size) / n
+    mu_b = _window_sums(b, win_size) / n
+    var_a = cov_norm * (_window_sums(a * a, win_size) / n - mu_a * mu_a)
+    var_b = cov_norm * (_window_sums(b * b, win_size) / n - mu_b * mu_b)
+    cov_ab = cov_norm * (_window_sums(a * b, win_size) / n - mu_a * mu_b)
+
+    c1 = (0.01 * data_range) ** 2
+    c2 = (0.03 * data_range) ** 2
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov_ab + c2)) / \
+               ((mu_a * mu_a + mu_b * mu_b + c1) * (var_a + var_b + c2))
+    return float(ssim_map.sum()), ssim_map.size
+
+
+def ssim(original, reconstructed, data_range=255, win_size=7, tile_size=None, sample=None, seed=0):
+    """
+    Mean structural similarity over all win_size x win_size windows.
+
+    tile_size: compute the SSIM map in tiles of this many windows per side, which
+        gives the same result as the full computation with bounded memory.
+    sample: fraction (0, 1] of tiles to evaluate, chosen at random with seed, for
+        a fast estimate. Implies tiling (default tile_size 256).
+    """
+    _check_shapes(original, reconstructed)
+    height, width = original.shape[:2]
+    if min(height, width) < win_size:
+        raise ValueError(f"Images must be at least {win_size}x{win_size} for SSIM")
+
+    if tile_size is None and sample is None:
+        total, count = _ssim_block(original, reconstructed, data_range, win_size)
+        return total / count
+
+    tile_size = tile_size or 256
+    valid_h, valid_w = height - win_size + 1, width - win_size + 1
+    origins = [(y, x) for y in range(0, valid_h, tile_size) for x in range(0, valid_w, tile_size)]
+    if sample is not None and sample < 1:
+        rng = np.random.default_rng(seed)
+        keep = max(1, int(round(len(origins) * sample)))
+        origins = [origins[i] for i in sorted(rng.choice(len(origins), keep, replace=False))]
+
+    total, count = 0.0, 0
+    for y, x in origins:
+        y_end = min(y + tile_size, valid_h) + win_size - 1
+        x_end = min(x + tile_size, valid_w) + win_size - 1
+        block_total, block_count = _ssim_block(original[y:y_end, x:x_end], reconstructed[y:y_end, x:x_end],
+                                               data_range, win_size)
+        total += block_total
+        count += block_count
+    return total / count
+
+
+def evaluate(original, reconstructed, compute_ssim=True, data_range=255, tile_size=None, sample=None):
+    """
+    Compute MSE, PSNR, SSIM and the maximum per-pixel error for a reconstruction held in memory.
+    Bit-exact reconstructions take a fast path that skips the metric computation
+    and reports the image as lossless.
+    """
+    _check_shapes(original, reconstructed)
+    if np.array_equal(original, reconstructed):
+        return {'mse': 0.0, 'psnr': PSNR_CAP, 'ssim': 1.0, 'max_error': 0, 'lossless': True}
+
+    mse_value = mse(original, reconstructed)
+    result = {
+        'mse': mse_value,
+        'psnr': psnr(original, reconstructed, max_pixel=data_range, mse_value=mse_value),
+        'ssim': None,
+        'max_error': max_error(original, reconstructed),
+        'lossless': False,
+    }
+    if compute_ssim:
+        result['ssim'] = ssim(original, reconstructed, data_range=data_range, tile_size=tile_size, sample=sample)
+    return result
+
+
+def evaluate_batch(pairs, workers=None, **kwargs):
+    """
+    Evaluate many (original, reconstructed) pairs, optionally on a thread pool.
+    NumPy releases the GIL in the heavy loops, so threads scale across cores.
+    Keyword arguments are passed to evaluate().
+    """
+    if workers is None or workers <= 1:
+        return [evaluate(original, reconstructed, **kwargs) for original, reconstructed in pairs]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(evaluate, original, reconstructed, **kwargs) for original, reconstructed in pairs]
+        return [future.result() for future in futures]
+
+
+def print_metrics(result):
+    """Print metrics in the format used by the decompression scripts."""
+    print(f"PSNR: {result['psnr']:.2f}")
+    print(f"SME: {result['mse']:.2f}")
+    if not result['lossless']:
+        print(f"Max Error: {result['max_error']}")
+    if result['ssim'] is not None:
+        print(f"SSIM: {result['ssim']:.2f}")
+    if result['lossless']:
+        print("Reconstruction is lossless")
+
+
+def _check_shapes(original, reconstructed):
+    if original.shape != reconstructed.shape:
+        raise ValueError(f"Image shapes differ: {original.shape} vs {reconstructed.shape}")
@@ -0,0 +1,40 @@
+"""
+Process-pool helpers shared by the formats that code independent pieces of an
+image concurrently: container tiles, sequence frames, pyramid layers, color
+planes and bit planes.
+
+Every entry point takes workers, which is either an existing Executor (so a
+caller can reuse one pool for many images), a number of processes, or None to
+code the pieces serially in this process. Codecs are passed to the pool by
+name, since codec modules are loaded from files and their functions do not
+pickle.
+"""
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
+
+from codec_registry import get_codec
+
+
+@contextmanager
+def tile_executor(workers):
+    """
+    Yield the executor to run tiles on: workers itself if it is an Executor, a new
+    process pool for an int above 1, or None to run tiles serially in this process.
+    """
+    if isinstance(workers, Executor):
+        yield workers
+    elif workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield executor
+    else:
+        yield None
+
+
+def compress_tile(codec_name, tile, kwargs):
+    """codec.compress by codec name, as a picklable function for executor.map."""
+    return get_codec(codec_name).compress(tile, **kwargs)
+
+
+def decompress_tile(codec_name, data, kwargs):
+    """codec.decompress by codec name, as a picklable function for executor.map."""
+    return get_codec(codec_name).decompress(data, **kwargs)
@@ -0,0 +1,238 @@
+"""
+Array-backed encoding and decoding with Huffman (prefix) code tables.
+
+The Huffman scripts store the coded bits as the characters '0' and '1'. The
+original encoder joined one code string per pixel, and the decoder walked the
+tree one bit at a time, appending one Python object per pixel. These helpers
+keep the pixels and the bit characters in uint8 arrays and work a block at a
+time, so memory stays proportional to the image and the output:
+
+    encode   every code is laid out once as a row of '0'/'1' bytes; a block
+             of pixels selects its rows and a mask keeps the first
+             code-length bytes of each
+    decode   for each bit position of a block, the next few bits index a
+             lookup table giving the symbol starting there and its length,
+             hence where the next code would start; the positions actually
+             reached from the first code are found by pointer doubling, and
+             the rare codes longer than the table are resolved one at a time
+
+Both sides take the {symbol: code string} tables the scripts already build, so
+the output is the same as before. The encoders write the characters
+straight into the output buffer with write_symbols, so the encoded bits are
+never held twice. The encoding side also takes 2-D images and reads them in
+row-major blocks, so a strided image is never flattened into a copy.
+"""
+import io
+
+import numpy as np
+
+from scan_order import iter_scan_blocks
+
+ZERO = ord('0')
+BLOCK = 1 << 14
+MAX_TABLE_BITS = 16
+
+
+def _blocks(pixels, size):
+    """Consecutive blocks of about size pixels of a 1-D array, or of a 2-D image in row-major order."""
+    if pixels.ndim == 1:
+        return (pixels[start:start + size] for start in range(0, pixels.size, size))
+    return iter_scan_blocks(pixels, 'row', size)
+
+
+def byte_histogram(pixels):
+    """Counts of the values 0-255 in a uint8 array. np.bincount on the whole array would copy it to int64 first."""
+    histogram = np.zeros(256, dtype=np.int64)
+    for block in _blocks(pixels, BLOCK):
+        histogram += np.bincount(block, minlength=256)
+    return histogram
+
+
+def order_of_appearance(pixels, histogram=None):
+    """
+    The distinct values of a uint8 array in the order they first appear.
+    This is the key order Counter(pixels) gives, which the Huffman tree depends on.
+    """
+    if histogram is None:
+        histogram = byte_histogram(pixels)
+    remaining = int(np.count_nonzero(histogram))
+    first_seen = np.full(histogram.size, pixels.size, dtype=np.int64)
+    start = 0
+    for block in _blocks(pixels, BLOCK):
+        values, index = np.unique(block, return_index=True)
+        new = first_seen[values] == pixels.size
+        first_seen[values[new]] = start + index[new]
+        remaining -= int(np.count_nonzero(new))
+        if not remaining:
+            break
+        start += block.size
+    present = np.flatnonzero(histogram)
+    return [int(value) for value in present[np.argsort(first_seen[present], kind='stable')]]
+
+
+def tree_codes(root):
+    """The {symbol: code string} table of a Huffman tree of nodes with char, left and right."""
+    codes = {}
+    stack = [(root, '')]
+    while stack:
+        node, code = stack.pop()
+        if node.char is not None:
+            codes[node.char] = code or '0'  # a single-symbol tree still uses one bit per symbol
+        else:
+            stack.append((node.right, code + '1'))
+            stack.append((node.left, code + '0'))
+    return codes
+
+
+def _code_rows(codes):
+    """Lay the codes of symbols 0-255 out as rows of '0'/'1' bytes, with their lengths."""
+    max_length = max(len(code) for code in codes.values())
+    rows = np.full((256, max_length), ZERO, dtype=np.uint8)
+    lengths = np.zeros(256, dtype=np.int32)
+    for symbol, code in codes.items():
+        if isinstance(symbol, str) and not symbol.isdigit():
+            continue  # markers such as 'EOF' are appended by the caller
+        rows[int(symbol), :len(code)] = np.frombuffer(code.encode('ascii'), dtype=np.uint8)
+        lengths[int(symbol)] = len(code)
+    return rows, lengths
+
+
+def encoded_length(histogram, codes):
+    """Number of '0'/'1' characters that pixels with this byte histogram encode to, markers such as 'EOF' left out."""
+    _, lengths = _code_rows(codes)
+    return int(histogram @ lengths.astype(np.int64))
+
+
+def write_symbols(file, pixels, codes, tail=''):
+    """
+    Encode a flat uint8 array, or a 2-D image in row-major order, with a
+    {symbol: code string} table and write the '0'/'1' characters to a binary
+    file a block at a time, followed by the tail code. Returns the number of
+    characters written.
+    """
+    rows, lengths = _code_rows(codes)
+    histogram = byte_histogram(pixels)
+    if np.any(histogram[lengths == 0]):
+        raise ValueError(f"No code for pixel value {int(np.flatnonzero(histogram * (lengths == 0))[0])}")
+
+    columns = np.arange(rows.shape[1])
+    block = max(1, (BLOCK * 4) // rows.shape[1])
+    for symbols in _blocks(pixels, block):
+        file.write(rows[symbols][columns < lengths[symbols][:, None]])
+    file.write(tail.encode('ascii'))
+    return int(histogram @ lengths.astype(np.int64)) + len(tail)
+
+
+def encode_symbols(pixels, codes, tail=''):
+    """
+    Encode a flat uint8 array, or a 2-D image in row-major order, with a {symbol:
+    code string} table and return the '0'/'1' characters as a uint8 array,
+    followed by the tail code.
+    """
+    buffer = io.BytesIO()
+    write_symbols(buffer, pixels, codes, tail)
+    return np.frombuffer(buffer.getvalue(), dtype=np.uint8)
+
+
+def _lookup_table(codes, table_bits):
+    """For every table_bits-bit window, the symbol whose code starts it and that code's length (0: none fits)."""
+    symbols = np.zeros(1 << table_bits, dtype=np.int16)
+    lengths = np.zeros(1 << table_bits, dtype=np.int16)
+    long_codes = {}
+    for symbol, code in codes.items():
+        if len(code) > table_bits:
+            long_codes[code] = symbol
+            continue
+        first = int(code, 2) << (table_bits - len(code))
+        last = first + (1 << (table_bits - len(code)))
+        symbols[first:last] = symbol
+        lengths[first:last] = len(code)
+    return symbols, lengths, long_codes
+
+
+def _decode_long(bits, position, long_codes, max_length):
+    """Match one code longer than the lookup table at position. Returns (symbol, length)."""
+    code = ''
+    for length in range(1, min(max_length, bits.size - position) + 1):
+        code += '0' if bits[position + length - 1] == ZERO else '1'
+        if code in long_codes:
+            return long_codes[code], length
+    raise ValueError(f"Invalid Huffman code at bit {position}")
+
+
+def _windows(bits, width, count):
+    """The width-bit integer at each of the first count positions of a 0/1 array, most significant bit first."""
+    window = None  # the bits already combined, window_width of them
+    window_width = 0
+    power = bits.astype(np.int32)  # power[j]: the power_width bits starting at j
+    power_width = 1
+    while True:
+        if width & power_width:
+            if window is None:
+                window = power
+            else:
+                n = min(window.size, power.size - window_width)
+                window = (window[:n] << power_width) | power[window_width:window_width + n]
+            window_width += power_width
+        if power_width * 2 > width:
+            return window[:count]
+        power = (power[:-power_width] << power_width) | power[power_width:]
+        power_width *= 2
+
+
+def _code_starts(jumps, first, limit):
+    """
+    Follow first -> jumps[first] -> ... and return the positions visited below limit,
+    in order. Pointer doubling does this in log2(codes) vectorized steps: each round
+    extends the known starts by the same number of codes, using jumps composed with itself.
+    """
+    starts = np.array([first], dtype=jumps.dtype)
+    while starts[-1] < limit:
+        starts = np.concatenate([starts, jumps[starts]])
+        jumps = jumps[jumps]
+    return starts[:np.searchsorted(starts, limit)]
+
+
+def decode_symbols(bits, codes, count, dtype=np.uint8):
+    """
+    Decode count symbols from a uint8 array of '0'/'1' characters with a
+    {symbol: code string} table whose symbols are integers. Anything after
+    the count-th code (an EOF code, padding) is ignored.
+    """
+    max_length = max(len(code) for code in codes.values())
+    table_bits = min(max_length, MAX_TABLE_BITS)
+    table_symbols, table_lengths, long_codes = _lookup_table(codes, table_bits)
+    out = np.empty(count, dtype=dtype)
+    decoded = 0
+    position = 0  # bit position of the next code
+
+    while decoded < count and position < bits.size:
+        start = position
+        end = min(start + BLOCK, bits.size)
+        window_bits = (bits[start:end + table_bits - 1] != ZERO).view(np.uint8)
+        window_bits = np.append(window_bits, np.zeros(end + table_bits - 1 - start - window_bits.size, np.uint8))
+        windows = _windows(window_bits, table_bits, end - start)
+        symbols = table_symbols[windows]
+        lengths = table_lengths[windows]
+        for index in np.flatnonzero(lengths == 0):
+            # Longer than the lookup table, or no code at all; -1 ends the chain there
+            try:
+                symbols[index], lengths[index] = _decode_long(bits, start + index, long_codes, max_length)
+            except ValueError:
+                lengths[index] = -1
+
+        # Position of the next code after each bit position, clipped to an absorbing end state
+        limit = end - start
+        jumps = np.minimum(np.arange(limit) + lengths, limit)
+        jumps[lengths < 0] = limit
+        jumps = np.append(jumps, limit)
+        starts = _code_starts(jumps, 0, limit)[:count - decoded]
+        if np.any(lengths[starts] < 0):
+            raise ValueError(f"Invalid Huffman code at bit {start + int(starts[lengths[starts] < 0][0])}")
+        out[decoded:decoded + starts.size] = symbols[starts]
+        decoded += starts.size
+        position = start + int(starts[-1]) + int(lengths[starts[-1]])
+
+    if decoded < count or position > bits.size:
+        raise ValueError(f"Huffman data ends after {decoded} of {count} symbols")
+    return out
@@ -0,0 +1,298 @@
+"""
+Progressive, multi-resolution coding for fast previews.
+
+Every codec decodes the whole image at full resolution, even when only a
+thumbnail is wanted. A pyramid file stores the image as a coarse layer
+followed by refinement layers, coarsest first, so that a preview at 1/2**level
+of the width and height needs only a prefix of the file:
+
+    level L   the pixels img[::2**L, ::2**L]
+    base      level `levels`, coded with a registered lossless codec
+    refine    for each level from levels down to 1, two layers that turn
+              level L into level L - 1:
+              columns  the odd columns of the even rows
+              rows     the odd rows
+              each coded with the same codec as its difference from the mean
+              of its two neighbours in the coarser image (frame_difference
+              from sequence.py: XOR for binary, mod 256 for grayscale)
+
+The preview pixels are exact pixels of the original, sampled rather than
+averaged, and the finest level is the original image, so the pyramid is
+lossless. The neighbour differences of smooth imagery are mostly near zero,
+which keeps grayscale pyramids near the size of a flat file (smaller for
+Huffman and LZW). The refinement layers of bilevel images break up the long
+runs, and their pyramids are 30-50% larger than a flat file.
+
+    header   magic b'FYPP', format version, image size, number of levels,
+             then the codec name and a JSON block of codec metadata
+    index    one (offset, length, CRC-32) entry per layer, coarsest first
+    layers   each exactly what codec.compress returned
+
+The header and the index each end with a CRC-32, as in the tile container.
+PyramidReader reads the header and index, and then only the layers up to the
+requested level; prefix_length(level) is the number of bytes that a preview
+at that level needs, e.g. for an HTTP range request.
+
+Example:
+    python pyramid.py compress pepper.bmp pepper.fypp --codec lzw_grayscale --levels 2
+    python pyramid.py decompress pepper.fypp thumbnail.bmp --level 2
+"""
+import argparse
+import io
+import struct
+import zlib
+from itertools import repeat
+
+import numpy as np
+
+from codec_registry import get_codec, lossless_codecs
+from container import CHECKSUM, ContainerError, FramedReader, as_file, pack_header, pack_index
+from image_io import load_pixels
+from instrumentation import NO_INSTRUMENTATION
+from metrics import evaluate, print_metrics
+from parallel import compress_tile, decompress_tile, tile_executor
+from sequence import apply_difference, frame_difference
+
+MAGIC = b'FYPP'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIBHI')  # magic, version, flags, height, width, levels, name, meta
+INDEX_ENTRY = struct.Struct('<QII')   # offset, length, crc32
+
+DEFAULT_LEVELS = 2  # previews at 1/4 and 1/16 of the pixels
+
+
+class PyramidError(ContainerError):
+    """Raised for files that are not valid pyramid files or fail a checksum."""
+
+
+def level_shape(shape, level):
+    """Shape of img[::2**level, ::2**level] for an image of the given shape."""
+    step = 1 << level
+    return -(-shape[0] // step), -(-shape[1] // step)
+
+
+def interpolate(coarse, count, axis):
+    """
+    Predict the count pixels that sit between consecutive pixels of coarse along axis
+    as the mean of their two neighbours; the last one may only have a neighbour before it.
+    """
+    size = coarse.shape[axis]
+    before = coarse.take(np.arange(count), axis).astype(np.uint16)
+    before += coarse.take(np.minimum(np.arange(1, count + 1), size - 1), axis)
+    before >>= 1
+    return before.astype(np.uint8)
+
+
+def pyramid_layers(img_array, levels, kind):
+    """Yield the arrays to code, coarsest first: the base level, then the refinement layers."""
+    step = 1 << levels
+    yield img_array[::step, ::step]
+    for level in range(levels, 0, -1):
+        finer = img_array[::1 << (level - 1), ::1 << (level - 1)]
+        even_rows = finer[0::2]
+        columns = even_rows[:, 1::2]
+        yield frame_difference(columns, interpolate(even_rows[:, 0::2], columns.shape[1], 1), kind)
+        rows = finer[1::2]
+        yield frame_difference(rows, interpolate(even_rows, rows.shape[0], 0), kind)
+
+
+def refine(coarse, columns, rows, kind):
+    """The next finer level, given a level and its two decoded refinement layers."""
+    even_rows = np.empty((coarse.shape[0], coarse.shape[1] + columns.shape[1]), dtype=np.uint8)
+    even_rows[:, 0::2] = coarse
+    even_rows[:, 1::2] = apply_difference(interpolate(coarse, columns.shape[1], 1), columns, kind)
+    finer = np.empty((even_rows.shape[0] + rows.shape[0], even_rows.shape[1]), dtype=np.uint8)
+    finer[0::2] = even_rows
+    finer[1::2] = apply_difference(interpolate(even_rows, rows.shape[0], 0), rows, kind)
+    return finer
+
+
+def write_pyramid(target, img_array, codec_name, levels=DEFAULT_LEVELS, metadata=None, workers=None,
+                  instrumentation=NO_INSTRUMENTATION):
+    """
+    Code img_array as a resolution pyramid with the named lossless codec and write it
+    to target (a path or a seekable binary file). Returns the number of bytes written.
+
+    levels: number of halvings of the base layer; both sides of the image must be at
+        least 2**levels pixels.
+    workers: number of processes, or an Executor, to code the layers concurrently.
+    """
+    codec = get_codec(codec_name)
+    if not codec.lossless:
+        raise ValueError(f"Pyramids need a lossless codec, and '{codec_name}' is lossy")
+    if img_array.ndim != 2:
+        raise ValueError(f"Expected a 2-D image, got shape {img_array.shape}")
+    height, width = img_array.shape
+    if not 0 <= levels <= 255 or min(height, width) < 1 << levels:
+        raise ValueError(f"A {width}x{height} image cannot have {levels} pyramid levels")
+    img_array = img_array.astype(np.uint8, copy=False)
+
+    with instrumentation.stage('transform'):
+        layers = [np.ascontiguousarray(layer) for layer in pyramid_layers(img_array, levels, codec.kind)]
+
+    header = pack_header(HEADER, (MAGIC, VERSION, 0, height, width, levels), codec.name,
+                         {'kind': codec.kind, 'options': codec.options, **(metadata or {})})
+
+    file, should_close = as_file(target, 'wb')
+    try:
+        start = file.tell()
+        # Layer offsets are relative to the start of the pyramid
+        offset = len(header) + len(layers) * INDEX_ENTRY.size + CHECKSUM.size
+        file.write(header)
+        file.seek(start + offset)
+
+        index = []
+        with tile_executor(workers) as executor:
+            if executor is None:
+                encoded = (codec.compress(layer, instrumentation=instrumentation) for layer in layers)
+            else:
+                encoded = executor.map(compress_tile, repeat(codec.name), layers, repeat({}))
+            for data in encoded:
+                with instrumentation.stage('write'):
+                    file.write(data)
+                index.append(INDEX_ENTRY.pack(offset, len(data), zlib.crc32(data)))
+                offset += len(data)
+
+        file.seek(start + len(header))
+        file.write(pack_index(index))
+        file.seek(start + offset)
+    finally:
+        if should_close:
+            file.close()
+    instrumentation.count_out(offset)
+    return offset
+
+
+def compress_pyramid(img_array, codec_name, levels=DEFAULT_LEVELS, workers=None, **kwargs):
+    """Like write_pyramid, but return the pyramid as bytes."""
+    buffer = io.BytesIO()
+    write_pyramid(buffer, img_array, codec_name, levels, workers=workers, **kwargs)
+    return buffer.getvalue()
+
+
+def decompress_pyramid(data, level=0, workers=None, instrumentation=NO_INSTRUMENTATION):
+    """Decode a pyramid held in memory at the given level (0 is full resolution)."""
+    with PyramidReader(io.BytesIO(data)) as reader:
+        return reader.read_level(level, instrumentation, workers=workers)
+
+
+class PyramidReader(FramedReader):
+    """
+    Reads a pyramid file lazily. Opening it reads and verifies only the header and
+    the index; read_level reads the layers that level needs and no more.
+
+        with PyramidReader('pepper.fypp') as reader:
+            thumbnail = reader.read_level(2)
+    """
+
+    MAGIC = MAGIC
+    VERSION = VERSION
+    HEADER = HEADER
+    INDEX_ENTRY = INDEX_ENTRY
+    error = PyramidError
+    format_name = 'pyramid'
+    item_name = 'layer'
+
+    def __init__(self, source):
+        super().__init__(source)
+        self.height, self.width, self.levels = self._read_header()
+        self.kind = self.metadata['kind']
+        self.index = self._read_index(1 + 2 * self.levels)
+        self.codec = get_codec(self.codec_name)
+
+    @property
+    def shape(self):
+        return self.height, self.width
+
+    def level_shape(self, level):
+        return level_shape(self.shape, level)
+
+    def _layer_count(self, level):
+        if not 0 <= level <= self.levels:
+            raise ValueError(f"Level {level} is outside the pyramid's levels 0 to {self.levels}")
+        return 1 + 2 * (self.levels - level)
+
+    def prefix_length(self, level=0):
+        """Bytes from the start of the file that decoding the given level reads."""
+        offset, length, _ = self.index[self._layer_count(level) - 1]
+        return offset + length
+
+    def read_layer_bytes(self, i):
+        """Return the verified compressed bytes of layer i (0 is the base layer)."""
+        return self.read_payload(i)
+
+    def read_level(self, level=0, instrumentation=NO_INSTRUMENTATION, workers=None):
+        """
+        Decode the image at 1/2**level of its width and height; level 0 is the full image.
+        workers: number of processes, or an Executor, to decode the layers concurrently.
+        """
+        count = self._layer_count(level)
+        with instrumentation.stage('read'):
+            payloads = [self.read_layer_bytes(i) for i in range(count)]
+        instrumentation.count_in(sum(len(data) for data in payloads))
+
+        with tile_executor(workers) as executor:
+            if executor is None:
+                decoded = (self.codec.decompress(data) for data in payloads)
+            else:
+                decoded = executor.map(decompress_tile, repeat(self.codec_name), payloads, repeat({}))
+            image = next(decoded)
+            if image.shape != self.level_shape(self.levels):
+                raise PyramidError(f"Base layer decodes to shape {image.shape}, "
+                                   f"expected {self.level_shape(self.levels)}")
+            for finer in range(self.levels - 1, level - 1, -1):
+                columns, rows = next(decoded), next(decoded)
+                with instrumentation.stage('transform'):
+                    image = refine(image, columns, rows, self.kind)
+                if image.shape != self.level_shape(finer):
+                    raise PyramidError(f"Level {finer} decodes to shape {image.shape}, "
+                                       f"expected {self.level_shape(finer)}")
+        return image
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Code images as resolution pyramids, or decode previews from them.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compress_parser = subparsers.add_parser('compress', help="Compress an image")
+    compress_parser.add_argument('input')
+    compress_parser.add_argument('output')
+    compress_parser.add_argument('--codec', default='rle_grayscale',
+                                 choices=lossless_codecs())
+    compress_parser.add_argument('--levels', type=int, default=DEFAULT_LEVELS)
+    compress_parser.add_argument('--workers', type=int, default=None)
+
+    decompress_parser = subparsers.add_parser('decompress', help="Decode the image or a preview of it")
+    decompress_parser.add_argument('input')
+    decompress_parser.add_argument('output')
+    decompress_parser.add_argument('--level', type=int, default=0, help="Halve the width and height this many times")
+    decompress_parser.add_argument('--original', help="Original image to compare a full decode with")
+    decompress_parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == 'compress':
+        mode = '1' if get_codec(args.codec).kind == 'binary' else 'L'
+        img_array = load_pixels(args.input, mode)
+        size = write_pyramid(args.output, img_array, args.codec, args.levels, workers=args.workers)
+        with PyramidReader(args.output) as reader:
+            for level in range(reader.levels, -1, -1):
+                height, width = reader.level_shape(level)
+                print(f"Level {level} ({width}x{height}): first {reader.prefix_length(level) / 1024:.2f} KB")
+        print(f"Original Size: {img_array.nbytes / 1024:.2f} KB")
+        print(f"Compressed Size: {size / 1024:.2f} KB")
+    else:
+        with PyramidReader(args.input) as reader:
+            img_array = reader.read_level(args.level, workers=args.workers)
+            read = reader.prefix_length(args.level)
+            binary = reader.kind == 'binary'
+            scale = 255 if binary else 1
+        from PIL import Image
+        Image.fromarray(img_array * scale).save(args.output)
+        print(f"Decoded {img_array.shape[1]}x{img_array.shape[0]} image from the first {read / 1024:.2f} KB "
+              f"to {args.output}")
+        if args.original and args.level == 0:
+            print_metrics(evaluate(load_pixels(args.original, '1' if binary else 'L'), img_array))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Content-addressed on-disk cache for compress, decompress and metric results.
+
+Parameter sweeps and reports run the same codecs over the same images again
+and again. A ResultCache stores each result under a key that hashes the
+input pixels (or bytes), the parameters of the call and the source of the
+module that computes it, so a repeated call reads the stored result instead
+of recomputing it:
+
+    cache = ResultCache('.fyp-cache', max_bytes=512 * 1024 ** 2)
+    data = cache.get_or_compute('rle_grayscale.compress', lambda: compress_array(img_array),
+                                arrays=(img_array,), params={'delta': 2}, source=__file__)
+    factors = cache.get_or_compute('drkm.svd', lambda: np.linalg.svd(img_array), arrays=(img_array,),
+                                   kind='arrays', source=__file__)
+    quality = cache.evaluate(original, reconstructed)
+
+The source digest covers the given module and the repository modules it
+imports, directly or through each other (codec scripts import the shared
+modules at the root). Editing a codec or a helper it uses starts its results
+from a clean key space; editing anything else, such as the benchmark, keeps
+them.
+
+Results are stored as raw bytes, NumPy arrays (.npz) or JSON, one file per
+key, written atomically so concurrent runs can share a directory. Every hit
+touches the file, and when the directory grows past max_bytes the least
+recently used files are removed first.
+
+The scripts use default_cache(): setting the FYP_CACHE environment variable
+to a directory turns caching on, and FYP_CACHE_MB sets its size limit.
+Without it they get NO_CACHE, which always computes. Timings reported by a
+run that hit the cache are the time of the lookup.
+
+Example:
+    FYP_CACHE=.fyp-cache python DR-KM/Code.py
+    python result_cache.py info --dir .fyp-cache
+    python result_cache.py clear --dir .fyp-cache
+"""
+import argparse
+import ast
+import hashlib
+import io
+import json
+import os
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+
+import metrics
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_VERSION = 2
+DEFAULT_MAX_MB = 1024
+KINDS = {'bytes': '.bin', 'arrays': '.npz', 'json': '.json'}
+
+def imported_sources(path):
+    """
+    Paths of the repository modules the Python file at path imports, anywhere in the
+    file: modules next to it, or at the repository root, as the codec scripts import them.
+    """
+    with open(path, 'rb') as file:
+        tree = ast.parse(file.read(), path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.partition('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.partition('.')[0])
+    paths = []
+    for name in sorted(names):
+        for directory in (os.path.dirname(path), ROOT_DIR):
+            candidate = os.path.join(directory, name + '.py')
+            if os.path.isfile(candidate):
+                paths.append(candidate)
+                break
+    return paths
+
+
+@lru_cache(maxsize=None)
+def source_digest(path):
+    """
+    Digest of the Python file at path and of every repository module it imports,
+    directly or through each other, computed once per process.
+    """
+    path = os.path.abspath(path)
+    sources, pending = {path}, [path]
+    while pending:
+        for imported in imported_sources(pending.pop()):
+            if imported not in sources:
+                sources.add(imported)
+                pending.append(imported)
+    digest = hashlib.sha256()
+    for source in sorted(sources):
+        digest.update(os.path.relpath(source, ROOT_DIR).encode('utf-8'))
+        with open(source, 'rb') as file:
+            digest.update(hashlib.sha256(file.read()).digest())
+    return digest.hexdigest()
+
+
+def cache_key(namespace, arrays=(), params=None, source=None):
+    """
+    Hex key of a result: the namespace, the dtype, shape and contents of every
+    input array (bytes inputs are hashed as they are), the parameters and, given the
+    path of the module that computes the result, its source_digest.
+    """
+    code = '' if source is None else source_digest(source)
+    digest = hashlib.sha256(f"{CACHE_VERSION}\0{code}\0{namespace}\0".encode('utf-8'))
+    for value in arrays:
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            digest.update(b'bytes\0')
+            digest.update(value)
+        else:
+            value = np.ascontiguousarray(value)
+            digest.update(f"{value.dtype.str}{value.shape}\0".encode('utf-8'))
+            digest.update(value.data)
+    digest.update(json.dumps(params or {}, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _serialize(value, kind):
+    if kind == 'bytes':
+        return bytes(value)
+    if kind == 'arrays':
+        buffer = io.BytesIO()
+        np.savez(buffer, *value)
+        return buffer.getvalue()
+    return json.dumps(value).encode('utf-8')
+
+
+def _deserialize(data, kind):
+    if kind == 'bytes':
+        return data
+    if kind == 'arrays':
+        with np.load(io.BytesIO(data)) as arrays:
+            return tuple(arrays[f'arr_{index}'] for index in range(len(arrays.files)))
+    return json.loads(data.decode('utf-8'))
+
+
+class ResultCache:
+    """A directory of cached results, evicted least recently used first beyond max_bytes."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_MB * 1024 ** 2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None  # bytes stored, as of the last scan plus what this process wrote since
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, kind):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown result kind '{kind}'. Available kinds: {', '.join(KINDS)}")
+        return os.path.join(self.directory, key + KINDS[kind])
+
+    def load(self, key, kind='bytes'):
+        """The stored result for key, or None. A hit marks the entry as recently used."""
+        path = self._path(key, kind)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return _deserialize(data, kind)
+
+    def store(self, key, value, kind='bytes'):
+        """Store a result under key, then evict old entries if the cache is over its limit."""
+        data = _serialize(value, kind)
+        if len(data) > self.max_bytes:
+            return
+        handle, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                file.write(data)
+            os.replace(temporary_path, self._path(key, kind))
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+        if self._size is None:
+            self._size = sum(entry.stat().st_size for entry in self.entries())
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def get_or_compute(self, namespace, compute, arrays=(), params=None, kind='bytes', source=None):
+        """
+        The cached result of compute() for these inputs and parameters, computing
+        and storing it on a miss.
+        kind: 'bytes', 'arrays' (a tuple of NumPy arrays) or 'json'.
+        source: path of the module whose code computes the result, usually the caller's
+            __file__; changes to it or to the modules it imports invalidate the result.
+        """
+        key = cache_key(namespace, arrays, params, source)
+        value = self.load(key, kind)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = compute()
+        self.store(key, value, kind)
+        return value
+
+    def evaluate(self, original, reconstructed, **kwargs):
+        """metrics.evaluate, cached on both images and the keyword arguments."""
+        return self.get_or_compute('metrics.evaluate', lambda: metrics.evaluate(original, reconstructed, **kwargs),
+                                   (original, reconstructed), kwargs, kind='json', source=metrics.__file__)
+
+    def entries(self):
+        """os.DirEntry of every stored result."""
+        with os.scandir(self.directory) as scan:
+            return [entry for entry in scan
+                    if entry.is_file() and os.path.splitext(entry.name)[1] in KINDS.values()]
+
+    def evict(self, max_bytes=None):
+        """Remove the least recently used entries until at most max_bytes (default self.max_bytes) remain."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = []
+        for entry in self.entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:  # removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+    def clear(self):
+        self.evict(0)
+
+
+class _NoCache:
+    """Stand-in used when caching is off; every result is computed."""
+
+    hits = misses = 0
+
+    def get_or_compute(self, namespace, compute, arrays=(), params=None, kind='bytes', source=None):
+        return compute()
+
+    def evaluate(self, original, reconstructed, **kwargs):
+        return metrics.evaluate(original, reconstructed, **kwargs)
+
+
+NO_CACHE = _NoCache()
+
+_default_caches = {}
+
+
+def default_cache():
+    """Return the cache configured by the FYP_CACHE and FYP_CACHE_MB environment variables, or NO_CACHE."""
+    directory = os.environ.get('FYP_CACHE')
+    if not directory:
+        return NO_CACHE
+    if directory not in _default_caches:
+        max_mb = float(os.environ.get('FYP_CACHE_MB', DEFAULT_MAX_MB))
+        _default_caches[directory] = ResultCache(directory, int(max_mb * 1024 ** 2))
+    return _default_caches[directory]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or empty the result cache.")
+    parser.add_argument('command', choices=['info', 'clear', 'evict'])
+    parser.add_argument('--dir', default=os.environ.get('FYP_CACHE'), help="Cache directory (default: $FYP_CACHE)")
+    parser.add_argument('--max-mb', type=float, default=float(os.environ.get('FYP_CACHE_MB', DEFAULT_MAX_MB)),
+                        help="Size limit applied by evict")
+    args = parser.parse_args()
+    if not args.dir:
+        parser.error("no cache directory given and FYP_CACHE is not set")
+
+    cache = ResultCache(args.dir, int(args.max_mb * 1024 ** 2))
+    if args.command == 'clear':
+        cache.clear()
+    elif args.command == 'evict':
+        cache.evict()
+    entries = cache.entries()
+    total = sum(entry.stat().st_size for entry in entries)
+    print(f"{args.dir}: {len(entries)} results, {total / 1024 ** 2:.2f} MB of {args.max_mb:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Adaptive Golomb-Rice coding of RLE runs.
+
+The .txt format spends a decimal number and a separator on every run value
+and length. Run lengths are roughly geometrically distributed, which is
+the case Golomb-Rice codes are made for. A value v coded with parameter k
+is its quotient v >> k in unary, followed by its k low bits. The best k
+follows the typical magnitude of the values, so it is chosen again for
+every BLOCK values: the k that gives the fewest bits for that block. As
+in JPEG-LS run mode, k tracks the recent runs. Here it is computed by the
+encoder and stored, one byte per block, so the decoder needs no state and
+can work on whole arrays.
+
+Values are coded CHUNK at a time. Each chunk keeps its unary quotients and
+its remainder bits in two separate bit streams, so both can be packed and
+unpacked with array operations:
+
+    unary      q zero bits then a one bit; the ones are found with
+               np.flatnonzero, and the gaps between them are the quotients
+    remainder  the k low bits of each value, most significant first, read
+               and written one bit position at a time over the whole chunk
+    escapes    a quotient of ESCAPE or more is written as ESCAPE, and the
+               value itself is stored as a uint64, so one long run in a
+               block of short ones costs 64 bits instead of thousands
+
+RLE data in this format starts with HEADER:
+
+    magic b'FYPG', version, kind (0 binary, 1 grayscale), scan order,
+    first run value, height, width, number of runs
+
+It is followed by batches of at most BATCH runs. Each batch holds its run
+count and its run lengths minus one. For grayscale images, the batch then
+holds its run values. Each value is coded as the difference from the
+previous value, wrapped to [-128, 127] and zigzag-mapped to 0-255, so
+small steps get small codes. Binary run values alternate, so the first
+value in the header is enough. The encoder finds the runs one batch at a
+time, and the decoder expands them one batch at a time. Neither holds
+the runs of the whole image, which for noisy images take several times
+the memory of the pixels.
+"""
+import struct
+
+import numpy as np
+
+from scan_order import ORDERS, unscan_pixels
+
+MAGIC = b'FYPG'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBIIQ')  # magic, version, kind, scan order, first value, height, width, runs
+CHUNK_HEADER = struct.Struct('<III')  # unary bytes, remainder bytes, escapes
+BATCH_HEADER = struct.Struct('<I')    # runs in the batch
+KINDS = ('binary', 'grayscale')
+CODINGS = ('text', 'rice')  # serializations the RLE scripts offer
+
+BLOCK = 64        # values sharing one k
+CHUNK = 1 << 14   # values per pair of bit streams; a multiple of BLOCK
+BATCH = 1 << 13   # runs per batch, and pixels scanned at a time for runs; bounds the coding temporaries
+EXPAND_PIXELS = 1 << 16  # pixels a batch of runs is expanded into at a time
+ESCAPE = 24       # quotients from here on are stored as raw uint64 values
+RAW_BITS = 64
+
+
+def rice_bits(values, k):
+    """Bits taken by every value when coded with parameter k (an int or one per value)."""
+    k = np.asarray(k, dtype=np.uint64)
+    quotients = values >> k
+    return np.where(quotients < ESCAPE, quotients + 1 + k, ESCAPE + 1 + RAW_BITS)
+
+
+def choose_parameters(values):
+    """The k giving the fewest bits for every BLOCK values of a uint64 array, as uint8."""
+    starts = np.arange(0, values.size, BLOCK)
+    max_k = max(int(values.max(initial=0)).bit_length(), 1)
+    costs = np.stack([np.add.reduceat(rice_bits(values, k), starts) for k in range(max_k + 1)])
+    return np.argmin(costs, axis=0).astype(np.uint8)
+
+
+def rice_cost(values):
+    """Bits of values (non-negative integers) coded with the block-adaptive parameters, including the k bytes."""
+    total = 0
+    for start in range(0, values.size, CHUNK):
+        chunk = values[start:start + CHUNK].astype(np.uint64)
+        k = np.repeat(choose_parameters(chunk), BLOCK)[:chunk.size]
+        total += int(rice_bits(chunk, k).sum()) + 8 * -(-chunk.size // BLOCK)
+    return total
+
+
+def _encode_chunk(values):
+    """The k bytes, chunk header and streams of up to CHUNK uint64 values."""
+    parameters = choose_parameters(values)
+    k = np.repeat(parameters, BLOCK)[:values.size]
+    quotients = values >> k
+    escaped = quotients >= ESCAPE
+    quotients = np.minimum(quotients, ESCAPE).astype(np.int32)  # positions within a chunk fit in int32
+    widths = np.where(escaped, 0, k).astype(np.int32)
+
+    unary = np.zeros(int(quotients.sum()) + values.size, dtype=np.uint8)
+    quotients += 1
+    unary[np.cumsum(quotients) - 1] = 1
+
+    # Bit b of a value sits b places before its last bit; values narrower than b write to a spare last slot
+    last_bits = np.cumsum(widths) - 1
+    remainder = np.zeros(int(widths.sum()) + 1, dtype=np.uint8)
+    for bit in range(int(widths.max(initial=0))):
+        remainder[np.where(widths > bit, last_bits - bit, -1)] = (values >> np.uint64(bit)) & 1
+
+    unary = np.packbits(unary).tobytes()
+    remainder = np.packbits(remainder[:-1]).tobytes()
+    escapes = values[escaped].astype('<u8').tobytes()
+    return b''.join([parameters.tobytes(), CHUNK_HEADER.pack(len(unary), len(remainder), len(escapes) // 8),
+                     unary, remainder, escapes])
+
+
+def rice_encode(values, minimum=0):
+    """
+    Code a 1-D array of integers, all at least minimum, and return the bytes.
+    The count is not stored.
+    """
+    return b''.join(_encode_chunk(values[start:start + CHUNK].astype(np.uint64) - np.uint64(minimum))
+                    for start in range(0, values.size, CHUNK))
+
+
+def _take(data, offset, size):
+    if offset + size > len(data):
+        raise ValueError("Rice-coded data is truncated")
+    return data[offset:offset + size], offset + size
+
+
+def rice_decode(data, offset, count, dtype=np.uint64, minimum=0):
+    """
+    Decode count values written by rice_encode with this minimum, starting at
+    offset in data. Returns (values as dtype, offset just past them).
+    """
+    values = np.empty(count, dtype=dtype)
+    for start in range(0, count, CHUNK):
+        size = min(CHUNK, count - start)
+        parameters, offset = _take(data, offset, -(-size // BLOCK))
+        header, offset = _take(data, offset, CHUNK_HEADER.size)
+        unary_bytes, remainder_bytes, n_escapes = CHUNK_HEADER.unpack(header)
+        unary, offset = _take(data, offset, unary_bytes)
+        remainder, offset = _take(data, offset, remainder_bytes)
+        escapes, offset = _take(data, offset, 8 * n_escapes)
+
+        ends = np.flatnonzero(np.unpackbits(np.frombuffer(unary, dtype=np.uint8)))
+        if ends.size < size:
+            raise ValueError("Rice-coded data is truncated")
+        quotients = np.diff(ends[:size].astype(np.int32), prepend=-1) - 1
+        escaped = quotients == ESCAPE
+        if np.count_nonzero(escaped) != n_escapes:
+            raise ValueError("Rice-coded data has a wrong escape count")
+        k = np.repeat(np.frombuffer(parameters, dtype=np.uint8), BLOCK)[:size]
+        widths = np.where(escaped, 0, k).astype(np.int32)
+
+        last_bits = np.cumsum(widths) - 1
+        if last_bits[-1] >= 8 * len(remainder):
+            raise ValueError("Rice-coded data is truncated")
+        bits = np.unpackbits(np.frombuffer(remainder, dtype=np.uint8))
+        bits = np.append(bits[:last_bits[-1] + 1], np.uint8(0))  # the spare slot reads as a zero bit
+        chunk = quotients.astype(np.uint64) << k
+        for bit in range(int(widths.max(initial=0))):
+            chunk |= bits[np.where(widths > bit, last_bits - bit, -1)].astype(np.uint64) << np.uint64(bit)
+        chunk[escaped] = np.frombuffer(escapes, dtype='<u8')
+        chunk += np.uint64(minimum)
+        values[start:start + size] = chunk
+    return values, offset
+
+
+def zigzag_steps(values, previous=0):
+    """
+    Differences between consecutive uint8 values (the first from previous), wrapped to
+    [-128, 127] and zigzag-mapped to 0-255: 0, -1, 1, -2, ... become 0, 1, 2, 3, ...
+    All in uint8 arithmetic, so no wider temporaries are made.
+    """
+    steps = np.diff(values, prepend=np.uint8(previous)).view(np.int8)
+    return ((steps << 1) ^ (steps >> 7)).view(np.uint8)
+
+
+def unzigzag_steps(codes, previous=0):
+    """Inverse of zigzag_steps."""
+    steps = (codes >> 1) ^ (np.uint8(0) - (codes & 1))
+    steps[:1] += np.uint8(previous)
+    return np.cumsum(steps, dtype=np.uint8)
+
+
+def iter_runs(pixels, binary=False):
+    """
+    Yield the (values, lengths) of the runs of a 1-D uint8 array, for the runs
+    ending in each BATCH pixels, so no array of all the runs is ever built.
+    pixels may also be an iterator of consecutive 1-D blocks of the array, such
+    as scan_order.iter_scan_blocks yields; the runs then come a block at a time.
+    With binary set, any nonzero pixel counts as 1 and the run values are 0/1.
+    """
+    if isinstance(pixels, np.ndarray):
+        blocks = (pixels[start:start + BATCH] for start in range(0, pixels.size, BATCH))
+    else:
+        blocks = (block for block in pixels if block.size)
+    block = next(blocks, None)
+    start, previous_end = 0, -1
+    while block is not None:
+        following = next(blocks, None)
+        if binary:
+            block = (block != 0).view(np.uint8)
+        ends = np.flatnonzero(block[1:] != block[:-1])
+        # A run ends on the last pixel of the block unless the next block carries it on
+        if following is None or (following[0] != 0 if binary else following[0]) != block[-1]:
+            ends = np.append(ends, block.size - 1)
+        if ends.size:
+            yield block[ends], np.diff(ends + start, prepend=previous_end)
+            previous_end = ends[-1] + start
+        start += block.size
+        block = following
+
+
+def join_runs(batches, size):
+    """
+    Concatenate (values, lengths) batches, such as iter_runs yields for size pixels,
+    into one pair of arrays; the lengths are uint32 when size allows.
+    """
+    index_type = np.uint32 if size < 2 ** 32 else np.int64
+    values, counts = [], []
+    for batch_values, batch_counts in batches:
+        values.append(batch_values)
+        counts.append(batch_counts.astype(index_type))
+    return np.concatenate(values), np.concatenate(counts)
+
+
+def is_rice_data(data):
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def encode_runs(batches, shape, order='row', kind='binary'):
+    """
+    Serialize RLE runs in this format. batches yields (values, lengths) arrays of
+    consecutive runs, such as iter_runs does or a single pair from the RLE encoders.
+    """
+    parts = [b'']
+    n_runs = 0
+    first = previous = 0
+
+    def code_batch(values, counts):
+        nonlocal n_runs, first, previous
+        if n_runs == 0:
+            first = int(values[0])
+        parts.append(BATCH_HEADER.pack(counts.size))
+        parts.append(rice_encode(counts, minimum=1))
+        if kind == 'grayscale':
+            parts.append(rice_encode(zigzag_steps(values, previous)))
+            previous = int(values[-1])
+        n_runs += counts.size
+
+    # Code full batches of BATCH runs; images with few runs yield many small pieces
+    pending_values, pending_counts, pending = [], [], 0
+    for values, counts in batches:
+        pending_values.append(values)
+        pending_counts.append(counts)
+        pending += counts.size
+        if pending >= BATCH:
+            values, counts = np.concatenate(pending_values), np.concatenate(pending_counts)
+            full = pending - pending % BATCH
+            for start in range(0, full, BATCH):
+                code_batch(values[start:start + BATCH], counts[start:start + BATCH])
+            pending_values, pending_counts, pending = [values[full:]], [counts[full:]], pending - full
+    if pending:
+        code_batch(np.concatenate(pending_values), np.concatenate(pending_counts))
+    parts[0] = HEADER.pack(MAGIC, VERSION, KINDS.index(kind), ORDERS.index(order), first if kind == 'binary' else 0,
+                           shape[0], shape[1], n_runs)
+    return b''.join(parts)
+
+
+def read_rice_header(data, kind='binary'):
+    """Parse the header of RLE data in this format: ((height, width), scan order, first value, number of runs)."""
+    if len(data) < HEADER.size:
+        raise ValueError("Rice-coded RLE data is truncated")
+    magic, version, data_kind, order, first, height, width, n_runs = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not Rice-coded RLE data")
+    if version > VERSION:
+        raise ValueError(f"Rice-coded RLE version {version} is newer than supported version {VERSION}")
+    if data_kind >= len(KINDS) or KINDS[data_kind] != kind:
+        raise ValueError(f"Expected {kind} RLE data")
+    if order >= len(ORDERS):
+        raise ValueError(f"Unknown scan order {order} in header")
+    return (height, width), ORDERS[order], first, n_runs
+
+
+def iter_decoded_runs(data, kind='binary'):
+    """
+    Yield the (values, lengths) batches of RLE data in this format, as encode_runs
+    wrote them. Binary run values are 0 and 1; lengths are intp, as np.repeat takes them.
+    """
+    _, _, first, n_runs = read_rice_header(data, kind)
+    data = memoryview(data)
+    offset = HEADER.size
+    decoded = previous = 0
+    while decoded < n_runs:
+        header, offset = _take(data, offset, BATCH_HEADER.size)
+        (size,) = BATCH_HEADER.unpack(header)
+        if not 0 < size <= n_runs - decoded:
+            raise ValueError("Rice-coded RLE data has a wrong run count")
+        counts, offset = rice_decode(data, offset, size, np.intp, minimum=1)
+        if kind == 'binary':
+            values = ((np.arange(decoded, decoded + size) + first) & 1).astype(np.uint8)
+        else:
+            codes, offset = rice_decode(data, offset, size, np.uint8)
+            values = unzigzag_steps(codes, previous)
+            previous = int(values[-1])
+        decoded += size
+        yield values, counts
+
+
+def decode_runs(data, kind='binary'):
+    """
+    Parse RLE data in this format, as the .txt parsers do: ((height, width), run values,
+    run lengths, scan order).
+    """
+    shape, order, _, _ = read_rice_header(data, kind)
+    batches = list(iter_decoded_runs(data, kind))
+    values = np.concatenate([values for values, _ in batches])
+    counts = np.concatenate([counts for _, counts in batches])
+    if counts.sum() != shape[0] * shape[1]:
+        raise ValueError(f"RLE runs cover {counts.sum()} pixels, expected {shape[0] * shape[1]}")
+    return shape, values, counts, order
+
+
+def expand_runs(batches, shape, order='row'):
+    """
+    Expand (values, lengths) batches of runs in scan order straight into the
+    (height, width) uint8 image, so the runs of the whole image are never held at once.
+    """
+    n_pixels = shape[0] * shape[1]
+    pixels = np.empty(n_pixels, dtype=np.uint8)
+    position = 0
+    for values, counts in batches:
+        end = position + int(counts.sum())
+        if end > n_pixels:
+            break
+        if end - position <= EXPAND_PIXELS:
+            pixels[position:end] = np.repeat(values, counts)
+            position = end
+            continue
+        # Expand the runs in groups covering at most EXPAND_PIXELS pixels, and fill longer runs on their own,
+        # so np.repeat never makes a temporary as large as the batch
+        run_ends = np.cumsum(counts, dtype=np.int64) + position
+        first = 0
+        while first < counts.size:
+            last = int(np.searchsorted(run_ends, position + EXPAND_PIXELS, side='right'))
+            if last == first:
+                pixels[position:run_ends[first]] = values[first]
+                last = first + 1
+            else:
+                pixels[position:run_ends[last - 1]] = np.repeat(values[first:last], counts[first:last])
+            position = int(run_ends[last - 1])
+            first = last
+    if position != n_pixels:
+        raise ValueError(f"RLE runs do not cover the {n_pixels} pixels of the image")
+    return unscan_pixels(pixels, shape, order)
+
+
+def decode_pixels(data, kind='binary'):
+    """Decode RLE data in this format into the (height, width) image, a batch of runs at a time."""
+    shape, order, _, _ = read_rice_header(data, kind)
+    return expand_runs(iter_decoded_runs(data, kind), shape, order)
@@ -0,0 +1,173 @@
+"""
+Pixel scan orders for the run-based codecs.
+
+RLE and LZW read the pixels as one long sequence, and the order they are read
+in decides how long the runs and repeated phrases are. Row-major order breaks
+every vertical structure into one run per row; other orders keep more
+neighbouring pixels next to each other:
+
+    row         row-major, the order the codecs always used
+    column      column-major, for vertically structured content
+    serpentine  row-major with every other row reversed, so the scan never
+                jumps from the end of one row back to the start of the next
+    hilbert     the Hilbert curve over the smallest power-of-two square
+                covering the image, skipping the cells outside it; it stays
+                inside small blocks, which suits blocky images
+
+Each order is a permutation of the row-major pixel indices, computed with
+array operations once per (shape, order) and cached. scan_pixels gathers the
+pixels through it, and unscan_pixels scatters decoded pixels back.
+iter_scan_blocks yields the same pixels a block at a time, so an image that
+is a strided view (a memory-mapped BMP is stored bottom-up, with padded
+rows) is copied one block at a time rather than flattened whole.
+choose_scan_order picks the order that gives the fewest runs on a sample.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+ORDERS = ('row', 'column', 'serpentine', 'hilbert')
+SAMPLE_SIZE = 256
+CACHE_SIZE = 16
+SCAN_BLOCK = 1 << 16  # pixels per block of iter_scan_blocks
+
+
+def hilbert_index(y, x, bits):
+    """Position along the Hilbert curve of side 2**bits of the cells (y, x), as int64."""
+    y = y.astype(np.int32)
+    x = x.astype(np.int32)
+    index = np.zeros(x.shape, dtype=np.int64)
+    mask = (1 << bits) - 1
+    s = 1 << (bits - 1)
+    while s:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        index += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve inside it starts and ends at the right corners:
+        # reflect (x ^ mask is mask - x) where rx and not ry, then swap x and y where not ry
+        reflect = (rx & ~ry) * np.int32(mask)
+        x ^= reflect
+        y ^= reflect
+        swap = (x ^ y) * ~ry
+        x ^= swap
+        y ^= swap
+        s >>= 1
+    return index
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def scan_permutation(shape, order):
+    """
+    The row-major index of every pixel in scan order, for an image of this (height, width).
+    The array is cached and read-only.
+    """
+    height, width = shape
+    n = height * width
+    index_type = np.uint32 if n < 2 ** 32 else np.int64
+    if order == 'column':
+        permutation = np.arange(n, dtype=index_type).reshape(height, width).T.ravel()
+    elif order == 'serpentine':
+        permutation = np.arange(n, dtype=index_type).reshape(height, width)
+        permutation[1::2] = permutation[1::2, ::-1].copy()
+        permutation = permutation.ravel()
+    elif order == 'hilbert':
+        y, x = np.divmod(np.arange(n, dtype=np.int64), width)
+        bits = max(int(max(height, width) - 1).bit_length(), 1)
+        permutation = np.argsort(hilbert_index(y, x, bits)).astype(index_type)
+    elif order == 'row':
+        permutation = np.arange(n, dtype=index_type)
+    else:
+        raise ValueError(f"Unknown scan order '{order}'. Available orders: {', '.join(ORDERS)}")
+    permutation.setflags(write=False)
+    return permutation
+
+
+def scan_pixels(img_array, order='row'):
+    """The pixels of a 2-D image as a 1-D array in scan order. Row order returns img_array.ravel()."""
+    if order == 'row':
+        return img_array.ravel()
+    return img_array.ravel()[scan_permutation(img_array.shape[:2], order)]
+
+
+def iter_scan_blocks(img_array, order='row', block=SCAN_BLOCK):
+    """
+    Yield the pixels of a 2-D image in scan order as consecutive 1-D blocks of
+    about block pixels, which together are what scan_pixels returns.
+    """
+    height, width = img_array.shape[:2]
+    if order == 'row' and img_array.flags.c_contiguous:
+        pixels = img_array.ravel()
+        for start in range(0, pixels.size, block):
+            yield pixels[start:start + block]
+    elif order == 'row':
+        rows = max(1, block // max(width, 1))
+        for start in range(0, height, rows):
+            yield np.ascontiguousarray(img_array[start:start + rows]).ravel()
+    else:
+        permutation = scan_permutation((height, width), order)
+        for start in range(0, permutation.size, block):
+            y, x = np.divmod(permutation[start:start + block], width)
+            yield img_array[y, x]
+
+
+def unscan_pixels(pixels, shape, order='row'):
+    """Inverse of scan_pixels: put pixels read in scan order back into a (height, width) image."""
+    if order == 'row':
+        return pixels.reshape(shape)
+    img_array = np.empty(shape[0] * shape[1], dtype=pixels.dtype)
+    img_array[scan_permutation(tuple(shape), order)] = pixels
+    return img_array.reshape(shape)
+
+
+def count_runs(pixels):
+    return int(np.count_nonzero(pixels[1:] != pixels[:-1])) + 1 if pixels.size else 0
+
+
+def choose_scan_order(img_array, sample_size=SAMPLE_SIZE):
+    """
+    The scan order giving the fewest runs on the sample_size x sample_size tile
+    at the centre of the image. Ties go to the earlier order in ORDERS, so row
+    order is kept unless another order actually helps.
+    """
+    height, width = img_array.shape[:2]
+    y = max((height - sample_size) // 2, 0)
+    x = max((width - sample_size) // 2, 0)
+    tile = np.ascontiguousarray(img_array[y:y + sample_size, x:x + sample_size])
+    runs = {order: count_runs(scan_pixels(tile, order)) for order in ORDERS}
+    return min(ORDERS, key=runs.get)
+
+
+def resolve_scan_order(img_array, order):
+    """order itself, or the order choose_scan_order picks when order is 'auto'."""
+    if order == 'auto':
+        return choose_scan_order(img_array)
+    if order not in ORDERS:
+        raise ValueError(f"Unknown scan order '{order}'. Available orders: {', '.join(ORDERS)} or auto")
+    return order
+
+
+def format_header(shape, order='row', separator=' ', options=()):
+    """
+    The first line of an RLE or LZW .txt file: the dimensions, then the scan order
+    when it is not row order, so files in row order are unchanged, then any codec
+    options, written as 'name:value'.
+    """
+    fields = [str(shape[0]), str(shape[1])] + ([] if order == 'row' else [order])
+    return separator.join(fields + [option for option in options if option]) + '\n'
+
+
+def parse_header(header, separator=' '):
+    """
+    Inverse of format_header: ((height, width), order, options) from the first
+    line, without the newline. options is the list of 'name:value' fields.
+    """
+    fields = [field.strip() for field in header.split(separator)]
+    if len(fields) < 2:
+        raise ValueError(f"Malformed header line '{header}'")
+    order = 'row'
+    if len(fields) > 2 and ':' not in fields[2]:
+        order = fields[2]
+        if order not in ORDERS:
+            raise ValueError(f"Unknown scan order '{order}' in header")
+        del fields[2]
+    return (int(fields[0]), int(fields[1])), order, fields[2:]
@@ -0,0 +1,346 @@
+"""
+Delta coding of image sequences.
+
+Consecutive frames of a camera sequence are nearly identical, but every
+codec here compresses one image on its own. A sequence file codes a key
+frame every key_interval frames with a registered codec as usual, and every
+other frame as its difference from the previous frame, coded with the same
+codec:
+
+    binary     frame XOR previous frame, 1 where a pixel changed
+    grayscale  (frame - previous frame) mod 256, 0 where a pixel is unchanged
+
+The differences of a still scene are almost all zero, which every codec
+codes in a few bytes and in little time. A frame where more than
+SCENE_CUT of the pixels changed is coded as a key frame instead, since its
+difference would not code any smaller. Only lossless codecs can be used, so
+a decoded frame is exactly the reference the next difference was taken from.
+
+    header   magic b'FYPS', format version, frame size, key interval, then
+             the codec name and a JSON block of codec metadata, with a CRC-32
+    frames   each exactly what codec.compress returned for the frame or
+             its difference
+    index    one (offset, length, CRC-32, key flag) entry per frame, with a
+             CRC-32
+    footer   offset of the index, number of frames, magic
+
+The index is written after the frames, so frames can be appended as they
+arrive without knowing how many there will be. SequenceReader reads only
+the header and the index when it opens a file. To decode frame i, it
+seeks to the last key frame at or before i and applies the differences up
+to i. read_frames decodes a range of frames in one pass, and can decode the
+frames on a process pool before the differences are applied in order.
+
+Example:
+    python sequence.py compress frames/*.png clip.fyps --codec rle_grayscale_rice --key-interval 30
+    python sequence.py decompress clip.fyps out/ --start 120 --stop 150
+"""
+import argparse
+import bisect
+import io
+import os
+import struct
+import zlib
+from itertools import repeat
+
+import numpy as np
+
+from codec_registry import get_codec, lossless_codecs
+from container import ContainerError, FramedReader, as_file, pack_header, pack_index
+from image_io import load_pixels
+from instrumentation import NO_INSTRUMENTATION
+from parallel import compress_tile, decompress_tile, tile_executor
+
+MAGIC = b'FYPS'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIIHI')  # magic, version, flags, height, width, key interval, name, meta
+INDEX_ENTRY = struct.Struct('<QIIB')  # offset, length, crc32, key frame
+FOOTER = struct.Struct('<QI4s')       # index offset, frames, magic
+
+DEFAULT_KEY_INTERVAL = 30
+SCENE_CUT = 0.5  # fraction of changed pixels above which a frame is coded as a key frame
+
+
+class SequenceError(ContainerError):
+    """Raised for files that are not valid sequence files or fail a checksum."""
+
+
+def frame_difference(frame, previous, kind):
+    """The difference a frame is coded as: XOR for binary frames, subtraction mod 256 for grayscale."""
+    return np.bitwise_xor(frame, previous) if kind == 'binary' else np.subtract(frame, previous)
+
+
+def apply_difference(previous, difference, kind):
+    """Inverse of frame_difference: the frame, given the previous frame and the difference."""
+    return np.bitwise_xor(previous, difference) if kind == 'binary' else np.add(previous, difference)
+
+
+def _frame_jobs(frames, kind, key_interval, instrumentation):
+    """Yield (is_key, array to code) for every frame, deciding which frames are key frames."""
+    previous = None
+    since_key = 0
+    for frame in frames:
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if frame.ndim != 2:
+            raise ValueError(f"Expected 2-D frames, got shape {frame.shape}")
+        if previous is not None and frame.shape != previous.shape:
+            raise ValueError(f"Frame shape {frame.shape} differs from the first frame's {previous.shape}")
+        since_key += 1
+        if previous is None or since_key >= key_interval:
+            since_key = 0
+            yield True, frame
+        else:
+            with instrumentation.stage('transform'):
+                difference = frame_difference(frame, previous, kind)
+                changed = np.count_nonzero(difference) / difference.size
+            if changed > SCENE_CUT:
+                since_key = 0
+                yield True, frame
+            else:
+                yield False, difference
+        previous = frame
+
+
+def _chain(first, rest):
+    """Put back the job taken off the front of rest."""
+    yield first
+    yield from rest
+
+
+def write_sequence(target, frames, codec_name, key_interval=DEFAULT_KEY_INTERVAL, metadata=None,
+                   workers=None, instrumentation=NO_INSTRUMENTATION):
+    """
+    Code an iterable of 2-D uint8 frames with the named lossless codec and write the
+    sequence to target (a path or a seekable binary file). Returns the number of bytes written.
+
+    key_interval: code every key_interval-th frame (and scene cuts) on its own.
+    workers: number of processes, or an Executor, to code frames concurrently. The
+        frames are then all held in memory; serially, one frame at a time is.
+    """
+    codec = get_codec(codec_name)
+    if not codec.lossless:
+        raise ValueError(f"Sequences need a lossless codec, and '{codec_name}' is lossy")
+    if key_interval < 1:
+        raise ValueError(f"key_interval must be at least 1, got {key_interval}")
+
+    jobs = _frame_jobs(frames, codec.kind, key_interval, instrumentation)
+    first = next(jobs, None)
+    if first is None:
+        raise ValueError("A sequence needs at least one frame")
+    height, width = first[1].shape
+
+    header = pack_header(HEADER, (MAGIC, VERSION, 0, height, width, key_interval), codec.name,
+                         {'kind': codec.kind, 'options': codec.options, **(metadata or {})})
+
+    file, should_close = as_file(target, 'wb')
+    try:
+        start = file.tell()
+        file.write(header)
+        offset = len(header)  # frame offsets are relative to the start of the sequence
+        index = []
+        with tile_executor(workers) as executor:
+            if executor is None:
+                jobs = _chain(first, jobs)
+                encoded = ((is_key, codec.compress(array, instrumentation=instrumentation)) for is_key, array in jobs)
+            else:
+                jobs = [first, *jobs]
+                encoded = zip((is_key for is_key, _ in jobs),
+                              executor.map(compress_tile, repeat(codec.name), (array for _, array in jobs), repeat({})))
+            for is_key, data in encoded:
+                with instrumentation.stage('write'):
+                    file.write(data)
+                index.append(INDEX_ENTRY.pack(offset, len(data), zlib.crc32(data), is_key))
+                offset += len(data)
+
+        trailer = pack_index(index) + FOOTER.pack(offset, len(index), MAGIC)
+        file.write(trailer)
+        offset += len(trailer)
+        file.seek(start + offset)
+    finally:
+        if should_close:
+            file.close()
+    instrumentation.count_out(offset)
+    return offset
+
+
+def compress_sequence(frames, codec_name, key_interval=DEFAULT_KEY_INTERVAL, workers=None, **kwargs):
+    """Like write_sequence, but return the sequence as bytes."""
+    buffer = io.BytesIO()
+    write_sequence(buffer, frames, codec_name, key_interval, workers=workers, **kwargs)
+    return buffer.getvalue()
+
+
+class SequenceReader(FramedReader):
+    """
+    Reads a sequence file lazily. Opening it reads and verifies only the header and
+    the index; frames are read and decoded on demand.
+
+        with SequenceReader('clip.fyps') as reader:
+            frame = reader.read_frame(120)
+            clip = reader.read_frames(120, 150)
+    """
+
+    MAGIC = MAGIC
+    VERSION = VERSION
+    HEADER = HEADER
+    INDEX_ENTRY = INDEX_ENTRY
+    error = SequenceError
+    format_name = 'sequence'
+    item_name = 'frame'
+
+    def __init__(self, source):
+        super().__init__(source)
+        self.height, self.width, self.key_interval = self._read_header()
+        self.kind = self.metadata['kind']
+        self._read_footer_index()
+        self.codec = get_codec(self.codec_name)
+        self.key_frames = [i for i, entry in enumerate(self.index) if entry[3]]
+        if not self.key_frames or self.key_frames[0] != 0:
+            raise SequenceError("The first frame of a sequence must be a key frame")
+        self._last = None  # (index, frame) of the last frame decoded, to continue from
+
+    def _read_footer_index(self):
+        self._file.seek(0, io.SEEK_END)
+        end = self._file.tell()
+        if end - self._start < FOOTER.size:
+            raise SequenceError("Sequence is truncated")
+        self._file.seek(end - FOOTER.size)
+        index_offset, n_frames, magic = FOOTER.unpack(self._read_exact(FOOTER.size))
+        if magic != MAGIC:
+            raise SequenceError("Sequence footer is missing; the file may be truncated")
+        self._file.seek(self._start + index_offset)
+        self.index = self._read_index(n_frames)
+
+    @property
+    def shape(self):
+        return self.height, self.width
+
+    def __len__(self):
+        return len(self.index)
+
+    def key_frame_before(self, i):
+        """The last key frame at or before frame i, where decoding frame i starts."""
+        return self.key_frames[bisect.bisect_right(self.key_frames, i) - 1]
+
+    def read_frame_bytes(self, i):
+        """Return the verified compressed bytes of frame i."""
+        if not 0 <= i < len(self.index):
+            raise IndexError(f"Frame {i} is outside the {len(self.index)} frames of the sequence")
+        return self.read_payload(i)
+
+    def iter_frames(self, start=0, stop=None, instrumentation=NO_INSTRUMENTATION, workers=None):
+        """
+        Yield frames start to stop - 1, decoding from the key frame at or before start
+        (or from the last frame decoded, when that is closer).
+        The frames are read-only, since the reader keeps the last one to decode the next
+        frames from; copy a frame to modify it.
+        workers: number of processes, or an Executor, to decode the frames concurrently.
+        """
+        stop = len(self.index) if stop is None else min(stop, len(self.index))
+        if start >= stop:
+            return
+        first = self.key_frame_before(start)
+        frame = None
+        if self._last is not None and first <= self._last[0] <= start:
+            first, frame = self._last[0] + 1, self._last[1]
+            if first > start:  # start is the frame decoded last
+                yield frame
+                start = first
+                if start >= stop:
+                    return
+
+        with instrumentation.stage('read'):
+            payloads = [self.read_frame_bytes(i) for i in range(first, stop)]
+        instrumentation.count_in(sum(len(data) for data in payloads))
+        with tile_executor(workers) as executor:
+            if executor is None:
+                decoded = (self.codec.decompress(data) for data in payloads)
+            else:
+                decoded = executor.map(decompress_tile, repeat(self.codec_name), payloads, repeat({}))
+            for i, array in zip(range(first, stop), decoded):
+                if array.shape != self.shape:
+                    raise SequenceError(f"Frame {i} decodes to shape {array.shape}, expected {self.shape}")
+                with instrumentation.stage('transform'):
+                    frame = array if self.index[i][3] else apply_difference(frame, array, self.kind)
+                frame.setflags(write=False)
+                self._last = (i, frame)
+                if i >= start:
+                    yield frame
+
+    def read_frames(self, start=0, stop=None, instrumentation=NO_INSTRUMENTATION, workers=None):
+        """Decode frames start to stop - 1 and return them as one (frames, height, width) array."""
+        stop = len(self.index) if stop is None else min(stop, len(self.index))
+        frames = np.empty((max(stop - start, 0), self.height, self.width), dtype=np.uint8)
+        count = 0
+        for count, frame in enumerate(self.iter_frames(start, stop, instrumentation, workers), start=1):
+            frames[count - 1] = frame
+        if count != len(frames):
+            raise SequenceError(f"Decoded {count} frames, expected {len(frames)}")
+        return frames
+
+    def read_frame(self, i, instrumentation=NO_INSTRUMENTATION):
+        """Decode frame i, as a read-only array (see iter_frames)."""
+        if self._last is not None and self._last[0] == i:
+            return self._last[1]
+        return next(self.iter_frames(i, i + 1, instrumentation))
+
+
+def decompress_sequence(data, workers=None, instrumentation=NO_INSTRUMENTATION):
+    """Decode a whole sequence held in memory into a (frames, height, width) array."""
+    with SequenceReader(io.BytesIO(data)) as reader:
+        return reader.read_frames(instrumentation=instrumentation, workers=workers)
+
+
+def load_frames(paths, mode):
+    """Yield the frames of image files, or of (frames, height, width) .npy stacks, one at a time."""
+    for path in paths:
+        if path.lower().endswith('.npy'):
+            stack = np.load(path, mmap_mode='r')
+            if stack.ndim == 3:
+                yield from stack
+                continue
+        yield load_pixels(path, mode)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delta-code image sequences, or decode frames from them.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compress_parser = subparsers.add_parser('compress', help="Code frames (image files or .npy stacks) in order")
+    compress_parser.add_argument('inputs', nargs='+')
+    compress_parser.add_argument('output')
+    compress_parser.add_argument('--codec', default='rle_grayscale',
+                                 choices=lossless_codecs())
+    compress_parser.add_argument('--key-interval', type=int, default=DEFAULT_KEY_INTERVAL)
+    compress_parser.add_argument('--workers', type=int, default=None)
+
+    decompress_parser = subparsers.add_parser('decompress', help="Decode frames to a directory or a .npy stack")
+    decompress_parser.add_argument('input')
+    decompress_parser.add_argument('output', help="Directory for one image per frame, or a .npy file")
+    decompress_parser.add_argument('--start', type=int, default=0)
+    decompress_parser.add_argument('--stop', type=int, default=None)
+    decompress_parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == 'compress':
+        mode = '1' if get_codec(args.codec).kind == 'binary' else 'L'
+        size = write_sequence(args.output, load_frames(args.inputs, mode), args.codec, args.key_interval,
+                              workers=args.workers)
+        with SequenceReader(args.output) as reader:
+            print(f"Wrote {len(reader)} frames ({len(reader.key_frames)} key frames), {size} bytes, to {args.output}")
+    else:
+        with SequenceReader(args.input) as reader:
+            frames = reader.read_frames(args.start, args.stop, workers=args.workers)
+            scale = 255 if reader.kind == 'binary' else 1
+        if args.output.lower().endswith('.npy'):
+            np.save(args.output, frames * scale)
+        else:
+            from PIL import Image
+            os.makedirs(args.output, exist_ok=True)
+            for i, frame in enumerate(frames, start=args.start):
+                Image.fromarray(frame * scale).save(os.path.join(args.output, f"frame_{i:05d}.bmp"))
+        print(f"Decoded {len(frames)} frames to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Long-lived compression service.
+
+Serves compress and decompress for every registered codec over HTTP/1.1, on
+a TCP port or a Unix socket, so callers no longer pay interpreter start-up
+and codec imports on every request. The event loop only parses requests and
+moves bytes; the codec work runs in a process pool whose workers import
+every codec once, at start-up.
+
+    POST /compress/<codec>[?tile=N]     body: image file (BMP, PNG, ...) or .npy array
+                                        returns the codec's serialized bytes, or a
+                                        tiled container when tile is given
+    POST /decompress/<codec>[?format=png|npy]
+                                        body: codec bytes, returns the image
+    POST /compress/color[?codec=...]    RGB/RGBA images through color.py
+    POST /decompress/color[?format=png|npy]
+    GET  /codecs                        codec names and kinds, as JSON
+    GET  /stats                         request counters, as JSON
+
+Request bodies may use Content-Length or chunked transfer encoding and are
+read in chunks, up to --max-body bytes. A job gets the whole body, since a
+pool worker receives its arguments in one message. A malformed body is
+answered with 400 and the connection is closed, as its unread rest cannot be
+told apart from the next request. Responses are written in chunks with flow
+control. At most
+--concurrency jobs run at once. Up to --queue more wait for a slot, and
+requests beyond that are refused with 503 so that overload shows up as fast
+failures rather than growing latency.
+
+Example:
+    python service.py --port 8750 --workers 4
+    python service.py --unix /tmp/fyp.sock
+    python load_test.py --url http://127.0.0.1:8750 --codec rle_grayscale --requests 200 --concurrency 16
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from codec_registry import CODECS, get_codec
+
+DEFAULT_PORT = 8750
+CHUNK_SIZE = 64 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+DEFAULT_MAX_BODY = 256 * 1024 * 1024
+HEADER_TIMEOUT = 30
+NPY_MAGIC = b'\x93NUMPY'
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Jobs run in the worker processes
+
+def warm_up():
+    """Pool initializer: import every codec once, so requests never pay for imports."""
+    for codec in CODECS.values():
+        try:
+            codec.load()
+        except ImportError:
+            pass  # optional dependency missing; requests for this codec will report it
+
+
+def _ready():
+    return os.getpid()
+
+
+def decode_image(payload, mode):
+    """Turn a request body (an image file or an .npy array) into pixels for a codec."""
+    if payload.startswith(NPY_MAGIC):
+        array = np.load(io.BytesIO(payload), allow_pickle=False)
+    else:
+        from PIL import Image, UnidentifiedImageError
+        try:
+            image = Image.open(io.BytesIO(payload))
+        except UnidentifiedImageError as e:
+            raise ValueError(str(e)) from e
+        with image:
+            if mode in ('RGB', 'RGBA'):
+                has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+                mode = 'RGBA' if has_alpha else 'RGB'
+            array = np.array(image.convert(mode))
+    if mode == '1':
+        return (array > 0).astype(np.uint8)
+    return array.astype(np.uint8, copy=False)
+
+
+def encode_image(array, output_format, binary=False):
+    """Serialize a decoded image as PNG or .npy bytes."""
+    buffer = io.BytesIO()
+    if output_format == 'npy':
+        np.save(buffer, array)
+    else:
+        from PIL import Image
+        Image.fromarray(array.astype(bool) if binary else array).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def compress_job(codec_name, payload, options):
+    if codec_name == 'color':
+        from color import compress_color
+        return compress_color(decode_image(payload, 'RGB'), options.get('codec', 'lzw_grayscale'))
+    codec = get_codec(codec_name)
+    img_array = decode_image(payload, '1' if codec.kind == 'binary' else 'L')
+    if 'tile' in options:
+        from container import compress_tiled
+        return compress_tiled(img_array, codec_name, int(options['tile']))
+    return codec.compress(img_array)
+
+
+def decompress_job(codec_name, data, options):
+    output_format = options.get('format', 'png')
+    if codec_name == 'color':
+        from color import decompress_color
+        return encode_image(decompress_color(data), output_format)
+    codec = get_codec(codec_name)
+    if data.startswith(b'FYPC'):
+        from container import decompress_tiled
+        img_array = decompress_tiled(data)
+    else:
+        img_array = codec.decompress(data)
+    return encode_image(img_array, output_format, binary=codec.kind == 'binary')
+
+
+# HTTP handling on the event loop
+
+class CompressionService:
+    def __init__(self, workers=None, concurrency=None, queue=64, max_body=DEFAULT_MAX_BODY):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None
+        self.slots = asyncio.Semaphore(concurrency or self.workers)
+        self.queue = queue
+        self.max_body = max_body
+        self.waiting = 0
+        self.stats = {'requests': 0, 'completed': 0, 'rejected': 0, 'errors': 0,
+                      'active': 0, 'bytes_in': 0, 'bytes_out': 0, 'job_seconds': 0.0}
+
+    async def start_pool(self):
+        """Start the worker processes and wait until every one has imported the codecs."""
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _ready) for _ in range(self.workers)))
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    async def run_job(self, function, *args):
+        """Run a job in the pool, waiting for a free slot unless the queue is full."""
+        if self.slots.locked() and self.waiting >= self.queue:
+            self.stats['rejected'] += 1
+            raise HttpError(503, "Server busy, try again later")
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.stats['active'] += 1
+        start_time = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        finally:
+            self.stats['job_seconds'] += time.perf_counter() - start_time
+            self.stats['active'] -= 1
+            self.slots.release()
+
+    async def read_body(self, reader, headers):
+        """
+        Read the request body in chunks, enforcing the size limit. A malformed or
+        truncated body raises HttpError(400), which closes the connection.
+        """
+        chunks, size = [], 0
+        try:
+            if headers.get('transfer-encoding', '').lower() == 'chunked':
+                while True:
+                    chunk_size = int((await reader.readline()).split(b';')[0], 16)
+                    if chunk_size < 0:
+                        raise ValueError(f"negative chunk size {chunk_size}")
+                    if chunk_size == 0:
+                        await reader.readline()
+                        break
+                    size += chunk_size
+                    if size > self.max_body:
+                        raise HttpError(413, "Request body too large")
+                    chunks.append(await reader.readexactly(chunk_size))
+                    await reader.readline()
+            else:
+                remaining = int(headers.get('content-length', 0))
+                if remaining < 0:
+                    raise ValueError(f"negative Content-Length {remaining}")
+                if remaining > self.max_body:
+                    raise HttpError(413, "Request body too large")
+                while remaining:
+                    chunk = await reader.readexactly(min(CHUNK_SIZE, remaining))
+                    chunks.append(chunk)
+                    remaining -= len(chunk)
+        except (ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+            raise HttpError(400, f"Malformed request body: {e}") from e
+        body = b''.join(chunks)
+        self.stats['bytes_in'] += len(body)
+        return body
+
+    async def dispatch(self, method, target, reader, headers):
+        """Route one request and return (status, content type, body)."""
+        url = urlsplit(target)
+        options = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split('/') if part]
+
+        if parts == ['codecs']:
+            codecs = {name: codec.kind for name, codec in CODECS.items()}
+            return 200, 'application/json', json.dumps(codecs).encode()
+        if parts == ['stats']:
+            stats = {**self.stats, 'waiting': self.waiting, 'workers': self.workers}
+            return 200, 'application/json', json.dumps(stats).encode()
+        if len(parts) != 2 or parts[0] not in ('compress', 'decompress'):
+            raise HttpError(404, f"No route for {url.path}")
+        if method != 'POST':
+            raise HttpError(405, "Use POST")
+        if parts[1] != 'color' and parts[1] not in CODECS:
+            raise HttpError(404, f"Unknown codec '{parts[1]}'")
+
+        body = await self.read_body(reader, headers)
+        function = compress_job if parts[0] == 'compress' else decompress_job
+        result = await self.run_job(function, parts[1], body, options)
+        if parts[0] == 'compress':
+            return 200, 'application/octet-stream', result
+        return 200, 'application/x-npy' if options.get('format') == 'npy' else 'image/png', result
+
+    async def write_response(self, writer, status, content_type, body, keep_alive):
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1'))
+        view = memoryview(body)
+        for start in range(0, len(body), CHUNK_SIZE):
+            writer.write(view[start:start + CHUNK_SIZE])
+            await writer.drain()
+        await writer.drain()
+        self.stats['bytes_out'] += len(body)
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection until the client closes it or asks to."""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), HEADER_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.write_response(writer, 400, 'text/plain', b"Headers too large", False)
+                    break
+
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ', 2)
+                except ValueError:
+                    await self.write_response(writer, 400, 'text/plain', b"Malformed request line", False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+
+                self.stats['requests'] += 1
+                try:
+                    status, content_type, body = await self.dispatch(method, target, reader, headers)
+                    self.stats['completed'] += 1
+                except HttpError as e:
+                    status, content_type, body = e.status, 'text/plain', str(e).encode()
+                    if e.status != 503:
+                        keep_alive = False  # the request body may still be unread on the connection
+                except ValueError as e:
+                    self.stats['errors'] += 1
+                    status, content_type, body = 400, 'text/plain', f"Invalid input: {e}".encode()
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    status, content_type, body = 500, 'text/plain', f"{type(e).__name__}: {e}".encode()
+                await self.write_response(writer, status, content_type, body, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host='127.0.0.1', port=DEFAULT_PORT, unix_path=None, **kwargs):
+    service = CompressionService(**kwargs)
+    print(f"Starting {service.workers} worker processes...")
+    await service.start_pool()
+    if unix_path:
+        server = await asyncio.start_unix_server(service.handle_connection, unix_path, limit=MAX_HEADER_BYTES)
+        print(f"Serving on unix:{unix_path}")
+    else:
+        server = await asyncio.start_server(service.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        print(f"Serving on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the codecs over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', help="Listen on this Unix socket path instead of TCP")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--concurrency', type=int, default=None, help="Jobs run at once (default: workers)")
+    parser.add_argument('--queue', type=int, default=64, help="Requests that may wait for a free slot")
+    parser.add_argument('--max-body', type=int, default=DEFAULT_MAX_BODY, help="Largest request body in bytes")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, workers=args.workers, concurrency=args.concurrency,
+                          queue=args.queue, max_body=args.max_body))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
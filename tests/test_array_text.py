@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from array_text import BLOCK_BYTES, BLOCK_ROWS, format_batches, format_columns, iter_integers, iter_rows, parse_integers
+
+
+def random_columns(size, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, size), rng.integers(1, 10 ** 7, size)
+
+
+def test_format_batches_matches_one_batch():
+    values, counts = random_columns(3 * BLOCK_ROWS + 5)
+    batches = [(values[start:start + 1000], counts[start:start + 1000]) for start in range(0, values.size, 1000)]
+    expected = format_columns([values, counts], (' ', '\n'), header='8 8 row\n')
+    assert format_batches(batches, (' ', '\n'), header='8 8 row\n') == expected
+    assert expected.splitlines()[1] == f"{values[0]} {counts[0]}".encode()
+
+
+def test_integers_split_across_blocks():
+    values = np.random.default_rng(1).integers(0, 2 ** 40, BLOCK_BYTES // 4)
+    data = format_columns([values], ('\n',))
+    assert len(data) > 2 * BLOCK_BYTES
+    assert len(list(iter_integers(data))) > 1
+    np.testing.assert_array_equal(parse_integers(data), values)
+
+
+def test_iter_rows_carries_partial_rows():
+    values, counts = random_columns(BLOCK_BYTES // 3, seed=2)
+    data = b'header\n' + format_columns([values, counts], (' ', '\n'))
+    rows = list(iter_rows(data, 2, offset=7))
+    assert len(rows) > 1
+    np.testing.assert_array_equal(np.concatenate(rows), np.column_stack([values, counts]))
+
+
+def test_iter_rows_rejects_a_partial_last_row():
+    with pytest.raises(ValueError, match="left over"):
+        list(iter_rows(b'1 2\n3 4\n5', 2))
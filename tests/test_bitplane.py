@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import bitplane
+from benchmark import SYNTHETIC_KINDS, make_synthetic_image
+from bitplane import (BINARY_CODECS, RAW, ROW_BLOCK_PIXELS, choose_plane_coder, compress_array, decompress_bytes,
+                      from_gray_code, read_bitplane_header, row_blocks, to_gray_code)
+
+
+def test_gray_code_round_trips_and_steps_one_bit():
+    values = np.arange(256, dtype=np.uint8)
+    gray = to_gray_code(values)
+    assert sorted(gray) == list(range(256))
+    assert all(bin(int(a ^ b)).count('1') == 1 for a, b in zip(gray[:-1], gray[1:]))
+    np.testing.assert_array_equal(from_gray_code(gray.copy()), values)
+
+
+@pytest.mark.parametrize('kind', SYNTHETIC_KINDS)
+@pytest.mark.parametrize('codec', ['auto'] + BINARY_CODECS)
+def test_round_trip(kind, codec):
+    img_array = make_synthetic_image(kind, 48)
+    np.testing.assert_array_equal(decompress_bytes(compress_array(img_array, codec=codec)), img_array)
+
+
+def test_round_trip_over_several_row_blocks():
+    img_array = np.random.default_rng(1).integers(0, 256, (300, 333), dtype=np.uint8)
+    assert len(row_blocks(img_array.shape)) > 1 and ROW_BLOCK_PIXELS < img_array.size
+    data = compress_array(img_array)
+    assert read_bitplane_header(data)[0]['coders'] == [RAW] * 8
+    np.testing.assert_array_equal(decompress_bytes(data), img_array)
+
+
+def test_round_trip_without_gray_code_and_with_workers():
+    img_array = make_synthetic_image('gradient', 64)
+    data = compress_array(img_array, gray_code=False, workers=2)
+    assert read_bitplane_header(data)[0]['gray_code'] is False
+    np.testing.assert_array_equal(decompress_bytes(data, workers=2), img_array)
+    assert data == compress_array(img_array, gray_code=False)
+
+
+def test_planes_are_chosen_without_encoding(monkeypatch):
+    def no_trial_encodes(name):
+        raise AssertionError(f"choose_plane_coder ran {name}")
+
+    monkeypatch.setattr(bitplane, 'get_codec', no_trial_encodes)
+    uniform = np.zeros((256, 256), dtype=np.uint8)
+    assert choose_plane_coder(uniform) != RAW
+    noise = np.random.default_rng(0).integers(0, 2, (256, 256), dtype=np.uint8)
+    assert choose_plane_coder(noise) == RAW
+    assert choose_plane_coder(uniform, 'rle_binary') == 'rle_binary'
+
+
+def test_planes_never_exceed_raw_packing():
+    img_array = make_synthetic_image('noise', 64)
+    metadata, _ = read_bitplane_header(compress_array(img_array, codec='huffman_binary'))
+    assert max(metadata['sizes']) <= img_array.size // 8
+
+
+def test_rejects_bad_input():
+    with pytest.raises(ValueError):
+        compress_array(np.zeros((4, 4, 3), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        compress_array(np.zeros((4, 4), dtype=np.uint8), codec='lzw_grayscale')
+    with pytest.raises(ValueError, match='Not bit-plane'):
+        decompress_bytes(b'FYPC' + bytes(20))
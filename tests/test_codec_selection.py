@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import codec_selection
+from benchmark import SYNTHETIC_KINDS, make_synthetic_image
+from codec_registry import get_codec
+from codec_selection import huffman_code_lengths, infer_kind, sample_bands, select_codec
+
+
+def kind_image(image_kind, kind, size=256):
+    gray = make_synthetic_image(image_kind, size)
+    return (gray > 128).astype(np.uint8) if kind == 'binary' else gray
+
+
+@pytest.mark.parametrize('image_kind', SYNTHETIC_KINDS)
+@pytest.mark.parametrize('kind', ['binary', 'grayscale'])
+def test_estimates_track_the_actual_sizes(image_kind, kind):
+    img_array = kind_image(image_kind, kind)
+    result = select_codec(img_array)
+    assert result['kind'] == kind and result['raw_bytes'] == img_array.size
+    actual = {name: len(get_codec(name).compress(img_array)) for name in result['estimates']}
+    for name, estimate in result['estimates'].items():
+        # RLE and Huffman sizes are modelled exactly on a fully sampled image; LZW only by a bound
+        tolerance = 0.5 if name.startswith('lzw') else 0.05
+        assert estimate == pytest.approx(actual[name], rel=tolerance), name
+    assert actual[result['codec']] <= 1.1 * min(actual.values())
+
+
+def test_confirm_trial_encodes_the_best_candidates(monkeypatch):
+    img_array = kind_image('text', 'grayscale', 512)
+    result = select_codec(img_array, confirm=2, tile_size=64)
+    ranking = sorted(result['estimates'], key=result['estimates'].get)
+    assert sorted(result['trial_bytes']) == sorted(ranking[:2])
+    assert result['codec'] == min(result['trial_bytes'], key=result['trial_bytes'].get)
+
+    def no_encoding(name):
+        raise AssertionError(f"select_codec ran {name} without confirm")
+
+    monkeypatch.setattr(codec_selection, 'get_codec', no_encoding)
+    assert select_codec(img_array)['trial_bytes'] == {}
+
+
+def test_sample_bands_keep_whole_rows():
+    img_array = make_synthetic_image('noise', 1024)
+    bands = sample_bands(img_array, sample_pixels=1 << 16)
+    assert sum(band.size for band in bands) <= 1 << 16
+    assert all(band.size % 1024 == 0 for band in bands)
+    assert len(sample_bands(img_array[:16, :16])) == 1
+
+
+def test_huffman_code_lengths_form_a_complete_code():
+    frequencies = {0: 40, 1: 30, 2: 20, 3: 5, 'EOF': 1}
+    lengths = huffman_code_lengths(frequencies)
+    assert sum(2.0 ** -length for length in lengths.values()) == pytest.approx(1)
+    assert lengths[0] <= lengths[1] <= lengths[2] <= lengths[3]
+    assert huffman_code_lengths({7: 10}) == {7: 1}
+
+
+def test_infer_kind():
+    assert infer_kind(np.array([[0, 1]], dtype=np.uint8)) == 'binary'
+    assert infer_kind(np.array([[0, 255]], dtype=np.uint8)) == 'grayscale'
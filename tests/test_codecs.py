@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from benchmark import SYNTHETIC_KINDS, make_synthetic_image, prepare_input
+from codec_registry import CODECS, get_codec, load_module, lossless_codecs
+
+
+@pytest.mark.parametrize('name', lossless_codecs())
+@pytest.mark.parametrize('kind', SYNTHETIC_KINDS)
+def test_lossless_roundtrip(name, kind):
+    codec = get_codec(name)
+    img_array = prepare_input(codec, make_synthetic_image(kind, 48)[:40])  # not square
+    decoded = codec.decompress(codec.compress(img_array))
+    assert decoded.dtype == np.uint8
+    np.testing.assert_array_equal(decoded, img_array)
+
+
+@pytest.mark.parametrize('name', lossless_codecs('binary'))
+def test_binary_codecs_take_0_255_input(name):
+    codec = get_codec(name)
+    img_array = np.zeros((5, 7), dtype=np.uint8)
+    img_array[1:3, 2:6] = 255
+    img_array[4] = 1  # 0/1 and 0/255 pixels mixed
+    np.testing.assert_array_equal(codec.decompress(codec.compress(img_array)), img_array != 0)
+    np.testing.assert_array_equal(codec.decompress(codec.compress(np.full((1, 7), 255, np.uint8))), 1)
+
+
+def test_rle_binary_runs_ignore_the_nonzero_value():
+    rle_binary = CODECS['rle_binary']
+    ones = np.array([[0, 1, 1, 0]], dtype=np.uint8)
+    assert rle_binary.compress(ones * 255) == rle_binary.compress(ones)
+
+
+@pytest.mark.parametrize('name', [name for name, codec in CODECS.items() if not codec.lossless])
+def test_lossy_codecs_keep_the_shape(name):
+    codec = get_codec(name)
+    if name == 'drkm':
+        pytest.importorskip('sklearn')
+    img_array = make_synthetic_image('gradient', 32)
+    decoded = codec.decompress(codec.compress(img_array))
+    assert decoded.shape == img_array.shape
+
+
+@pytest.mark.parametrize('name', ['huffman_binary', 'huffman_grayscale'])
+def test_huffman_codes_are_prefix_free(name):
+    module = load_module(CODECS[name].compressor)
+    img_array = prepare_input(CODECS[name], make_synthetic_image('text', 64))
+    codes, frequencies = module.huffman_encoding(img_array)
+    assert set(codes) == set(frequencies)
+    words = sorted(codes.values())
+    assert all(not b.startswith(a) for a, b in zip(words, words[1:]))
+
+
+@pytest.mark.parametrize('name', ['huffman_binary', 'huffman_grayscale'])
+def test_huffman_single_value_image(name):
+    codec = get_codec(name)
+    img_array = np.full((6, 9), 1 if codec.kind == 'binary' else 77, dtype=np.uint8)
+    np.testing.assert_array_equal(codec.decompress(codec.compress(img_array)), img_array)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from color import (GRAYSCALE_CODECS, compress_color, decompress_color, merge_planes, read_color_header,
+                   rgb_to_ycocg_r, split_planes, ycocg_r_to_rgb)
+
+
+def color_image(channels=3, size=48, seed=0):
+    """A smooth color ramp with some noise, and an alpha channel when channels is 4."""
+    y, x = np.mgrid[0:size, 0:size] * (255 / (size - 1))
+    image = np.stack([x, y, (x + y) / 2, np.full_like(x, 200)][:channels], axis=-1)
+    noise = np.random.default_rng(seed).integers(-3, 4, image.shape)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+
+def test_ycocg_r_is_exactly_invertible():
+    r, g = np.meshgrid(np.arange(256), np.arange(256))
+    b = np.random.default_rng(1).integers(0, 256, r.shape)
+    rgb = np.stack([r, g, b], axis=-1).astype(np.uint8)
+    np.testing.assert_array_equal(ycocg_r_to_rgb(*rgb_to_ycocg_r(rgb)), rgb)
+
+
+def test_ycocg_r_leaves_gray_pixels_in_luma():
+    gray = np.repeat(np.arange(256, dtype=np.uint8)[:, None], 3, axis=1)
+    y, co, cg = rgb_to_ycocg_r(gray)
+    np.testing.assert_array_equal(y, gray[:, 0])
+    assert np.all(co == 128) and np.all(cg == 128)
+
+
+@pytest.mark.parametrize('channels', [3, 4])
+@pytest.mark.parametrize('transform', ['ycocg-r', 'none'])
+def test_planes_split_and_merge(channels, transform):
+    image = color_image(channels)
+    planes = split_planes(image, transform)
+    assert len(planes) == channels and all(plane.flags.c_contiguous for plane in planes)
+    np.testing.assert_array_equal(merge_planes(planes, transform), image)
+
+
+@pytest.mark.parametrize('codec', GRAYSCALE_CODECS)
+def test_round_trip_with_each_codec(codec):
+    image = color_image(4)
+    data = compress_color(image, codec)
+    assert read_color_header(data)[0]['codecs'] == [codec] * 4
+    np.testing.assert_array_equal(decompress_color(data), image)
+
+
+def test_auto_codecs_and_workers():
+    image = color_image()
+    data = compress_color(image, 'auto', workers=2)
+    assert all(name in GRAYSCALE_CODECS for name in read_color_header(data)[0]['codecs'])
+    np.testing.assert_array_equal(decompress_color(data, workers=2), image)
+    assert compress_color(image, 'auto') == data
+
+
+def test_invalid_input():
+    image = color_image()
+    with pytest.raises(ValueError, match="grayscale codec"):
+        compress_color(image, 'rle_binary')
+    with pytest.raises(ValueError, match="lossy"):
+        compress_color(image, 'rle_grayscale_near_lossless')
+    with pytest.raises(ValueError, match="RGB or RGBA"):
+        compress_color(image[..., 0])
+    with pytest.raises(ValueError, match="Unknown color transform"):
+        compress_color(image, transform='yuv')
+    with pytest.raises(ValueError, match="Not color codec data"):
+        decompress_color(b'FYPL' + compress_color(image)[4:])
@@ -0,0 +1,109 @@
+import io
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from benchmark import make_synthetic_image, prepare_input
+from codec_registry import get_codec, lossless_codecs
+from container import (HEADER, ContainerError, ContainerReader, compress_tiled, decompress_tiled,
+                       write_container)
+from parallel import tile_executor
+
+
+def sample_image(codec_name, height=70, width=90):
+    return prepare_input(get_codec(codec_name), make_synthetic_image('text', 96)[:height, :width])
+
+
+@pytest.mark.parametrize('name', lossless_codecs())
+def test_round_trip_with_partial_edge_tiles(name):
+    img_array = sample_image(name)
+    data = compress_tiled(img_array, name, tile_size=(32, 40))
+    np.testing.assert_array_equal(decompress_tiled(data), img_array)
+
+
+def test_region_decodes_only_the_overlapping_tiles(monkeypatch):
+    img_array = sample_image('rle_grayscale')
+    data = compress_tiled(img_array, 'rle_grayscale', tile_size=32)
+    with ContainerReader(io.BytesIO(data)) as reader:
+        assert (reader.rows, reader.cols) == (3, 3)
+        assert reader.tiles_in_region(30, 60, 10, 100) == [(0, 1), (0, 2), (1, 1), (1, 2)]
+        decoded = []
+        decompress = reader.codec.decompress
+
+        def counting_decompress(data, **kwargs):
+            decoded.append(data)
+            return decompress(data, **kwargs)
+
+        monkeypatch.setattr(reader.codec, 'decompress', counting_decompress)
+        np.testing.assert_array_equal(reader.read_region(30, 60, 10, 100), img_array[30:40, 60:])
+        assert len(decoded) == 4
+        np.testing.assert_array_equal(reader.read_tile(2, 0), img_array[64:, :32])
+        assert reader.read_region(-5, 200, 10, 10).size == 0
+        with pytest.raises(IndexError):
+            reader.read_tile_bytes(3, 0)
+
+
+def test_containers_are_written_to_paths_and_open_files(tmp_path):
+    img_array = sample_image('lzw_grayscale')
+    path = tmp_path / 'image.fypc'
+    size = write_container(str(path), img_array, 'lzw_grayscale', tile_size=48)
+    assert size == path.stat().st_size
+    with ContainerReader(str(path)) as reader:
+        assert reader.shape == img_array.shape and reader.codec_name == 'lzw_grayscale'
+        np.testing.assert_array_equal(reader.read_all(), img_array)
+
+    buffer = io.BytesIO(b'prefix')
+    buffer.seek(6)
+    write_container(buffer, img_array, 'lzw_grayscale', tile_size=48)
+    buffer.seek(6)
+    with ContainerReader(buffer) as reader:
+        np.testing.assert_array_equal(reader.read_all(), img_array)
+
+
+def test_corruption_is_detected():
+    data = bytearray(compress_tiled(sample_image('rle_grayscale'), 'rle_grayscale', tile_size=32))
+    with pytest.raises(ContainerError, match="Not a tiled container"):
+        decompress_tiled(b'XXXX' + bytes(data[4:]))
+    with pytest.raises(ContainerError, match="Header checksum"):
+        decompress_tiled(bytes(data[:HEADER.size + 2]) + b'!' + bytes(data[HEADER.size + 3:]))
+    with pytest.raises(ContainerError, match="truncated"):
+        decompress_tiled(bytes(data[:-1]))
+    data[-1] ^= 0xFF
+    with pytest.raises(ContainerError, match=r"Checksum mismatch in tile \(2, 2\)"):
+        decompress_tiled(bytes(data))
+
+
+@pytest.mark.parametrize('name', ['rle_grayscale', 'huffman_grayscale', 'lzw_binary'])
+def test_workers_give_the_same_container(name):
+    img_array = sample_image(name)
+    data = compress_tiled(img_array, name, tile_size=32)
+    assert compress_tiled(img_array, name, tile_size=32, workers=2) == data
+    np.testing.assert_array_equal(decompress_tiled(data, workers=2), img_array)
+
+
+def test_an_executor_is_reused():
+    img_array = sample_image('rle_binary')
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        data = compress_tiled(img_array, 'rle_binary', tile_size=32, workers=executor)
+        with ContainerReader(io.BytesIO(data)) as reader:
+            np.testing.assert_array_equal(reader.read_region(10, 10, 40, 40, workers=executor),
+                                          img_array[10:50, 10:50])
+        with tile_executor(executor) as same:
+            assert same is executor
+    with tile_executor(1) as serial:
+        assert serial is None
+
+
+@pytest.mark.parametrize('name', ['huffman_binary', 'huffman_grayscale'])
+def test_huffman_tiles_share_one_table(name):
+    img_array = sample_image(name)
+    shared = compress_tiled(img_array, name, tile_size=32)
+    separate = compress_tiled(img_array, name, tile_size=32, shared_table=False)
+    with ContainerReader(io.BytesIO(shared)) as reader:
+        assert 'table' in reader.metadata
+        np.testing.assert_array_equal(reader.read_all(), img_array)
+    with ContainerReader(io.BytesIO(separate)) as reader:
+        assert 'table' not in reader.metadata
+        np.testing.assert_array_equal(reader.read_all(), img_array)
+    assert len(shared) < len(separate)
@@ -0,0 +1,149 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from benchmark import make_synthetic_image
+from codec_registry import get_codec, load_module
+from image_io import StripWriter, image_size, iter_gray_strips, load_array, load_pixels, map_bmp_pixels, save_array
+
+Image = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def bmp_path(tmp_path):
+    """A bottom-up 8-bit BMP whose rows are padded, so its mapped view is strided."""
+    img_array = make_synthetic_image('text', 1024)[:, :1021]
+    path = tmp_path / 'gray.bmp'
+    Image.fromarray(img_array).save(path)
+    return path, img_array
+
+
+def test_mapped_bmp_is_a_strided_view(bmp_path):
+    path, img_array = bmp_path
+    pixels = map_bmp_pixels(path)
+    assert not pixels.flags.c_contiguous and not pixels.flags.writeable
+    np.testing.assert_array_equal(pixels, img_array)
+    np.testing.assert_array_equal(load_pixels(str(path)), img_array)
+
+
+def traced_compress(codec, img_array):
+    """The compressed bytes and the allocation peak while compressing them."""
+    tracemalloc.start()
+    try:
+        data = codec.compress(img_array)
+        return data, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize('name', ['rle_grayscale', 'rle_grayscale_rice', 'lzw_grayscale', 'huffman_grayscale'])
+def test_codecs_read_the_mapped_pixels_in_place(name, bmp_path):
+    path, img_array = bmp_path
+    codec = get_codec(name)
+    contiguous = np.ascontiguousarray(img_array)
+    expected, contiguous_peak = traced_compress(codec, contiguous)
+    data, mapped_peak = traced_compress(codec, map_bmp_pixels(path))
+    assert data == expected
+    # Flattening the strided view would add a copy of the whole image
+    assert mapped_peak - contiguous_peak < img_array.size // 4
+
+
+@pytest.mark.parametrize('extension', ['.npy', '.bits', '.txt'])
+def test_arrays_round_trip_through_each_format(extension, tmp_path):
+    img_array = np.random.default_rng(0).integers(0, 2 if extension == '.bits' else 256, (13, 21), dtype=np.uint8)
+    path = str(tmp_path / f'pixels{extension}')
+    save_array(img_array, path)
+    for mmap in (True, False):
+        loaded = load_array(path, mmap=mmap)
+        assert loaded.dtype == np.uint8
+        np.testing.assert_array_equal(loaded, img_array)
+    np.testing.assert_array_equal(load_pixels(path, '1' if extension == '.bits' else 'L'), img_array)
+
+
+def test_load_pixels_binarizes_arrays_and_rejects_unknown_formats(tmp_path):
+    img_array = np.array([[0, 255], [255, 0]], dtype=np.uint8)
+    assert load_pixels(img_array) is img_array
+    np.testing.assert_array_equal(load_pixels(img_array, '1'), img_array // 255)
+    with pytest.raises(ValueError, match="Unsupported array format"):
+        save_array(img_array, str(tmp_path / 'pixels.csv'))
+
+
+def test_converters_return_and_save_arrays(tmp_path):
+    rgb = np.random.default_rng(1).integers(0, 256, (40, 30, 3), dtype=np.uint8)
+    rgb[:20] //= 4  # a dark half and a bright half, for Otsu's threshold
+    source = str(tmp_path / 'source.png')
+    Image.fromarray(rgb).save(source)
+    expected = np.asarray(Image.open(source).convert('L'))
+
+    grayscale = load_module('Grayscale/Convert_to_grayscale.py')
+    gray = grayscale.convert_to_grayscale_and_save_array(source, array_output_path=str(tmp_path / 'gray.npy'))
+    np.testing.assert_array_equal(gray, expected)
+    np.testing.assert_array_equal(load_array(str(tmp_path / 'gray.npy')), expected)
+
+    binary = load_module('Binary/Convert_binary.py')
+    threshold = binary.otsu_threshold(np.bincount(expected.ravel(), minlength=256))
+    threshold_otsu = pytest.importorskip('skimage.filters').threshold_otsu
+    assert threshold == threshold_otsu(expected)
+    bits = binary.convert_to_binary_and_save_array(source, array_output_path=str(tmp_path / 'binary.bits'),
+                                                   threshold='otsu')
+    np.testing.assert_array_equal(bits, expected > threshold)
+    np.testing.assert_array_equal(load_array(str(tmp_path / 'binary.bits')), bits)
+
+
+def read_strips(source, strip_rows):
+    strips = list(iter_gray_strips(source, strip_rows))
+    assert [y for y, _ in strips] == list(range(0, image_size(source)[0], strip_rows))
+    return np.concatenate([strip for _, strip in strips])
+
+
+@pytest.mark.parametrize('name, mode', [('rgb.png', 'RGB'), ('rgb.bmp', 'RGB'), ('gray.bmp', 'L'),
+                                        ('binary.bmp', '1'), ('palette.bmp', 'P')])
+def test_strips_match_a_pil_conversion(name, mode, tmp_path):
+    rgb = np.random.default_rng(2).integers(0, 256, (37, 29, 3), dtype=np.uint8)
+    path = str(tmp_path / name)
+    Image.fromarray(rgb).convert(mode).save(path)
+    np.testing.assert_array_equal(read_strips(path, 8), np.asarray(Image.open(path).convert('L')))
+
+
+def test_strips_of_array_files(tmp_path):
+    rgb = np.random.default_rng(3).integers(0, 256, (37, 29, 3), dtype=np.uint8)
+    np.save(tmp_path / 'rgb.npy', rgb)
+    np.testing.assert_array_equal(read_strips(str(tmp_path / 'rgb.npy'), 8),
+                                  np.asarray(Image.fromarray(rgb).convert('L')))
+    bits = rgb[..., 0] > 127
+    save_array(bits, str(tmp_path / 'binary.bits'))
+    np.testing.assert_array_equal(read_strips(str(tmp_path / 'binary.bits'), 8), bits * 255)
+
+
+@pytest.mark.parametrize('extension, binary', [('.npy', False), ('.npy', True), ('.bmp', False), ('.bmp', True),
+                                               ('.bits', True)])
+def test_strip_writer_takes_strips_in_any_order(extension, binary, tmp_path):
+    img_array = np.random.default_rng(4).integers(0, 2 if binary else 256, (37, 29), dtype=np.uint8)
+    path = str(tmp_path / f'out{extension}')
+    with StripWriter(path, 37, 29, binary=binary) as writer:
+        for y in reversed(range(0, 37, 8)):
+            writer.write_rows(y, img_array[y:y + 8])
+    np.testing.assert_array_equal(load_pixels(path, '1' if binary else 'L'), img_array)
+    if extension == '.bmp':
+        np.testing.assert_array_equal(np.asarray(Image.open(path).convert('L')), img_array * (255 if binary else 1))
+
+
+def test_streaming_converters_match_the_in_memory_ones(tmp_path):
+    rgb = np.random.default_rng(5).integers(0, 256, (70, 45, 3), dtype=np.uint8)
+    source = str(tmp_path / 'source.bmp')
+    Image.fromarray(rgb).save(source)
+
+    grayscale = load_module('Grayscale/Convert_to_grayscale.py')
+    expected = grayscale.convert_to_grayscale_and_save_array(source)
+    grayscale.convert_to_grayscale_streaming(source, str(tmp_path / 'gray.bmp'), str(tmp_path / 'gray.npy'),
+                                             strip_rows=16)
+    np.testing.assert_array_equal(load_pixels(str(tmp_path / 'gray.bmp')), expected)
+    np.testing.assert_array_equal(load_array(str(tmp_path / 'gray.npy')), expected)
+
+    binary = load_module('Binary/Convert_binary.py')
+    expected = binary.convert_to_binary_and_save_array(source, threshold='otsu')
+    threshold = binary.convert_to_binary_streaming(source, array_output_path=str(tmp_path / 'binary.bits'),
+                                                   threshold='otsu', strip_rows=16)
+    assert threshold == binary.otsu_threshold(np.bincount(load_pixels(source).ravel(), minlength=256))
+    np.testing.assert_array_equal(load_array(str(tmp_path / 'binary.bits')), expected)
@@ -0,0 +1,22 @@
+import pytest
+
+from benchmark import measure_import_time
+from codec_registry import CODECS
+
+
+@pytest.mark.parametrize('statement', [
+    'import codec_registry',
+    'import service',
+    'import color',
+    'import benchmark',
+    'import container, sequence, pyramid, bitplane, result_cache, codec_selection',
+])
+def test_modules_import_without_heavy_libraries(statement):
+    _, heavy = measure_import_time(statement, repeat=1)
+    assert heavy == []
+
+
+def test_loading_every_codec_imports_no_heavy_library():
+    statement = '; '.join(f"codec_registry.get_codec({name!r}).load()" for name in CODECS)
+    _, heavy = measure_import_time(f"import codec_registry; {statement}", repeat=1)
+    assert heavy == []
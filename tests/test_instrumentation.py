@@ -0,0 +1,79 @@
+import csv
+import json
+
+import numpy as np
+import pytest
+
+import instrumentation
+from benchmark import make_synthetic_image
+from codec_registry import get_codec
+from instrumentation import CsvSink, Instrumentation, JsonLinesSink, PeakMemory, default_sink
+
+
+def test_report_collects_stages_bytes_and_extra_values():
+    reports = []
+    with Instrumentation('test.run', sink=reports.append, track_memory=False) as inst:
+        for _ in range(2):
+            with inst.stage('encode'):
+                pass
+        with inst.stage('write'):
+            pass
+        inst.count_in(100)
+        inst.count_out(40)
+        inst.annotate(shape=[4, 5])
+    assert reports == [inst.report]
+    report = inst.report
+    assert list(report['stages']) == ['encode', 'write']
+    assert report['bytes_in'] == 100 and report['bytes_out'] == 40 and report['shape'] == [4, 5]
+    assert report['ok'] and report['peak_rss_mb'] is None
+    assert report['total_seconds'] >= sum(report['stages'].values())
+
+
+def test_failed_runs_are_reported_and_raise():
+    reports = []
+    with pytest.raises(RuntimeError):
+        with Instrumentation('test.fail', sink=reports.append, track_memory=False) as inst:
+            with inst.stage('decode'):
+                raise RuntimeError("broken input")
+    assert reports[0]['ok'] is False and 'decode' in reports[0]['stages']
+
+
+def test_peak_memory_sees_a_large_allocation():
+    with PeakMemory() as peak:
+        block = np.ones(64 * 1024 ** 2, dtype=np.uint8)
+        del block
+    assert peak.peak_increase >= 48 * 1024 ** 2
+
+
+def test_codecs_report_their_stages():
+    img_array = make_synthetic_image('gradient', 64)
+    with Instrumentation('rle_grayscale.compress', track_memory=False) as inst:
+        get_codec('rle_grayscale').compress(img_array, instrumentation=inst)
+    assert 'encode' in inst.report['stages']
+
+
+def test_sinks_append_reports(tmp_path):
+    reports = []
+    for _ in range(2):
+        with Instrumentation('test.sink', sink=reports.append) as inst:
+            with inst.stage('read'):
+                pass
+    jsonl, csv_path = tmp_path / 'metrics.jsonl', tmp_path / 'metrics.csv'
+    for report in reports:
+        JsonLinesSink(jsonl)(report)
+        CsvSink(csv_path)(report)
+    assert [json.loads(line)['name'] for line in jsonl.read_text().splitlines()] == ['test.sink'] * 2
+    with open(csv_path, newline='') as file:
+        rows = list(csv.DictReader(file))
+    assert len(rows) == 2 and rows[0]['read_seconds'] and rows[0]['encode_seconds'] == ''
+    assert float(rows[0]['peak_rss_mb']) > 0
+
+
+def test_default_sink_follows_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setattr(instrumentation, '_default_sinks', {})
+    monkeypatch.delenv('FYP_METRICS', raising=False)
+    assert default_sink() is None
+    monkeypatch.setenv('FYP_METRICS', str(tmp_path / 'runs.csv'))
+    assert isinstance(default_sink(), CsvSink) and default_sink() is default_sink()
+    monkeypatch.setenv('FYP_METRICS', str(tmp_path / 'runs.jsonl'))
+    assert isinstance(default_sink(), JsonLinesSink)
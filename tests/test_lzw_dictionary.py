@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from benchmark import make_synthetic_image
+from codec_registry import get_codec
+from lzw_dictionary import (CODE_BATCH, FIRST_CODE, POLICIES, check_dictionary_limits, format_dictionary_option,
+                            iter_codes, lzw_decode, lzw_encode, parse_dictionary_option)
+
+
+def reference_encode(symbols, max_size=None, policy='reset'):
+    """LZW with a dictionary of byte strings, as the original scripts coded it, for the reset and freeze policies."""
+    dictionary = {bytes([value]): value for value in range(FIRST_CODE)}
+    codes, phrase = [], b''
+    for value in symbols:
+        extended = phrase + bytes([value])
+        if extended in dictionary:
+            phrase = extended
+            continue
+        codes.append(dictionary[phrase])
+        if max_size is None or len(dictionary) < max_size:
+            dictionary[extended] = len(dictionary)
+        elif policy == 'reset':
+            codes.append(max_size)
+            dictionary = {bytes([value]): value for value in range(FIRST_CODE)}
+        phrase = bytes([value])
+    return codes + [dictionary[phrase]] if phrase else codes
+
+
+def sample_symbols(size=20000, seed=0):
+    """Bytes with repeated phrases, drawn from a small alphabet."""
+    rng = np.random.default_rng(seed)
+    return np.repeat(rng.integers(0, 6, size // 3, dtype=np.uint8), rng.integers(1, 6, size // 3))[:size].tobytes()
+
+
+@pytest.mark.parametrize('max_size, policy', [(None, 'reset'), (300, 'reset'), (1000, 'reset'), (300, 'freeze')])
+def test_codes_match_a_string_dictionary(max_size, policy):
+    symbols = sample_symbols()
+    assert list(lzw_encode(symbols, max_size, policy)) == reference_encode(symbols, max_size, policy)
+
+
+@pytest.mark.parametrize('policy', POLICIES)
+@pytest.mark.parametrize('max_size', [257, 300, 4096])
+def test_bounded_dictionaries_round_trip(policy, max_size):
+    symbols = sample_symbols(seed=max_size)
+    codes = lzw_encode(symbols, max_size, policy)
+    assert max(codes) <= max_size and (policy == 'reset' or max(codes) < max_size)
+    assert bytes(lzw_decode(codes, len(symbols), max_size, policy)) == symbols
+
+
+def test_codes_come_in_batches_and_take_blocks():
+    symbols = np.frombuffer(sample_symbols(200000), dtype=np.uint8)
+    batches = list(iter_codes(symbols))
+    assert len(batches) > 1 and all(len(batch) >= CODE_BATCH for batch in batches[:-1])
+    blocks = iter(np.array_split(symbols, 7))
+    assert [code for batch in iter_codes(blocks) for code in batch] == list(lzw_encode(symbols))
+    assert list(iter_codes(b'')) == []
+
+
+def test_dictionary_options():
+    assert format_dictionary_option(None, 'reset') is None
+    assert parse_dictionary_option([format_dictionary_option(4096, 'lru')]) == (4096, 'lru')
+    assert parse_dictionary_option([]) == (None, 'reset')
+    with pytest.raises(ValueError, match="Unknown dictionary policy"):
+        check_dictionary_limits(4096, 'fifo')
+    with pytest.raises(ValueError, match="Dictionary size"):
+        check_dictionary_limits(FIRST_CODE, 'reset')
+
+
+def test_decoder_rejects_bad_codes():
+    codes = lzw_encode(sample_symbols(1000))
+    with pytest.raises(ValueError, match="Invalid LZW code"):
+        lzw_decode([65, 5000], 10)
+    with pytest.raises(ValueError, match="expected 1001"):
+        lzw_decode(codes, 1001)
+    with pytest.raises(ValueError, match="more than 999"):
+        lzw_decode(codes, 999)
+
+
+@pytest.mark.parametrize('name', ['lzw_binary', 'lzw_grayscale'])
+@pytest.mark.parametrize('max_size, policy', [(None, 'reset'), (1024, 'lru'), (1024, 'freeze')])
+def test_codecs_record_the_dictionary(name, max_size, policy):
+    codec = get_codec(name)
+    img_array = make_synthetic_image('text', 64)
+    if codec.kind == 'binary':
+        img_array = (img_array > 128).astype(np.uint8)
+    data = codec.compress(img_array, max_size=max_size, policy=policy)
+    header = data.split(b'\n', 1)[0].decode()
+    assert (format_dictionary_option(max_size, policy) or '') in header
+    np.testing.assert_array_equal(codec.decompress(data), img_array)
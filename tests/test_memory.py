@@ -0,0 +1,32 @@
+import pytest
+
+from benchmark import check_memory_budget, make_synthetic_image
+from codec_registry import get_codec
+
+SIZE = 2048
+FACTOR = 2  # peak allocations of compress and of decompress, in multiples of the raw pixels
+BITPLANE_FACTOR = 2.5  # the image and one whole plane are held beside the binary codec's own memory
+
+# The LZW loops run in Python and slow down a lot under tracemalloc, so the LZW codecs only get the text
+# image, and bit planes, whose text planes go to LZW, do without it
+CASES = [(name, kind)
+         for name in ('rle_binary', 'rle_binary_rice', 'rle_grayscale', 'rle_grayscale_rice',
+                      'huffman_binary', 'huffman_grayscale')
+         for kind in ('noise', 'gradient', 'text')]
+CASES += [('lzw_binary', 'text'), ('lzw_grayscale', 'text'), ('bitplane', 'noise'), ('bitplane', 'gradient')]
+
+
+@pytest.fixture(scope='module')
+def images():
+    return {kind: make_synthetic_image(kind, SIZE) for kind in ('noise', 'gradient', 'text')}
+
+
+@pytest.mark.parametrize('name, kind', CASES)
+def test_codec_stays_within_memory_budget(name, kind, images):
+    factor = BITPLANE_FACTOR if name == 'bitplane' else FACTOR
+    record = check_memory_budget(get_codec(name), kind, images[kind], factor)
+    raw = record['raw_bytes']
+    assert record['within_budget'], (
+        f"{name} on {kind}: encode peak {record['encode_peak_bytes'] / raw:.2f}x raw "
+        f"with {record['compressed_bytes'] / raw:.2f}x raw of output, "
+        f"decode peak {record['decode_peak_bytes'] / raw:.2f}x raw")
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from metrics import PSNR_CAP, evaluate, evaluate_batch, max_error, mse, psnr, ssim
+
+
+def noisy_pair(shape=(80, 90), spread=20, seed=0):
+    rng = np.random.default_rng(seed)
+    original = rng.integers(0, 256, shape, dtype=np.uint8)
+    noise = rng.integers(-spread, spread + 1, shape)
+    return original, np.clip(original + noise, 0, 255).astype(np.uint8)
+
+
+def test_mse_psnr_and_max_error():
+    original = np.array([[0, 10], [20, 255]], dtype=np.uint8)
+    reconstructed = np.array([[2, 10], [18, 250]], dtype=np.uint8)
+    assert mse(original, reconstructed) == pytest.approx((4 + 0 + 4 + 25) / 4)
+    assert psnr(original, reconstructed) == pytest.approx(20 * np.log10(255 / np.sqrt(33 / 4)))
+    assert max_error(original, reconstructed) == 5
+    assert psnr(original, original) == PSNR_CAP
+
+
+def test_ssim_matches_skimage():
+    structural_similarity = pytest.importorskip('skimage.metrics').structural_similarity
+    original, reconstructed = noisy_pair()
+    expected = structural_similarity(original, reconstructed, data_range=255)
+    assert ssim(original, reconstructed) == pytest.approx(expected, abs=1e-9)
+    assert ssim(original, reconstructed, tile_size=16) == pytest.approx(expected, abs=1e-9)
+
+
+def test_sampled_ssim_is_an_estimate():
+    original, reconstructed = noisy_pair((300, 300))
+    full = ssim(original, reconstructed)
+    assert ssim(original, reconstructed, tile_size=32, sample=0.3) == pytest.approx(full, abs=0.02)
+
+
+def test_evaluate_takes_the_lossless_fast_path():
+    original, reconstructed = noisy_pair()
+    assert evaluate(original, original.copy()) == {'mse': 0.0, 'psnr': PSNR_CAP, 'ssim': 1.0, 'max_error': 0,
+                                                   'lossless': True}
+    result = evaluate(original, reconstructed, compute_ssim=False)
+    assert not result['lossless'] and result['ssim'] is None and 0 < result['max_error'] <= 20
+
+
+def test_evaluate_batch_with_threads_matches_serial():
+    pairs = [noisy_pair(seed=seed) for seed in range(4)]
+    assert evaluate_batch(pairs, workers=2) == evaluate_batch(pairs)
+
+
+def test_shapes_must_match():
+    with pytest.raises(ValueError, match="shapes differ"):
+        evaluate(np.zeros((4, 4), np.uint8), np.zeros((4, 5), np.uint8))
+    with pytest.raises(ValueError, match="at least 7x7"):
+        ssim(np.zeros((6, 20), np.uint8), np.zeros((6, 20), np.uint8))
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from benchmark import make_synthetic_image
+from codec_registry import get_codec, load_module
+
+rle_grayscale = load_module('RLE/rle_grayscale.py')
+
+
+def greedy_runs(values, delta):
+    """Reference merge: grow each run while its values stay within 2 * delta of each other."""
+    lengths = []
+    start = 0
+    while start < values.size:
+        low = high = int(values[start])
+        end = start + 1
+        while end < values.size and max(high, values[end]) - min(low, values[end]) <= 2 * delta:
+            low, high = min(low, int(values[end])), max(high, int(values[end]))
+            end += 1
+        lengths.append(end - start)
+        start = end
+    return lengths
+
+
+@pytest.mark.parametrize('delta', [1, 3])
+def test_merge_matches_the_greedy_reference_across_blocks(delta):
+    values = np.cumsum(np.random.default_rng(delta).integers(-2, 3, 3 * rle_grayscale.MERGE_BLOCK + 17))
+    values = np.clip(values + 128, 0, 255).astype(np.uint8)
+    merged_values, merged_counts = rle_grayscale.merge_runs_near_lossless(values, np.ones(values.size, np.int64),
+                                                                          delta)
+    assert list(merged_counts) == greedy_runs(values, delta)
+    assert np.abs(np.repeat(merged_values, merged_counts).astype(int) - values).max() <= delta
+
+
+@pytest.mark.parametrize('kind', ['gradient', 'text', 'noise'])
+@pytest.mark.parametrize('coding', ['text', 'rice'])
+@pytest.mark.parametrize('order', ['row', 'hilbert'])
+def test_error_is_bounded_and_the_usual_decoder_reads_it(kind, coding, order):
+    img_array = make_synthetic_image(kind, 96)
+    codec = get_codec('rle_grayscale_rice' if coding == 'rice' else 'rle_grayscale')
+    lossless = rle_grayscale.compress_array(img_array, coding=coding, order=order)
+    for delta in (1, 4):
+        data = rle_grayscale.compress_array(img_array, delta=delta, coding=coding, order=order)
+        decoded = codec.decompress(data)
+        assert np.abs(decoded.astype(int) - img_array).max() <= delta
+        assert len(data) <= len(lossless)
+    assert rle_grayscale.compress_array(img_array, delta=0, coding=coding, order=order) == lossless
+
+
+def test_registered_near_lossless_codec():
+    codec = get_codec('rle_grayscale_near_lossless')
+    img_array = make_synthetic_image('gradient', 128)
+    decoded = codec.decompress(codec.compress(img_array))
+    assert not codec.lossless and np.abs(decoded.astype(int) - img_array).max() <= codec.options['delta']
+    with pytest.raises(ValueError, match="non-negative"):
+        rle_grayscale.rle_encode_grayscale(img_array, delta=-1)
@@ -0,0 +1,26 @@
+import io
+
+import numpy as np
+import pytest
+
+from prefix_codes import BLOCK, decode_symbols, encode_symbols, encoded_length, write_symbols
+
+CODES = {0: '0', 1: '10', 2: '110', 255: '1110', 'EOF': '1111'}
+
+
+def test_write_symbols_streams_the_codes():
+    pixels = np.random.default_rng(0).choice(np.array([0, 1, 2, 255], dtype=np.uint8), 5 * BLOCK + 3)
+    buffer = io.BytesIO()
+    written = write_symbols(buffer, pixels, CODES, tail=CODES['EOF'])
+    expected = ''.join(CODES[int(pixel)] for pixel in pixels) + CODES['EOF']
+    assert buffer.getvalue() == expected.encode()
+    assert written == len(expected)
+    assert encoded_length(np.bincount(pixels, minlength=256), CODES) == len(expected) - len(CODES['EOF'])
+
+    symbols = {pixel: code for pixel, code in CODES.items() if pixel != 'EOF'}
+    np.testing.assert_array_equal(decode_symbols(encode_symbols(pixels, symbols), symbols, pixels.size), pixels)
+
+
+def test_write_symbols_needs_a_code_for_every_pixel():
+    with pytest.raises(ValueError, match="No code for pixel value 3"):
+        write_symbols(io.BytesIO(), np.array([0, 3], dtype=np.uint8), CODES)
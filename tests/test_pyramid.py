@@ -0,0 +1,69 @@
+import io
+
+import numpy as np
+import pytest
+
+from benchmark import make_synthetic_image, prepare_input
+from codec_registry import get_codec, lossless_codecs
+from pyramid import PyramidError, PyramidReader, compress_pyramid, decompress_pyramid, level_shape
+
+
+def sample_image(codec_name, height=69, width=91):
+    return prepare_input(get_codec(codec_name), make_synthetic_image('text', 96)[:height, :width])
+
+
+@pytest.mark.parametrize('name', lossless_codecs())
+def test_round_trip_and_previews(name):
+    img_array = sample_image(name)
+    data = compress_pyramid(img_array, name, levels=3)
+    np.testing.assert_array_equal(decompress_pyramid(data), img_array)
+    for level in range(4):
+        np.testing.assert_array_equal(decompress_pyramid(data, level), img_array[::1 << level, ::1 << level])
+
+
+@pytest.mark.parametrize('levels', [0, 1, 2])
+def test_level_counts(levels):
+    img_array = sample_image('rle_grayscale', 33, 17)
+    np.testing.assert_array_equal(decompress_pyramid(compress_pyramid(img_array, 'rle_grayscale', levels)), img_array)
+
+
+def test_level_shape():
+    assert level_shape((69, 91), 0) == (69, 91)
+    assert level_shape((69, 91), 2) == (18, 23)
+    assert level_shape((64, 64), 3) == (8, 8)
+
+
+def test_previews_decode_from_a_prefix():
+    img_array = sample_image('huffman_grayscale')
+    data = compress_pyramid(img_array, 'huffman_grayscale', levels=2)
+    with PyramidReader(io.BytesIO(data)) as reader:
+        lengths = [reader.prefix_length(level) for level in range(3)]
+    assert lengths[2] < lengths[1] < lengths[0] == len(data)
+    for level, length in enumerate(lengths):
+        with PyramidReader(io.BytesIO(data[:length])) as reader:
+            np.testing.assert_array_equal(reader.read_level(level), img_array[::1 << level, ::1 << level])
+
+
+def test_workers_write_the_same_bytes():
+    img_array = sample_image('lzw_grayscale')
+    data = compress_pyramid(img_array, 'lzw_grayscale', levels=2)
+    assert compress_pyramid(img_array, 'lzw_grayscale', levels=2, workers=2) == data
+    np.testing.assert_array_equal(decompress_pyramid(data, workers=2), img_array)
+
+
+def test_errors():
+    img_array = sample_image('rle_grayscale', 20, 40)
+    with pytest.raises(ValueError, match="lossless"):
+        compress_pyramid(img_array, 'drkm')
+    with pytest.raises(ValueError, match="cannot have 5 pyramid levels"):
+        compress_pyramid(img_array, 'rle_grayscale', levels=5)
+    data = compress_pyramid(img_array, 'rle_grayscale', levels=2)
+    with pytest.raises(ValueError, match="outside the pyramid's levels"):
+        decompress_pyramid(data, level=3)
+    corrupted = bytearray(data)
+    corrupted[-1] ^= 0xFF
+    with pytest.raises(PyramidError, match="Checksum mismatch in layer 4"):
+        decompress_pyramid(bytes(corrupted))
+    np.testing.assert_array_equal(decompress_pyramid(bytes(corrupted), level=1), img_array[::2, ::2])
+    with pytest.raises(PyramidError):
+        decompress_pyramid(b'FYPQ' + data[4:])
@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+import pytest
+
+import result_cache
+from result_cache import NO_CACHE, ResultCache, cache_key, imported_sources, source_digest
+
+CODEC_SCRIPT = os.path.join(result_cache.ROOT_DIR, 'RLE', 'rle_grayscale.py')
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / 'cache'), max_bytes=1024 ** 2)
+
+
+def test_get_or_compute_stores_and_hits(cache):
+    img_array = np.arange(64, dtype=np.uint8).reshape(8, 8)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return img_array.tobytes()
+
+    for _ in range(2):
+        assert cache.get_or_compute('test.bytes', compute, (img_array,), {'delta': 0}) == img_array.tobytes()
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.parametrize('kind, value', [
+    ('arrays', (np.arange(6).reshape(2, 3), np.ones(4, dtype=np.uint8))),
+    ('json', {'psnr': 41.5, 'lossless': False}),
+])
+def test_kinds_round_trip(cache, kind, value):
+    cache.get_or_compute('test.kind', lambda: value, kind=kind)
+    stored = cache.get_or_compute('test.kind', lambda: pytest.fail("recomputed"), kind=kind)
+    if kind == 'arrays':
+        for expected, got in zip(value, stored):
+            np.testing.assert_array_equal(got, expected)
+    else:
+        assert stored == value
+
+
+def test_key_depends_on_pixels_shape_and_params():
+    img_array = np.zeros((4, 4), dtype=np.uint8)
+    key = cache_key('ns', (img_array,), {'order': 'row'})
+    assert key == cache_key('ns', (img_array.copy(),), {'order': 'row'})
+    assert key != cache_key('ns', (img_array.reshape(2, 8),), {'order': 'row'})
+    assert key != cache_key('ns', (img_array + 1,), {'order': 'row'})
+    assert key != cache_key('ns', (img_array,), {'order': 'column'})
+    assert key != cache_key('other', (img_array,), {'order': 'row'})
+    assert key != cache_key('ns', (img_array,), {'order': 'row'}, source=CODEC_SCRIPT)
+
+
+def test_source_digest_covers_the_modules_a_codec_imports():
+    imported = {os.path.basename(path) for path in imported_sources(CODEC_SCRIPT)}
+    assert {'array_text.py', 'rice_coding.py', 'scan_order.py'} <= imported
+    assert 'benchmark.py' not in imported
+
+
+def test_source_digest_follows_edits(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, 'ROOT_DIR', str(tmp_path))
+    (tmp_path / 'helper.py').write_text("VALUE = 1\n")
+    (tmp_path / 'unrelated.py').write_text("VALUE = 1\n")
+    script = tmp_path / 'codec.py'
+    script.write_text("import numpy as np\ndef run():\n    from helper import VALUE\n    return VALUE\n")
+
+    before = source_digest(str(script))
+    source_digest.cache_clear()
+    (tmp_path / 'unrelated.py').write_text("VALUE = 2\n")
+    assert source_digest(str(script)) == before
+    source_digest.cache_clear()
+    (tmp_path / 'helper.py').write_text("VALUE = 2\n")
+    assert source_digest(str(script)) != before
+    source_digest.cache_clear()
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=2500)
+    for age, name in zip((2, 1, 0), 'abc'):
+        cache.get_or_compute(name, lambda: bytes(1000))
+        path = cache._path(cache_key(name), 'bytes')
+        os.utime(path, (os.path.getmtime(path) - 10 * age,) * 2)  # the order of use, not mtime resolution
+    assert cache.get_or_compute('a', lambda: b'recomputed') == b'recomputed'
+    assert sum(entry.stat().st_size for entry in cache.entries()) <= 2500
+
+
+def test_evaluate_is_cached(cache):
+    original = np.arange(256, dtype=np.uint8).reshape(16, 16)
+    quality = cache.evaluate(original, original, compute_ssim=False)
+    assert quality['lossless']
+    assert cache.evaluate(original, original, compute_ssim=False) == quality
+    assert cache.hits == 1
+
+
+def test_no_cache_always_computes():
+    calls = []
+    for _ in range(2):
+        NO_CACHE.get_or_compute('test', lambda: calls.append(1) or b'')
+    assert len(calls) == 2
+
+
+def test_drkm_results_agree_with_and_without_cache(cache):
+    pytest.importorskip('sklearn')
+    from codec_registry import load_module
+    drkm = load_module('DR-KM/Code.py')
+    img_array = np.add.outer(np.arange(24), np.arange(24)).astype(np.uint8) * 5
+    uncached = drkm.compress_representation(img_array, 2, 0.5)
+    cached = drkm.compress_representation(img_array, 2, 0.5, cache)
+    for expected, got in zip(uncached, cached):
+        np.testing.assert_allclose(got, expected)
+    assert cache.misses == 2  # the SVD and the k-means fit
+
+
+def test_default_cache_reads_the_environment(tmp_path, monkeypatch):
+    monkeypatch.delenv('FYP_CACHE', raising=False)
+    assert result_cache.default_cache() is NO_CACHE
+    monkeypatch.setenv('FYP_CACHE', str(tmp_path))
+    monkeypatch.setenv('FYP_CACHE_MB', '2')
+    cache = result_cache.default_cache()
+    assert isinstance(cache, ResultCache) and cache.max_bytes == 2 * 1024 ** 2
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from rice_coding import (BATCH, BLOCK, CHUNK, ESCAPE, EXPAND_PIXELS, HEADER, MAGIC, choose_parameters, decode_pixels,
+                         decode_runs, encode_runs, expand_runs, is_rice_data, iter_runs, join_runs, rice_bits,
+                         rice_cost, rice_decode, rice_encode, unzigzag_steps, zigzag_steps)
+from scan_order import scan_pixels
+
+
+def geometric_values(size, mean, seed=0):
+    return np.random.default_rng(seed).geometric(1 / mean, size).astype(np.uint64)
+
+
+@pytest.mark.parametrize('size', [0, 1, BLOCK - 1, CHUNK, CHUNK + BLOCK + 3])
+def test_rice_round_trip(size):
+    values = geometric_values(size, 20) + np.uint64(3)
+    data = rice_encode(values, minimum=3)
+    decoded, offset = rice_decode(data, 0, size, minimum=3)
+    assert offset == len(data)
+    np.testing.assert_array_equal(decoded, values)
+
+
+def test_rice_escapes_outliers():
+    values = geometric_values(3 * BLOCK, 2)
+    values[[5, 70, 150]] = [2 ** 40, 2 ** 63 + 7, 1 << ESCAPE]
+    decoded, _ = rice_decode(rice_encode(values), 0, values.size)
+    np.testing.assert_array_equal(decoded, values)
+    assert len(rice_encode(values)) < 3 * BLOCK  # the outliers do not set k for their blocks
+
+
+def test_parameters_follow_the_block_magnitude():
+    values = np.concatenate([geometric_values(BLOCK, 2), geometric_values(BLOCK, 1000)])
+    small, large = choose_parameters(values)
+    assert small < large
+    k = np.repeat(choose_parameters(values), BLOCK)
+    best = min(int(rice_bits(values[:BLOCK], k).sum()) for k in range(20))
+    assert int(rice_bits(values[:BLOCK], small).sum()) == best
+    assert rice_cost(values) == int(rice_bits(values, k).sum()) + 8 * 2
+
+
+def test_truncated_data_raises():
+    data = rice_encode(geometric_values(500, 30))
+    with pytest.raises(ValueError):
+        rice_decode(data[:len(data) // 2], 0, 500)
+
+
+def test_zigzag_steps_are_inverse():
+    values = np.random.default_rng(1).integers(0, 256, 1000).astype(np.uint8)
+    codes = zigzag_steps(values, previous=17)
+    np.testing.assert_array_equal(unzigzag_steps(codes, previous=17), values)
+    np.testing.assert_array_equal(zigzag_steps(np.array([10, 9, 11, 139], np.uint8), 10), [0, 1, 4, 255])
+
+
+def test_iter_runs_across_batches():
+    pixels = np.repeat(np.array([3, 3, 7, 0, 7], np.uint8), [BATCH - 1, 2, BATCH, 1, 5])
+    batches = list(iter_runs(pixels))
+    values = np.concatenate([values for values, _ in batches])
+    lengths = np.concatenate([lengths for _, lengths in batches])
+    np.testing.assert_array_equal(values, [3, 7, 0, 7])
+    np.testing.assert_array_equal(lengths, [BATCH + 1, BATCH, 1, 5])
+
+
+def test_binary_runs_treat_nonzero_as_one():
+    pixels = np.repeat(np.array([0, 255, 1, 0, 9], np.uint8), [3, BATCH, BATCH, 2, 1])
+    values, lengths = join_runs(iter_runs(pixels, binary=True), pixels.size)
+    np.testing.assert_array_equal(values, [0, 1, 0, 1])
+    np.testing.assert_array_equal(lengths, [3, 2 * BATCH, 2, 1])
+    assert values.dtype == np.uint8 and lengths.dtype == np.uint32
+
+
+def test_join_runs_matches_a_direct_scan():
+    pixels = np.repeat(np.random.default_rng(3).integers(0, 4, 5000, dtype=np.uint8), 3)
+    values, lengths = join_runs(iter_runs(pixels), pixels.size)
+    np.testing.assert_array_equal(np.repeat(values, lengths), pixels)
+    assert np.all(values[1:] != values[:-1])
+
+
+def test_expand_runs_fills_long_and_short_runs():
+    rng = np.random.default_rng(4)
+    counts = np.concatenate([rng.integers(1, 5, 3000), [3 * EXPAND_PIXELS], rng.integers(1, 5, 3000)])
+    values = rng.integers(0, 256, counts.size).astype(np.uint8)
+    width = 64
+    counts[-1] += -counts.sum() % width
+    batches = [(values[:10], counts[:10]), (values[10:], counts[10:])]
+    img_array = expand_runs(batches, (int(counts.sum()) // width, width))
+    np.testing.assert_array_equal(img_array.ravel(), np.repeat(values, counts))
+
+    with pytest.raises(ValueError, match="do not cover"):
+        expand_runs(batches, (img_array.shape[0] + 1, width))
+
+
+@pytest.mark.parametrize('kind', ['binary', 'grayscale'])
+@pytest.mark.parametrize('order', ['row', 'hilbert'])
+def test_runs_round_trip(kind, order):
+    rng = np.random.default_rng(2)
+    img_array = np.repeat(rng.integers(0, 2 if kind == 'binary' else 256, (40, 9), dtype=np.uint8), 7, axis=1)
+    data = encode_runs(iter_runs(scan_pixels(img_array, order)), img_array.shape, order, kind)
+    assert is_rice_data(data) and data.startswith(MAGIC)
+    np.testing.assert_array_equal(decode_pixels(data, kind), img_array)
+    shape, values, counts, decoded_order = decode_runs(data, kind)
+    assert (shape, decoded_order) == (img_array.shape, order)
+    assert counts.sum() == img_array.size
+
+
+def test_wrong_kind_and_short_data_raise():
+    data = encode_runs(iter_runs(np.zeros(10, np.uint8)), (2, 5), 'row', 'binary')
+    with pytest.raises(ValueError):
+        decode_pixels(data, 'grayscale')
+    with pytest.raises(ValueError):
+        decode_pixels(data[:HEADER.size - 1], 'binary')
+    with pytest.raises(ValueError):
+        decode_pixels(data[:-1], 'binary')
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from benchmark import make_synthetic_image, prepare_input
+from codec_registry import get_codec
+from scan_order import (ORDERS, choose_scan_order, format_header, iter_scan_blocks, parse_header, resolve_scan_order,
+                        scan_permutation, scan_pixels, unscan_pixels)
+
+
+@pytest.mark.parametrize('order', ORDERS)
+@pytest.mark.parametrize('shape', [(1, 1), (5, 9), (16, 16), (33, 20)])
+def test_orders_are_permutations_that_unscan(order, shape):
+    permutation = scan_permutation(shape, order)
+    assert not permutation.flags.writeable
+    np.testing.assert_array_equal(np.sort(permutation), np.arange(shape[0] * shape[1]))
+    img_array = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+    np.testing.assert_array_equal(unscan_pixels(scan_pixels(img_array, order), shape, order), img_array)
+
+
+def test_orders_visit_neighbours():
+    y, x = np.divmod(scan_permutation((16, 16), 'hilbert').astype(np.int64), 16)
+    assert np.all(np.abs(np.diff(y)) + np.abs(np.diff(x)) == 1)
+    y, x = np.divmod(scan_permutation((5, 9), 'serpentine').astype(np.int64), 9)
+    assert np.all(np.abs(np.diff(y)) + np.abs(np.diff(x)) == 1)
+    np.testing.assert_array_equal(scan_pixels(np.arange(6).reshape(2, 3), 'column'), [0, 3, 1, 4, 2, 5])
+
+
+@pytest.mark.parametrize('order', ORDERS)
+def test_scan_blocks_match_scan_pixels(order):
+    img_array = np.random.default_rng(0).integers(0, 256, (61, 47), dtype=np.uint8)
+    strided = np.pad(img_array, ((0, 0), (0, 1)))[::-1, :47][::-1]
+    assert not strided.flags.c_contiguous
+    for source in (img_array, strided):
+        blocks = list(iter_scan_blocks(source, order, block=500))
+        assert len(blocks) > 1 and all(block.ndim == 1 for block in blocks)
+        np.testing.assert_array_equal(np.concatenate(blocks), scan_pixels(img_array, order))
+
+
+def test_auto_order_follows_the_structure():
+    rng = np.random.default_rng(1)
+    stripes = np.repeat(rng.integers(0, 256, (1, 256), dtype=np.uint8), 256, axis=0)
+    blocks = np.kron(rng.integers(0, 2, (16, 16)), np.ones((16, 16), dtype=np.uint8)).astype(np.uint8)
+    assert choose_scan_order(stripes) == 'column'
+    assert choose_scan_order(stripes.T) == 'row'
+    assert choose_scan_order(blocks) == 'hilbert'
+    assert choose_scan_order(np.zeros((64, 64), np.uint8)) == 'row'
+    assert resolve_scan_order(stripes, 'auto') == 'column'
+    with pytest.raises(ValueError, match="Unknown scan order 'zigzag'"):
+        resolve_scan_order(stripes, 'zigzag')
+
+
+def test_headers_record_the_order_only_when_needed():
+    assert format_header((4, 5)) == '4 5\n'
+    assert format_header((4, 5), 'hilbert', options=['reset:4096', None]) == '4 5 hilbert reset:4096\n'
+    assert parse_header('4 5 hilbert reset:4096') == ((4, 5), 'hilbert', ['reset:4096'])
+    assert parse_header('4 5 reset:4096') == ((4, 5), 'row', ['reset:4096'])
+    with pytest.raises(ValueError, match="Unknown scan order"):
+        parse_header('4 5 diagonal')
+    with pytest.raises(ValueError, match="Malformed header"):
+        parse_header('45')
+
+
+@pytest.mark.parametrize('name', ['rle_binary', 'rle_grayscale', 'rle_grayscale_rice', 'lzw_binary', 'lzw_grayscale'])
+@pytest.mark.parametrize('order', ORDERS + ('auto',))
+def test_codecs_round_trip_in_every_order(name, order):
+    codec = get_codec(name)
+    img_array = prepare_input(codec, make_synthetic_image('text', 40)[:, :37])
+    data = codec.compress(img_array, order=order)
+    np.testing.assert_array_equal(codec.decompress(data), img_array)
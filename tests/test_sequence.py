@@ -0,0 +1,80 @@
+import io
+
+import numpy as np
+import pytest
+
+from sequence import SequenceError, SequenceReader, compress_sequence, decompress_sequence, write_sequence
+
+
+def moving_square(count=12, size=32, kind='grayscale'):
+    frames = np.zeros((count, size, size), dtype=np.uint8)
+    if kind == 'grayscale':
+        frames += np.add.outer(np.arange(size), np.arange(size)).astype(np.uint8)
+    for i in range(count):
+        frames[i, 8:16, i:i + 8] = 1 if kind == 'binary' else 200
+    return frames
+
+
+@pytest.mark.parametrize('codec_name, kind', [('rle_grayscale_rice', 'grayscale'), ('lzw_grayscale', 'grayscale'),
+                                              ('rle_binary', 'binary'), ('huffman_binary', 'binary')])
+def test_round_trip(codec_name, kind):
+    frames = moving_square(kind=kind)
+    np.testing.assert_array_equal(decompress_sequence(compress_sequence(frames, codec_name, key_interval=5)), frames)
+
+
+def test_key_frames_and_scene_cuts():
+    frames = moving_square(10)
+    frames[7] = 255 - frames[7]  # a scene cut
+    with SequenceReader(io.BytesIO(compress_sequence(frames, 'rle_grayscale', key_interval=4))) as reader:
+        assert reader.key_frames == [0, 4, 7, 8]
+        assert reader.key_frame_before(6) == 4
+
+
+def test_random_access_and_ranges():
+    frames = moving_square(12)
+    with SequenceReader(io.BytesIO(compress_sequence(frames, 'rle_grayscale', key_interval=5))) as reader:
+        for i in (7, 3, 11, 0, 5):
+            np.testing.assert_array_equal(reader.read_frame(i), frames[i])
+        # Continuing from the frame decoded last must not shift the range
+        reader.read_frame(5)
+        np.testing.assert_array_equal(reader.read_frames(5, 8), frames[5:8])
+        np.testing.assert_array_equal(reader.read_frames(6, 9), frames[6:9])
+        assert reader.read_frames(4, 4).shape == (0, 32, 32)
+
+
+def test_returned_frames_cannot_corrupt_later_frames():
+    frames = moving_square(6)
+    with SequenceReader(io.BytesIO(compress_sequence(frames, 'rle_grayscale', key_interval=6))) as reader:
+        frame = reader.read_frame(2)
+        with pytest.raises(ValueError):
+            frame[:] = 0
+        for frame in reader.iter_frames(2, 4):
+            assert not frame.flags.writeable
+            frame.copy()[:] = 0
+        np.testing.assert_array_equal(reader.read_frame(4), frames[4])
+
+
+def test_parallel_decode_matches(tmp_path):
+    frames = moving_square(8)
+    path = str(tmp_path / 'clip.fyps')
+    write_sequence(path, frames, 'rle_grayscale_rice', key_interval=3, workers=2)
+    with SequenceReader(path) as reader:
+        np.testing.assert_array_equal(reader.read_frames(workers=2), frames)
+
+
+def test_rejects_lossy_codecs_and_bad_frames():
+    with pytest.raises(ValueError):
+        compress_sequence(moving_square(2), 'rle_grayscale_near_lossless')
+    with pytest.raises(ValueError):
+        compress_sequence([np.zeros((4, 4), np.uint8), np.zeros((4, 5), np.uint8)], 'rle_grayscale')
+    with pytest.raises(ValueError):
+        compress_sequence([], 'rle_grayscale')
+
+
+def test_corruption_is_detected():
+    data = bytearray(compress_sequence(moving_square(4), 'rle_grayscale'))
+    with pytest.raises(SequenceError):
+        decompress_sequence(bytes(data[:-3]))
+    data[60] ^= 0xFF  # inside the first frame
+    with pytest.raises(SequenceError):
+        decompress_sequence(bytes(data))
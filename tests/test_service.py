@@ -0,0 +1,109 @@
+import asyncio
+import contextlib
+import io
+import json
+
+import numpy as np
+import pytest
+
+from load_test import HttpConnection, encode_npy, run_load_test
+from service import CompressionService, MAX_HEADER_BYTES, compress_job, decompress_job
+
+
+@contextlib.asynccontextmanager
+async def running_service(**kwargs):
+    service = CompressionService(workers=1, **kwargs)
+    await service.start_pool()
+    server = await asyncio.start_server(service.handle_connection, '127.0.0.1', 0, limit=MAX_HEADER_BYTES)
+    try:
+        async with server:
+            yield service, server.sockets[0].getsockname()[1]
+    finally:
+        service.shutdown()
+
+
+async def raw_exchange(port, request):
+    """Send raw request bytes and return everything the server sends before it closes the connection."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(request)
+    await writer.drain()
+    response = await asyncio.wait_for(reader.read(), 10)
+    writer.close()
+    return response
+
+
+def test_jobs_round_trip():
+    img_array = np.add.outer(np.arange(20), np.arange(30)).astype(np.uint8)
+    for options in ({}, {'tile': '8'}):
+        data = compress_job('rle_grayscale', encode_npy(img_array), options)
+        decoded = np.load(io.BytesIO(decompress_job('rle_grayscale', data, {'format': 'npy'})))
+        np.testing.assert_array_equal(decoded, img_array)
+
+
+def test_invalid_image_is_a_value_error():
+    with pytest.raises(ValueError):
+        compress_job('rle_grayscale', b'not an image', {})
+
+
+def test_service_round_trips_and_keeps_the_connection():
+    async def scenario():
+        async with running_service() as (service, port):
+            connection = HttpConnection('127.0.0.1', port)
+            status, body = await connection.request('GET', '/codecs')
+            assert status == 200 and json.loads(body)['rle_binary'] == 'binary'
+
+            img_array = (np.arange(400).reshape(20, 20) % 7 == 0).astype(np.uint8)
+            status, compressed = await connection.request('POST', '/compress/rle_binary', encode_npy(img_array))
+            assert status == 200
+            status, decoded = await connection.request('POST', '/decompress/rle_binary?format=npy', compressed)
+            assert status == 200
+            np.testing.assert_array_equal(np.load(io.BytesIO(decoded)), img_array)
+
+            status, body = await connection.request('POST', '/compress/rle_binary', b'not an image')
+            assert status == 400
+            assert connection.writer is not None  # the body was read, so the connection stays open
+            status, _ = await connection.request('POST', '/compress/no_such_codec', b'')
+            assert status == 404
+            await connection.close()
+            assert service.stats['completed'] == 3
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize('body', [
+    b'Transfer-Encoding: chunked\r\n\r\nzz\r\nabc\r\n0\r\n\r\n',
+    b'Transfer-Encoding: chunked\r\n\r\n-5\r\nabc\r\n0\r\n\r\n',
+    b'Content-Length: -3\r\n\r\n',
+    b'Content-Length: ten\r\n\r\n',
+])
+def test_malformed_body_closes_the_connection(body):
+    async def scenario():
+        async with running_service() as (_, port):
+            follow_up = b'GET /codecs HTTP/1.1\r\nHost: x\r\n\r\n'
+            response = await raw_exchange(port, b'POST /compress/rle_grayscale HTTP/1.1\r\nHost: x\r\n' + body
+                                          + follow_up)
+            assert response.startswith(b'HTTP/1.1 400')
+            assert b'Connection: close' in response
+            assert response.count(b'HTTP/1.1') == 1  # nothing after the body was taken as a request
+
+    asyncio.run(scenario())
+
+
+def test_body_size_limit():
+    async def scenario():
+        async with running_service(max_body=100) as (_, port):
+            response = await raw_exchange(port, b'POST /compress/rle_grayscale HTTP/1.1\r\nHost: x\r\n'
+                                                b'Content-Length: 101\r\n\r\n' + bytes(101))
+            assert response.startswith(b'HTTP/1.1 413')
+
+    asyncio.run(scenario())
+
+
+def test_load_test_against_the_service():
+    async def scenario():
+        async with running_service() as (_, port):
+            img_array = np.arange(256, dtype=np.uint8).reshape(16, 16)
+            return await run_load_test('lzw_grayscale', img_array, requests=6, concurrency=2, port=port)
+
+    summary = asyncio.run(scenario())
+    assert summary['statuses'] == {'200': 6}